@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+from http.server import BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+
+class FakeDockerRequestHandler(BaseHTTPRequestHandler):
+    """Answers the subset of the Engine API used by docker_manager"""
+    protocol_version = 'HTTP/1.1'
+    _version_prefix = re.compile(r'^/v\d+\.\d+')
+
+    def log_message(self, format, *args):
+        # keep benchmark output clean
+        pass
+
+    @property
+    def daemon(self):
+        return self.server.fake_daemon
+
+    def _path(self):
+        return self._version_prefix.sub('', urlparse(self.path).path)
+
+    def _query(self):
+        return parse_qs(urlparse(self.path).query)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Api-Version', self.daemon.api_version)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_chunk(self, payload):
+        data = json.dumps(payload).encode() + b'\r\n'
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_HEAD(self):
+        self.daemon.wait()
+        self._send_empty(200)
+
+    def do_GET(self):
+        self.daemon.wait()
+        path = self._path()
+        if path == '/_ping':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'OK')
+        elif path == '/version':
+            self._send_json(200, {'ApiVersion': self.daemon.api_version, 'MinAPIVersion': '1.24',
+                                  'Version': 'fake', 'Os': 'linux', 'Arch': 'amd64'})
+        elif path == '/images/json':
+            self._send_json(200, self.daemon.list_images())
+        elif path.startswith('/images/') and path.endswith('/json'):
+            image = self.daemon.find_image(path[len('/images/'):-len('/json')])
+            if image is None:
+                self._send_json(404, {'message': 'No such image'})
+            else:
+                self._send_json(200, image)
+        elif path == '/containers/json':
+            self._send_json(200, list(self.daemon.containers.values()))
+        elif path.startswith('/containers/') and path.endswith('/json'):
+            container = self.daemon.find_container(path[len('/containers/'):-len('/json')])
+            if container is None:
+                self._send_json(404, {'message': 'No such container'})
+            else:
+                self._send_json(200, container)
+        else:
+            self._send_json(404, {'message': f'page not found: {path}'})
+
+    def do_POST(self):
+        body = self._read_body()
+        self.daemon.wait()
+        path = self._path()
+        query = self._query()
+        if path == '/build':
+            self._build(body, query)
+        elif path == '/containers/create':
+            status, payload = self.daemon.create_container(query.get('name', [None])[0], json.loads(body or b'{}'))
+            self._send_json(status, payload)
+        elif path.startswith('/containers/') and path.endswith('/start'):
+            container = self.daemon.find_container(path[len('/containers/'):-len('/start')])
+            if container is None:
+                self._send_json(404, {'message': 'No such container'})
+            else:
+                container['State'] = 'running'
+                self._send_empty(204)
+        elif path.startswith('/images/') and path.endswith('/tag'):
+            image = self.daemon.find_image(path[len('/images/'):-len('/tag')])
+            if image is None:
+                self._send_json(404, {'message': 'No such image'})
+            else:
+                image['RepoTags'].append(f"{query['repo'][0]}:{query.get('tag', ['latest'])[0]}")
+                self._send_empty(201)
+        else:
+            self._send_json(404, {'message': f'page not found: {path}'})
+
+    def _build(self, body, query):
+        """Stream a build log of the configured length, then register the image."""
+        tag = query.get('t', ['unnamed:latest'])[0]
+        labels = json.loads(query.get('labels', ['{}'])[0])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        steps = self.daemon.build_lines
+        for step in range(1, steps + 1):
+            self._send_chunk({'stream': f'Step {step}/{steps} : RUN echo step {step}\n'})
+            if self.daemon.line_delay:
+                time.sleep(self.daemon.line_delay)
+        image_id = self.daemon.add_image(tag, labels, len(body))
+        self._send_chunk({'aux': {'ID': image_id}})
+        self._send_chunk({'stream': f'Successfully built {image_id[7:19]}\n'})
+        self._send_chunk({'stream': f'Successfully tagged {tag}\n'})
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+class FakeDockerServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('fake-docker', 0)
+
+
+class FakeDockerDaemon:
+    """A stand-in Docker Engine served on a unix socket, with configurable latency and build output"""
+    def __init__(self, socket_path, latency=0.0, build_lines=20, line_delay=0.0, api_version='1.41'):
+        self.socket_path = socket_path
+        self.latency = latency
+        self.build_lines = build_lines
+        self.line_delay = line_delay
+        self.api_version = api_version
+        self.images = {}
+        self.containers = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f'unix://{self.socket_path}'
+
+    def wait(self):
+        """Simulate the round trip time of the daemon."""
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _new_id(self) -> str:
+        return hashlib.sha256(str(next(self._ids)).encode()).hexdigest()
+
+    def add_image(self, tag, labels, context_size) -> str:
+        with self._lock:
+            image_id = f'sha256:{self._new_id()}'
+            self.images[image_id] = {'Id': image_id, 'RepoTags': [tag], 'Labels': labels,
+                                     'Created': int(time.time()), 'Size': context_size}
+            return image_id
+
+    def list_images(self) -> list:
+        with self._lock:
+            return list(self.images.values())
+
+    def find_image(self, name):
+        with self._lock:
+            for image in self.images.values():
+                if name in (image['Id'], image['Id'][7:], image['Id'][7:19]) or name in image['RepoTags']:
+                    return image
+        return None
+
+    def create_container(self, name, config):
+        with self._lock:
+            if name and any(container['Names'] == [f'/{name}'] for container in self.containers.values()):
+                return 409, {'message': f'Conflict. The container name "/{name}" is already in use'}
+            container_id = self._new_id()
+            self.containers[container_id] = {'Id': container_id, 'Names': [f'/{name or container_id[:12]}'],
+                                             'Image': config.get('Image'), 'State': 'created',
+                                             'Config': config, 'Labels': config.get('Labels') or {}}
+            return 201, {'Id': container_id, 'Warnings': []}
+
+    def find_container(self, name):
+        with self._lock:
+            for container_id, container in self.containers.items():
+                if name in (container_id, container_id[:12]) or container['Names'] == [f'/{name}']:
+                    return container
+        return None
+
+    def start(self):
+        """Serve on the socket from a background thread."""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = FakeDockerServer(self.socket_path, FakeDockerRequestHandler)
+        self._server.fake_daemon = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='Serve a fake Docker Engine API on a unix socket')
+    parser.add_argument('socket', help='Path of the unix socket to serve on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--build-lines', type=int, default=20, help='Number of build steps to stream')
+    parser.add_argument('--line-delay', type=float, default=0.0, help='Seconds between streamed build lines')
+    args = parser.parse_args()
+
+    fake_daemon = FakeDockerDaemon(args.socket, args.latency, args.build_lines, args.line_delay).start()
+    print(f'Serving fake Docker daemon on {fake_daemon.base_url}')
+    try:
+        fake_daemon._thread.join()
+    except KeyboardInterrupt:
+        fake_daemon.stop()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(REPO_ROOT, 'image-builder.py')
+
+
+def import_times(arguments) -> dict:
+    """Run the CLI once under -X importtime. Returns {module: (cumulative microseconds, nesting depth)}."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', CLI] + arguments, cwd=REPO_ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(cumulative), depth)
+    return times
+
+
+def measure(arguments, runs) -> dict:
+    """Median import cost of the CLI for the given arguments over several fresh interpreters."""
+    samples = [import_times(arguments) for _ in range(runs)]
+    modules = set().union(*samples)
+    # nested imports are already part of their parent's cumulative time
+    top_level = {module: statistics.median(sample[module][0] for sample in samples if module in sample)
+                 for module in modules if any(sample.get(module, (0, 1))[1] == 0 for sample in samples)}
+    return {
+        'arguments': arguments,
+        'runs': runs,
+        'total_ms': sum(top_level.values()) / 1000,
+        'modules': sorted(modules),
+        'slowest_ms': dict(sorted(((module, value / 1000) for module, value in top_level.items()),
+                                  key=lambda item: item[1], reverse=True)[:10])
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Measure the import cost of image-builder.py')
+    parser.add_argument('-n', '--runs', type=int, default=7, help='Fresh interpreters per measurement')
+    parser.add_argument('--max-ms', type=float, help='Exit with an error when --help imports take longer')
+    parser.add_argument('--forbid', nargs='*', default=['docker', 'test_docker_manager.test_runner'],
+                        help='Modules that must not be imported by --help')
+    args = parser.parse_args()
+
+    report = measure(['--help'], args.runs)
+    print(json.dumps(report, indent=2))
+
+    errors = [f'{module} imported by --help' for module in args.forbid if module in report['modules']]
+    if args.max_ms is not None and report['total_ms'] > args.max_ms:
+        errors.append(f"--help imports took {report['total_ms']:.1f} ms, limit {args.max_ms} ms")
+    for error in errors:
+        print(f'Error: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
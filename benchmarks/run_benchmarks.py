@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_docker_daemon import FakeDockerDaemon
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BenchmarkSuite:
+    """Times docker_manager against a fake daemon and writes a comparable report"""
+    def __init__(self, runs=5, latency=0.0, build_lines=200, replicas=50, log_lines=20000):
+        self.runs = runs
+        self.latency = latency
+        self.build_lines = build_lines
+        self.replicas = replicas
+        self.log_lines = log_lines
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.daemon = FakeDockerDaemon(os.path.join(self.work_dir.name, 'docker.sock'),
+                                       latency=latency, build_lines=build_lines)
+        self.config_path = os.path.join(self.work_dir.name, 'config.json')
+        self._write_config()
+
+    def _write_config(self):
+        """Internal method to create the build context and config the benchmarks use."""
+        context_dir = os.path.join(self.work_dir.name, 'context')
+        os.makedirs(context_dir)
+        with open(os.path.join(context_dir, 'Dockerfile'), 'w') as dockerfile:
+            dockerfile.write('FROM ubuntu\nCMD ["bash"]\n')
+        with open(os.path.join(REPO_ROOT, 'config_files', 'config.json'), 'r') as config_file:
+            config = json.load(config_file)
+        config['custom_fields'] = {
+            'os_dependencies': [],
+            'config_files_dir': context_dir,
+            'context_cache_dir': os.path.join(self.work_dir.name, 'cache'),
+            'log_file': os.path.join(self.work_dir.name, 'benchmark.log'),
+            'image_name': 'benchmark',
+            'container_name': 'benchmark',
+            'stream_build': True,
+            'max_parallel_containers': 8
+        }
+        with open(self.config_path, 'w') as config_file:
+            json.dump(config, config_file)
+
+    def _docker_config(self, **custom_fields):
+        from docker_manager.docker_config import DockerConfig
+        config = DockerConfig(self.config_path)
+        for key, value in custom_fields.items():
+            config.add_custom_value(key, value)
+        return config
+
+    @staticmethod
+    def _summarize(samples, items=None) -> dict:
+        """Internal method to reduce timing samples to comparable statistics."""
+        summary = {
+            'runs': len(samples),
+            'mean_seconds': statistics.mean(samples),
+            'median_seconds': statistics.median(samples),
+            'min_seconds': min(samples),
+            'max_seconds': max(samples),
+            'stdev_seconds': statistics.stdev(samples) if len(samples) > 1 else 0.0
+        }
+        if items:
+            summary['items'] = items
+            summary['items_per_second'] = items / statistics.median(samples)
+        return summary
+
+    def _time(self, func, items=None) -> dict:
+        samples = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        return self._summarize(samples, items)
+
+    def bench_cli_help(self) -> dict:
+        """Start-up cost of the CLI when nothing is built."""
+        command = [sys.executable, os.path.join(REPO_ROOT, 'image-builder.py'), '--help']
+        return self._time(lambda: subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL))
+
+    def bench_cli_build(self) -> dict:
+        """End-to-end latency of image-builder.py --build-image."""
+        command = [sys.executable, os.path.join(REPO_ROOT, 'image-builder.py'),
+                   '--config', self.config_path, '--build-image']
+        environment = dict(os.environ, DOCKER_HOST=self.daemon.base_url)
+        return self._time(lambda: subprocess.run(command, cwd=REPO_ROOT, env=environment, check=True,
+                                                 stdout=subprocess.DEVNULL))
+
+    def bench_client_setup(self) -> dict:
+        """Cost of creating a client session and the first request on it."""
+        from docker_manager.docker_client_session import DockerClientSession
+        config = self._docker_config()
+
+        def setup():
+            session = DockerClientSession(config)
+            session.client.ping()
+            session.close()
+        return self._time(setup)
+
+    def bench_log_throughput(self) -> dict:
+        """Build-log lines per second through DockerLogging, including draining to disk."""
+        from docker_manager.docker_logging import DockerLogging
+        config = self._docker_config(logging_enabled=True, verbose=False)
+
+        def log_lines():
+            docker_logging = DockerLogging(config)
+            for line in range(self.log_lines):
+                docker_logging.log('Step %d : RUN echo benchmark', line)
+            DockerLogging.shutdown()
+        return self._time(log_lines, items=self.log_lines)
+
+    def bench_stream_build(self) -> dict:
+        """Streamed build of the fake daemon's build log, lines per second."""
+        from docker_manager.docker_client_session import DockerClientSession
+        from docker_manager.docker_image_builder import DockerImageBuilder
+        from docker_manager.docker_logging import DockerLogging
+        config = self._docker_config(logging_enabled=True)
+        session = DockerClientSession(config)
+        builder = DockerImageBuilder(config, session)
+        try:
+            return self._time(builder.build_image, items=self.build_lines)
+        finally:
+            session.close()
+            DockerLogging.shutdown()
+
+    def bench_bulk_create(self) -> dict:
+        """Containers created per second by create_containers."""
+        from docker_manager.docker_client_session import DockerClientSession
+        from docker_manager.docker_container_manager import DockerContainerManager
+        config = self._docker_config()
+        session = DockerClientSession(config)
+        manager = DockerContainerManager(config, session)
+        counter = iter(range(self.runs))
+
+        def create():
+            results = manager.create_containers(f'benchmark:run{next(counter)}', self.replicas, start=True)
+            failed = [result for result in results if not result.ok]
+            if failed:
+                raise RuntimeError(f'{len(failed)} containers failed: {failed[0].error}')
+        try:
+            return self._time(create, items=self.replicas)
+        finally:
+            session.close()
+
+    def run(self, selected=None) -> dict:
+        benchmarks = {
+            'cli_help': self.bench_cli_help,
+            'cli_build': self.bench_cli_build,
+            'client_setup': self.bench_client_setup,
+            'log_throughput': self.bench_log_throughput,
+            'stream_build': self.bench_stream_build,
+            'bulk_create': self.bench_bulk_create
+        }
+        os.environ['DOCKER_HOST'] = self.daemon.base_url
+        results = {}
+        with self.daemon:
+            for name, benchmark in benchmarks.items():
+                if selected and name not in selected:
+                    continue
+                results[name] = benchmark()
+                print(f"{name:16} median {results[name]['median_seconds'] * 1000:10.2f} ms", file=sys.stderr)
+        return {
+            'revision': revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {'runs': self.runs, 'latency': self.latency, 'build_lines': self.build_lines,
+                         'replicas': self.replicas, 'log_lines': self.log_lines},
+            'benchmarks': results
+        }
+
+
+def revision() -> str:
+    result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO_ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return result.stdout.strip() or 'unknown'
+
+
+def compare(baseline_path, candidate_path) -> str:
+    """Render the median change of every benchmark between two reports."""
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(candidate_path, 'r') as candidate_file:
+        candidate = json.load(candidate_file)
+
+    lines = [f"{'benchmark':16} {baseline['revision']:>14} {candidate['revision']:>14} {'change':>9}"]
+    for name, result in candidate['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        before = baseline['benchmarks'][name]['median_seconds']
+        after = result['median_seconds']
+        change = (after - before) / before * 100 if before else 0.0
+        lines.append(f"{name:16} {before * 1000:11.2f} ms {after * 1000:11.2f} ms {change:+8.1f}%")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark docker_manager against a fake Docker daemon')
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Runs per benchmark')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the fake daemon waits per request')
+    parser.add_argument('--build-lines', type=int, default=200, help='Build steps streamed per build')
+    parser.add_argument('--replicas', type=int, default=50, help='Containers per bulk create')
+    parser.add_argument('--log-lines', type=int, default=20000, help='Lines per log throughput run')
+    parser.add_argument('--only', nargs='+', help='Run only these benchmarks')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help='Compare two reports instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare(*args.compare))
+        return
+
+    suite = BenchmarkSuite(args.runs, args.latency, args.build_lines, args.replicas, args.log_lines)
+    report = json.dumps(suite.run(args.only), indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+from urllib.parse import urlencode, urlparse, quote
+import asyncio
+import functools
+import json
+import logging
+import os
+import ssl
+
+from docker.errors import APIError, BuildError
+from docker.utils.build import tar
+
+from docker_manager.docker_build_context import DockerBuildContext
+from docker_manager.docker_image_builder import DockerImageBuilder
+from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_utility import DockerUtility
+
+
+class AsyncDockerResponse:
+    """An HTTP response from the daemon whose body is read on the event loop"""
+    def __init__(self, status, headers, reader, writer):
+        self.status = status
+        self.headers = headers
+        self.reader = reader
+        self.writer = writer
+
+    async def iter_chunks(self):
+        """Yields the raw body, decoding chunked transfer encoding."""
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await self.reader.readline()
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    await self.reader.readline()
+                    return
+                data = await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+                yield data
+        elif 'content-length' in self.headers:
+            remaining = int(self.headers['content-length'])
+            while remaining > 0:
+                data = await self.reader.read(min(remaining, 65536))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    return
+                yield data
+
+    async def read(self) -> bytes:
+        """Reads the whole body."""
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+    async def iter_json(self):
+        """Yields each JSON object of a streamed body as soon as it is complete."""
+        decoder = json.JSONDecoder()
+        buffer = ''
+        async for chunk in self.iter_chunks():
+            buffer += chunk.decode('utf-8', errors='replace')
+            while True:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    break
+                try:
+                    obj, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    # wait for the rest of the object
+                    break
+                buffer = buffer[end:]
+                yield obj
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncDockerAPI:
+    """Minimal Docker Engine API client built on asyncio streams, so calls can be cancelled"""
+    def __init__(self, base_url=None, timeout=60, version=None, tls=None):
+        self.base_url = base_url or os.environ.get('DOCKER_HOST') or 'unix:///var/run/docker.sock'
+        self.timeout = timeout
+        self.version = version
+        self.ssl_context = None
+        parsed = urlparse(self.base_url)
+        if parsed.scheme in ('unix', 'http+unix'):
+            self.socket_path = parsed.path
+            self.host = None
+            self.port = None
+        elif parsed.scheme in ('tcp', 'http', 'https'):
+            self.socket_path = None
+            self.host = parsed.hostname
+            if parsed.scheme == 'https' or (parsed.scheme == 'tcp' and tls is not None):
+                self.ssl_context = tls or ssl.create_default_context()
+            self.port = parsed.port or (2376 if self.ssl_context else 2375)
+        else:
+            raise ValueError(f"Unsupported Docker host for the asyncio API: {self.base_url}, "
+                             f"only unix://, tcp:// and https:// hosts are supported")
+
+    @staticmethod
+    def tls_context(environ=None):
+        """The TLS context DOCKER_TLS_VERIFY and DOCKER_CERT_PATH ask for, like docker.from_env. None without TLS."""
+        environ = os.environ if environ is None else environ
+        tls_verify = environ.get('DOCKER_TLS_VERIFY', '') != ''
+        cert_path = environ.get('DOCKER_CERT_PATH') or None
+        if not tls_verify and not cert_path:
+            return None
+        cert_path = cert_path or os.path.join(os.path.expanduser('~'), '.docker')
+        if tls_verify:
+            context = ssl.create_default_context(cafile=os.path.join(cert_path, 'ca.pem'))
+        else:
+            # encrypted, but the daemon's certificate is not checked
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        context.load_cert_chain(os.path.join(cert_path, 'cert.pem'), os.path.join(cert_path, 'key.pem'))
+        return context
+
+    @classmethod
+    def from_config(cls, docker_config, environ=None):
+        """Create an API client with the timeouts configured for the client session and the TLS of the environment."""
+        timeout = docker_config.get_custom_config_value('client_timeout', use_default=True)
+        environ = os.environ if environ is None else environ
+        return cls(base_url=environ.get('DOCKER_HOST'), timeout=timeout or 60, tls=cls.tls_context(environ))
+
+    async def _open(self):
+        """Internal method to open a connection to the daemon."""
+        if self.socket_path is not None:
+            return await asyncio.open_unix_connection(self.socket_path)
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+
+    def _url(self, path, params=None) -> str:
+        """Internal method to build the request target."""
+        if self.version:
+            path = f'/v{self.version}{path}'
+        query = {}
+        for key, value in (params or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            query[key] = value
+        return f'{path}?{urlencode(query)}' if query else path
+
+    async def _send(self, method, path, params=None, body=None, headers=None) -> AsyncDockerResponse:
+        """Internal method to send one request and read the response head."""
+        reader, writer = await self._open()
+        try:
+            request_headers = {'Host': 'docker', 'Connection': 'close', 'User-Agent': 'docker-manager-async'}
+            request_headers.update(headers or {})
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body).encode()
+                request_headers.setdefault('Content-Type', 'application/json')
+            if isinstance(body, bytes):
+                request_headers['Content-Length'] = str(len(body))
+            elif body is not None:
+                request_headers['Content-Length'] = str(os.fstat(body.fileno()).st_size - body.tell())
+
+            head = f'{method} {self._url(path, params)} HTTP/1.1\r\n'
+            head += ''.join(f'{name}: {value}\r\n' for name, value in request_headers.items())
+            writer.write(f'{head}\r\n'.encode())
+            if isinstance(body, bytes):
+                writer.write(body)
+            elif body is not None:
+                # send file bodies, such as build contexts, without loading them into memory
+                for block in iter(lambda: body.read(65536), b''):
+                    writer.write(block)
+                    await writer.drain()
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise APIError(f"Docker daemon closed the connection on {method} {path}")
+            status = int(status_line.split()[1])
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            return AsyncDockerResponse(status, response_headers, reader, writer)
+        except BaseException:
+            writer.close()
+            raise
+
+    @staticmethod
+    async def _raise_for_status(response, method, path):
+        """Internal method to turn an error response into an APIError."""
+        if response.status < 400:
+            return
+        body = await response.read()
+        try:
+            explanation = json.loads(body).get('message', '')
+        except ValueError:
+            explanation = body.decode('utf-8', errors='replace')
+        raise APIError(f"{response.status} Error for {method} {path}: {explanation}", explanation=explanation)
+
+    async def request(self, method, path, params=None, body=None, headers=None, timeout=None):
+        """Send a request and return the decoded JSON body, or None when it is empty."""
+        async def send_and_read():
+            response = await self._send(method, path, params, body, headers)
+            try:
+                await self._raise_for_status(response, method, path)
+                data = await response.read()
+            finally:
+                response.close()
+            return json.loads(data) if data.strip() else None
+
+        return await asyncio.wait_for(send_and_read(), timeout or self.timeout)
+
+    async def stream(self, method, path, params=None, body=None, headers=None, timeout=None):
+        """Async iterator over a streamed JSON body. The timeout applies to each wait for data."""
+        timeout = timeout or self.timeout
+        response = await asyncio.wait_for(self._send(method, path, params, body, headers), timeout)
+        try:
+            await asyncio.wait_for(self._raise_for_status(response, method, path), timeout)
+            objects = response.iter_json()
+            while True:
+                try:
+                    obj = await asyncio.wait_for(objects.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                yield obj
+        finally:
+            response.close()
+
+    async def ping(self, timeout=None) -> bool:
+        response = await asyncio.wait_for(self._send('GET', '/_ping'), timeout or self.timeout)
+        try:
+            await self._raise_for_status(response, 'GET', '/_ping')
+            return (await response.read()).strip() == b'OK'
+        finally:
+            response.close()
+
+
+class AsyncDockerImageBuilder:
+    """asyncio counterpart of DockerImageBuilder"""
+    def __init__(self, docker_config, api=None):
+        self.config = docker_config
+        self.api = api or AsyncDockerAPI.from_config(docker_config)
+        self.build_timeout = self.config.get_custom_config_value('client_build_timeout', use_default=True)
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    async def stream_build(self, path, dockerfile, tag, buildargs=None, labels=None, target=None):
+        """Async iterator over the decoded build stream."""
+        loop = asyncio.get_running_loop()
+        # tarring is local disk work, keep it off the event loop
+        if self.config.get_custom_config_value('cache_build_context', use_default=True):
+            cache_dir = self.config.get_custom_config_value('context_cache_dir', use_default=True)
+            build_context = DockerBuildContext(path, dockerfile, cache_dir or '.docker_manager_cache')
+            archive_path = await loop.run_in_executor(None, build_context.archive)
+            context_file = open(archive_path, 'rb')
+        else:
+            # a temporary archive, like the one the SDK sends when the cache is off
+            context_file = await loop.run_in_executor(None, functools.partial(
+                tar, path, exclude=DockerBuildContext.read_dockerignore(path), dockerfile=(dockerfile, None)))
+        params = {'t': tag, 'dockerfile': dockerfile, 'buildargs': buildargs, 'labels': labels, 'target': target}
+        with context_file:
+            async for chunk in self.api.stream('POST', '/build', params=params, body=context_file,
+                                               headers={'Content-Type': 'application/x-tar'},
+                                               timeout=self.build_timeout):
+                yield chunk
+
+    async def build_image(self):
+        """Build a Docker image using configuration settings."""
+        try:
+            image_name = self.config.get_custom_config_value('image_name', use_default=True)
+            tag_format = self.config.get_custom_config_value('tag_format', use_default=True)
+            # reading git metadata and hashing files is blocking work, keep it off the event loop
+            image_tag = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                DockerUtility.create_tag, tag_format,
+                branch=self.config.get_custom_config_value('tag_branch', use_default=True),
+                dirty=self.config.get_custom_config_value('tag_dirty', use_default=True)))
+            dockerfile = self.config.get_custom_config_value('dockerfile', use_default=True)
+            config_files_dir = self.config.get_custom_config_value('config_files_dir', use_default=True)
+            image_build_path = os.path.join(os.getcwd(), config_files_dir)
+            buildargs = self.config.get_custom_config_value('buildargs', use_default=True)
+            target = self.config.get_custom_config_value('build_target', use_default=True)
+
+            # Validate image name and tag
+            if not image_name or '/' in image_name or not image_tag:
+                raise ValueError("Invalid image name or tag format.")
+
+            image_name_tag = f"{image_name}:{image_tag}"
+            self.logging.log(f"Building image with name:tag {image_name_tag}")
+
+            image_id = None
+            async for chunk in self.stream_build(image_build_path, dockerfile, image_name_tag, buildargs,
+                                                 target=target):
+                if 'error' in chunk:
+                    raise BuildError(chunk['error'].strip(), [chunk])
+                if 'stream' in chunk:
+                    line = chunk['stream'].rstrip('\n')
+                    if line:
+                        self.logging.log(line)
+                    match = DockerImageBuilder._build_success_pattern.search(chunk['stream'])
+                    if match:
+                        image_id = match.group(2)
+                if isinstance(chunk.get('aux'), dict) and 'ID' in chunk['aux']:
+                    image_id = chunk['aux']['ID']
+
+            if image_id is None:
+                raise BuildError('Unknown build error', [])
+            self.logging.log(f"Successfully built {image_name_tag} ({image_id})")
+            return image_name_tag
+        except BuildError as e:
+            self.logging.log(f'Build Error: {e}', level=logging.ERROR)
+            return None
+        except APIError as e:
+            self.logging.log(f'API Error: {e}', level=logging.ERROR)
+            return None
+        except asyncio.TimeoutError:
+            self.logging.log('Timeout Error: the Docker daemon stopped responding', level=logging.ERROR)
+            return None
+        except ValueError as e:
+            self.logging.log(f'Value Error: {e}', level=logging.ERROR)
+            return None
+        except OSError as e:
+            # the daemon could not be reached or the build context could not be read
+            self.logging.log(f'OS Error: {e}', level=logging.ERROR)
+            return None
+
+
+class AsyncDockerContainerManager:
+    """asyncio counterpart of DockerContainerManager, operations can run concurrently on one loop"""
+    def __init__(self, config, api=None):
+        self.config = config
+        self.api = api or AsyncDockerAPI.from_config(config)
+        self.default_tag = 'latest'
+        self.container_name = config.get_custom_config_value('container_name', use_default=True)
+        self.logger = DockerLogging(config, initializer=__class__.__name__)
+
+    async def is_docker_running(self) -> bool:
+        """Check if the Docker daemon answers."""
+        try:
+            return await self.api.ping()
+        except (APIError, OSError, asyncio.TimeoutError):
+            return False
+
+    async def list_containers(self) -> list:
+        """List Docker containers."""
+        try:
+            return await self.api.request('GET', '/containers/json', params={'all': True})
+        except (APIError, OSError, asyncio.TimeoutError) as e:
+            self.logger.log(f"Failed to list Docker containers: {e}")
+            return []
+
+    async def create_container(self, image_name_tag: str, name: str = None):
+        """Create a Docker container and return its ID, or None on failure."""
+        if name is None:
+            tag = image_name_tag.split(':')[1] if ':' in image_name_tag else self.default_tag
+            name = f"{self.container_name}-{tag}"
+
+        self.logger.log(f"{name}")
+
+        try:
+            response = await self.api.request('POST', '/containers/create', params={'name': name},
+                                              body={'Image': image_name_tag, 'Tty': True})
+            return response['Id']
+        except (APIError, OSError, asyncio.TimeoutError) as e:
+            self.logger.log(f"Failed to create Docker container: {e}")
+            return None
+
+    async def start_container(self, container_id: str) -> bool:
+        """Start a created container."""
+        try:
+            await self.api.request('POST', f'/containers/{quote(container_id)}/start')
+            return True
+        except (APIError, OSError, asyncio.TimeoutError) as e:
+            self.logger.log(f"Failed to start Docker container: {e}")
+            return False
@@ -0,0 +1,48 @@
+import json
+import socket
+
+
+class DockerBuildClient:
+    """Submits requests to a DockerBuildServer, only needs the standard library so the CLI starts fast"""
+    def __init__(self, socket_path, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, action, **params) -> dict:
+        """Send one request and wait for its response."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.socket_path)
+            except OSError as e:
+                raise Exception(f'No build server on {self.socket_path}: {e}')
+            connection.sendall(json.dumps(dict(params, action=action)).encode() + b'\n')
+            with connection.makefile('rb') as response_file:
+                line = response_file.readline()
+        if not line:
+            raise Exception('The build server closed the connection without answering')
+        return json.loads(line)
+
+    def _result(self, response):
+        if not response.get('ok'):
+            errors = [container['error'] for container in response.get('containers', []) if not container['ok']]
+            raise Exception(response.get('error') or f"{len(errors)} containers failed: {'; '.join(errors)}")
+        return response
+
+    def ping(self) -> bool:
+        try:
+            return self.request('ping').get('ok', False)
+        except Exception:
+            return False
+
+    def status(self) -> dict:
+        return self._result(self.request('status'))['result']
+
+    def build(self, config_path=None, overrides=None) -> str:
+        """Build on the server. Returns the image name and tag."""
+        return self._result(self.request('build', config=config_path, overrides=overrides))['result']
+
+    def create(self, config_path=None, overrides=None, replicas=None, start=False) -> dict:
+        """Build on the server and create containers from the image. Returns the response."""
+        return self._result(self.request('create', config=config_path, overrides=overrides,
+                                         replicas=replicas, start=start))
@@ -0,0 +1,148 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+import uuid
+from docker.utils.build import exclude_paths
+
+
+class DockerBuildContext:
+    """Keeps an on-disk build context archive that is only re-tarred where files changed"""
+    BLOCK_SIZE = tarfile.BLOCKSIZE
+    # reads of a file that changes in between before giving up
+    MAX_TAR_ATTEMPTS = 3
+
+    def __init__(self, build_path, dockerfile, cache_dir=None):
+        self.build_path = os.path.abspath(build_path)
+        self.dockerfile = dockerfile
+        self.cache_dir = cache_dir
+        # stats of the last archive() call
+        self.size = 0
+        self.tar_seconds = 0.0
+        self.reused_entries = 0
+        self.added_entries = 0
+
+    @staticmethod
+    def read_dockerignore(build_path) -> list:
+        """Returns the exclude patterns of the .dockerignore in build_path."""
+        dockerignore = os.path.join(build_path, '.dockerignore')
+        if not os.path.exists(dockerignore):
+            return []
+        with open(dockerignore, 'r') as file:
+            return [line.strip() for line in file.read().splitlines()
+                    if line.strip() and not line.strip().startswith('#')]
+
+    def list_files(self) -> list:
+        """Returns the sorted relative paths that belong in the context."""
+        exclude = self.read_dockerignore(self.build_path)
+        if self.cache_dir is not None:
+            # never send our own cache when it lives inside the context
+            cache_path = os.path.relpath(os.path.abspath(self.cache_dir), self.build_path)
+            if not cache_path.startswith(os.pardir):
+                exclude.append(cache_path)
+        return sorted(exclude_paths(self.build_path, exclude, dockerfile=self.dockerfile))
+
+    def _cache_key(self) -> str:
+        """Internal method to name the cache files of this context and Dockerfile."""
+        return hashlib.sha1(f'{self.build_path}\0{self.dockerfile}'.encode()).hexdigest()
+
+    def _load_index(self, index_path) -> dict:
+        """Internal method to read the index of the previous archive."""
+        try:
+            with open(index_path, 'r') as file:
+                index = json.load(file)
+            if os.path.isfile(os.path.join(self.cache_dir, index['archive'])):
+                return index
+        except (IOError, ValueError, KeyError):
+            pass
+        return {'archive': None, 'entries': {}}
+
+    @staticmethod
+    def _entry_signature(file_stat) -> list:
+        """Internal method to describe a file well enough to notice a change."""
+        return [file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_mode, file_stat.st_ino]
+
+    def _tar_entry(self, tar_helper, relative_path) -> bytes:
+        """Internal method to produce the tar header and padded data for one file."""
+        full_path = os.path.join(self.build_path, relative_path)
+        for _ in range(self.MAX_TAR_ATTEMPTS):
+            file_stat = os.lstat(full_path)
+            tar_info = tar_helper.gettarinfo(full_path, arcname=relative_path)
+            if tar_info is None:
+                # sockets and other special files can not be archived
+                return b''
+            entry = io.BytesIO()
+            entry.write(tar_info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+            if not tar_info.isfile():
+                return entry.getvalue()
+            try:
+                with open(full_path, 'rb') as file:
+                    # exactly the size in the header, anything else corrupts the archive
+                    tarfile.copyfileobj(file, entry, tar_info.size)
+                    current_stat = os.fstat(file.fileno())
+            except OSError:
+                # the file shrank while it was read
+                continue
+            if current_stat.st_size == tar_info.size and current_stat.st_mtime_ns == file_stat.st_mtime_ns:
+                remainder = tar_info.size % self.BLOCK_SIZE
+                if remainder:
+                    entry.write(tarfile.NUL * (self.BLOCK_SIZE - remainder))
+                return entry.getvalue()
+        raise OSError(f'{relative_path} kept changing while the build context was archived')
+
+    def archive(self) -> str:
+        """Bring the cached archive up to date and return its path."""
+        start_time = time.perf_counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, f'{self._cache_key()}.json')
+        previous = self._load_index(index_path)
+        previous_entries = previous['entries']
+        previous_archive = None
+        if previous['archive']:
+            previous_archive = open(os.path.join(self.cache_dir, previous['archive']), 'rb')
+
+        archive_name = f'{self._cache_key()}-{uuid.uuid4().hex}.tar'
+        entries = {}
+        self.reused_entries = 0
+        self.added_entries = 0
+        tar_helper = tarfile.TarFile(fileobj=io.BytesIO(), mode='w')
+        try:
+            with open(os.path.join(self.cache_dir, archive_name), 'wb') as archive_file:
+                for relative_path in self.list_files():
+                    signature = self._entry_signature(os.lstat(os.path.join(self.build_path, relative_path)))
+                    offset = archive_file.tell()
+                    cached = previous_entries.get(relative_path)
+                    if previous_archive is not None and cached is not None and cached['signature'] == signature:
+                        # unchanged file, copy its bytes from the last archive
+                        previous_archive.seek(cached['offset'])
+                        archive_file.write(previous_archive.read(cached['length']))
+                        self.reused_entries += 1
+                    else:
+                        archive_file.write(self._tar_entry(tar_helper, relative_path))
+                        self.added_entries += 1
+                    entries[relative_path] = {'signature': signature, 'offset': offset,
+                                              'length': archive_file.tell() - offset}
+                # end of archive marker
+                archive_file.write(tarfile.NUL * (self.BLOCK_SIZE * 2))
+                self.size = archive_file.tell()
+        finally:
+            tar_helper.close()
+            if previous_archive is not None:
+                previous_archive.close()
+
+        # publish the new archive atomically, then drop the old one
+        index_fd, index_temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+        with os.fdopen(index_fd, 'w') as index_file:
+            json.dump({'archive': archive_name, 'entries': entries}, index_file)
+        os.replace(index_temp_path, index_path)
+        if previous['archive']:
+            try:
+                os.remove(os.path.join(self.cache_dir, previous['archive']))
+            except OSError:
+                pass
+
+        self.tar_seconds = time.perf_counter() - start_time
+        return os.path.join(self.cache_dir, archive_name)
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import copy
+import logging
+import os
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_config import DockerConfig
+from docker_manager.docker_image_builder import DockerImageBuilder
+from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_stage_graph import DockerStageGraph
+
+
+class DockerBuildPlan:
+    """Builds several images concurrently, ordered by the FROM lines that link them"""
+    BUILT = 'built'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, docker_config, client_session=None):
+        self.config = docker_config
+        self.client_session = client_session or DockerClientSession(docker_config)
+        self.max_parallel_builds = self.config.get_custom_config_value('max_parallel_builds', use_default=True) or 1
+        self.definitions = {}
+        for definition in self.config.get_custom_config_value('build_plan', use_default=True) or []:
+            image_name = definition.get('image_name')
+            if not image_name:
+                raise ValueError(f"Build plan entry without an image_name: {definition}")
+            if image_name in self.definitions:
+                raise ValueError(f"Duplicate image_name in build plan: {image_name}")
+            self.definitions[image_name] = definition
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+        self.status = {}
+
+    def _definition_config(self, definition) -> DockerConfig:
+        """Internal method to create a private config for one image definition."""
+        return self.config.derive(**{**copy.deepcopy(definition), 'build_plan': None})
+
+    @staticmethod
+    def _split_repository(image_reference: str) -> str:
+        """Internal method to strip the tag and digest from an image reference."""
+        repository = image_reference.split('@', 1)[0]
+        if ':' in repository.rsplit('/', 1)[-1]:
+            repository = repository.rsplit(':', 1)[0]
+        return repository
+
+    @classmethod
+    def parse_base_images(cls, dockerfile_path: str, buildargs: dict = None) -> set:
+        """Returns the repositories named by the FROM lines, with ARG values resolved."""
+        stage_graph = DockerStageGraph.from_file(dockerfile_path, buildargs)
+        return {cls._split_repository(base_image) for base_image in stage_graph.external_images()}
+
+    def resolve_dependencies(self) -> dict:
+        """Map each image in the plan to the plan images it is built from."""
+        dependencies = {}
+        for image_name, definition in self.definitions.items():
+            definition_config = self._definition_config(definition)
+            config_files_dir = definition_config.get_custom_config_value('config_files_dir', use_default=True)
+            dockerfile = definition_config.get_custom_config_value('dockerfile', use_default=True)
+            buildargs = definition_config.get_custom_config_value('buildargs', use_default=True)
+            dockerfile_path = os.path.join(os.getcwd(), config_files_dir, dockerfile)
+            base_images = self.parse_base_images(dockerfile_path, buildargs)
+            dependencies[image_name] = {base for base in base_images if base in self.definitions and base != image_name}
+
+        self._check_for_cycles(dependencies)
+        return dependencies
+
+    @staticmethod
+    def _check_for_cycles(dependencies):
+        """Internal method to reject plans whose images depend on each other."""
+        visiting, done = set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Circular build dependency: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for parent in dependencies[name]:
+                visit(parent, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for image_name in dependencies:
+            visit(image_name, [])
+
+    def _build(self, image_name, has_dependents):
+        """Internal method to build one image of the plan."""
+        builder = DockerImageBuilder(self._definition_config(self.definitions[image_name]), self.client_session)
+        image_name_tag = builder.build_image()
+        if image_name_tag is None:
+            raise RuntimeError(f"Build of {image_name} failed")
+        if has_dependents:
+            # dependents name the parent repository, point its latest tag at this build
+            self.client_session.client.images.get(image_name_tag).tag(image_name, 'latest')
+        return image_name_tag
+
+    def execute(self) -> dict:
+        """Build every image in the plan. Returns the name:tag per image, None when not built."""
+        dependencies = self.resolve_dependencies()
+        dependents = {image_name: set() for image_name in dependencies}
+        for image_name, parents in dependencies.items():
+            for parent in parents:
+                dependents[parent].add(image_name)
+
+        waiting_on = {image_name: set(parents) for image_name, parents in dependencies.items()}
+        results = {image_name: None for image_name in dependencies}
+        self.status = {}
+        running = {}
+
+        def cancel_downstream(image_name):
+            for child in dependents[image_name]:
+                if child not in self.status:
+                    self.status[child] = self.CANCELLED
+                    self.logging.log(f"Cancelled {child}, {image_name} did not build", level=logging.WARNING)
+                    cancel_downstream(child)
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_builds) as executor:
+            def submit_ready():
+                for image_name, parents in waiting_on.items():
+                    if not parents and image_name not in self.status and image_name not in running.values():
+                        future = executor.submit(self._build, image_name, bool(dependents[image_name]))
+                        running[future] = image_name
+
+            submit_ready()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    image_name = running.pop(future)
+                    try:
+                        results[image_name] = future.result()
+                        self.status[image_name] = self.BUILT
+                        for child in dependents[image_name]:
+                            waiting_on[child].discard(image_name)
+                    except Exception as e:
+                        self.status[image_name] = self.FAILED
+                        self.logging.log(f"Build plan error for {image_name}: {e}", level=logging.ERROR)
+                        cancel_downstream(image_name)
+                submit_ready()
+
+        return results
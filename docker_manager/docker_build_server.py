@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_config import DockerConfig
+from docker_manager.docker_git_metadata import DockerGitMetadata
+from docker_manager.docker_health_monitor import DockerHealthMonitor
+from docker_manager.docker_logging import DockerLogging
+
+
+class DockerBuildRequestHandler(StreamRequestHandler):
+    """Reads one JSON request per line and answers each with one JSON line"""
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.build_server.handle_request(json.loads(line))
+            except ValueError as e:
+                response = {'ok': False, 'error': f'Invalid request: {e}'}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class DockerBuildSocketServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class DockerBuildServer:
+    """Serves build and create requests on a unix socket with one warm client, merging identical builds"""
+    def __init__(self, docker_config, socket_path=None, client_session=None):
+        self.config = docker_config
+        self.socket_path = socket_path or docker_config.get_custom_config_value('build_server_socket',
+                                                                                use_default=True)
+        self.max_parallel = docker_config.get_custom_config_value('build_server_max_parallel', use_default=True) or 2
+        self.client_session = client_session or DockerClientSession(docker_config)
+        # reconnects the warm client after the daemon restarted, while the server runs
+        self.health_monitor = DockerHealthMonitor(docker_config, self.client_session)
+        # builds queue here, at most max_parallel run at once
+        self.executor = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix=__class__.__name__)
+        self._create_slots = threading.BoundedSemaphore(self.max_parallel)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.coalesced = 0
+        self._server = None
+        self._thread = None
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    def _request_config(self, request) -> DockerConfig:
+        """Internal method to build the config of one request: its config file, or ours, plus its overrides."""
+        config_path = request.get('config')
+        base_config = DockerConfig(config_path) if config_path else self.config
+        return base_config.derive(**(request.get('overrides') or {}))
+
+    @staticmethod
+    def _request_key(action, config) -> str:
+        """Internal method to identify identical requests by their fully resolved config."""
+        snapshot = json.dumps([action, sorted(config.snapshot().items())], default=str, sort_keys=True)
+        return hashlib.sha256(snapshot.encode()).hexdigest()
+
+    def _build(self, config) -> str:
+        from docker_manager.docker_image_builder import DockerImageBuilder
+        # the tag must name the commit checked out now, not when the server started
+        DockerGitMetadata.clear_cache()
+        image_name_tag = DockerImageBuilder(config, self.client_session).build_image()
+        if image_name_tag is None:
+            raise Exception('Build failed, see the build server log')
+        return image_name_tag
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self.completed += 1
+
+    def submit_build(self, config) -> tuple:
+        """Queue a build, or join the identical one already queued or running. Returns (future, coalesced)."""
+        key = self._request_key('build', config)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, True
+            future = self.executor.submit(self._build, config)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future, False
+
+    def _create(self, config, image_name_tag, replicas, start) -> list:
+        from docker_manager.docker_container_manager import DockerContainerManager
+        container_manager = DockerContainerManager(config, self.client_session)
+        with self._create_slots:
+            if replicas:
+                results = container_manager.create_containers(image_name_tag, replicas, start=start)
+                return [{'name': result.name, 'ok': result.ok, 'error': None if result.ok else str(result.error)}
+                        for result in results]
+            container = container_manager.create_container(image_name_tag)
+            if container is None:
+                return [{'name': container_manager._container_name_tag(image_name_tag), 'ok': False,
+                         'error': 'Container creation failed, see the build server log'}]
+            if start:
+                result = container_manager.start_container(container)
+                return [{'name': container.name, 'ok': result.ok, 'error': None if result.ok else str(result.error)}]
+            return [{'name': container.name, 'ok': True, 'error': None}]
+
+    def status(self) -> dict:
+        with self._lock:
+            status = {'in_flight': len(self._in_flight), 'completed': self.completed, 'coalesced': self.coalesced,
+                      'max_parallel': self.max_parallel}
+        status.update(daemon_healthy=self.health_monitor.healthy, daemon_latency=self.health_monitor.latency)
+        return status
+
+    def handle_request(self, request) -> dict:
+        """Run one request and return its response, waiting for the build it needs."""
+        action = request.get('action')
+        try:
+            if action == 'ping':
+                return {'ok': True, 'result': 'pong'}
+            if action == 'status':
+                return {'ok': True, 'result': self.status()}
+            if action not in ('build', 'create'):
+                return {'ok': False, 'error': f'Unknown action: {action}'}
+
+            config = self._request_config(request)
+            future, coalesced = self.submit_build(config)
+            if coalesced:
+                self.logging.log('Joined an identical build already in progress')
+            image_name_tag = future.result()
+            response = {'ok': True, 'result': image_name_tag, 'coalesced': coalesced}
+            if action == 'create':
+                response['containers'] = self._create(config, image_name_tag, request.get('replicas'),
+                                                      request.get('start', False))
+                response['ok'] = all(container['ok'] for container in response['containers'])
+            return response
+        except Exception as e:
+            self.logging.log(f'{action} request failed: {e}', level=logging.ERROR)
+            return {'ok': False, 'error': str(e)}
+
+    def _remove_stale_socket(self):
+        """Internal method to remove a socket left behind by a server that is gone."""
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.remove(self.socket_path)
+                return
+        raise Exception(f'A build server is already listening on {self.socket_path}')
+
+    def start(self) -> 'DockerBuildServer':
+        """Listen on the socket from a background thread."""
+        if os.path.dirname(self.socket_path):
+            os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        self._remove_stale_socket()
+        self._server = DockerBuildSocketServer(self.socket_path, DockerBuildRequestHandler)
+        self._server.build_server = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name=__class__.__name__, daemon=True)
+        self._thread.start()
+        self.health_monitor.start()
+        self.logging.log(f'Build server listening on {self.socket_path}, {self.max_parallel} builds at a time')
+        return self
+
+    def serve_forever(self):
+        """Serve until interrupted."""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop listening, finish the queued builds and remove the socket."""
+        self.health_monitor.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.executor.shutdown(wait=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,83 @@
+import atexit
+import threading
+import weakref
+
+
+class DockerClientSession:
+    """Owns a single pooled Docker client that is shared by every manager"""
+    # the sessions with a client, closed by one exit hook without keeping them alive
+    _connected = weakref.WeakSet()
+
+    def __init__(self, docker_config=None):
+        self.config = docker_config
+        self.pool_size = self._get_config_value('client_pool_size', 10)
+        self.timeout = self._get_config_value('client_timeout', 60)
+        self.build_timeout = self._get_config_value('client_build_timeout', self.timeout)
+        self.keep_alive = self._get_config_value('client_keep_alive', True)
+        self._client = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _get_config_value(self, key, fallback):
+        if self.config is None:
+            return fallback
+        value = self.config.get_custom_config_value(key, use_default=True)
+        return fallback if value is None else value
+
+    @property
+    def client(self) -> 'docker.DockerClient':
+        """Returns the shared client, connecting on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+                    self._closed = False
+                    DockerClientSession._connected.add(self)
+        return self._client
+
+    @property
+    def api(self) -> 'docker.APIClient':
+        """Returns the low-level API client behind the shared client."""
+        return self.client.api
+
+    def _connect(self) -> 'docker.DockerClient':
+        """Internal method to create the pooled client from the environment."""
+        # the SDK is only imported once a client is actually needed
+        import docker
+        client = docker.from_env(timeout=self.timeout, max_pool_size=self.pool_size)
+        if not self.keep_alive:
+            client.api.headers['Connection'] = 'close'
+        return client
+
+    def reconnect(self):
+        """Drop the current client so the next use connects again, e.g. after the daemon restarted."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                # the old connections are being thrown away anyway
+                pass
+
+    def close(self):
+        """Close the shared client, safe to call more than once."""
+        with self._lock:
+            if self._client is None or self._closed:
+                return
+            try:
+                self._client.close()
+            finally:
+                self._client = None
+                self._closed = True
+                DockerClientSession._connected.discard(self)
+
+    @classmethod
+    def close_all(cls):
+        """Close the client of every session still alive, run once at exit."""
+        for session in list(cls._connected):
+            session.close()
+
+
+# make sure the connection pools are released exactly once
+atexit.register(DockerClientSession.close_all)
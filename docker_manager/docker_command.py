@@ -0,0 +1,134 @@
+from collections import deque
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+
+class DockerCommand:
+    """A command whose stdout and stderr are streamed line by line while it runs
+
+    Lines go to the log file, the console and DockerLogging as they arrive. Only the last
+    tail_lines of each stream are kept in memory for error messages.
+    """
+    _print_lock = threading.Lock()
+
+    def __init__(self, command, log_file_path=None, logger=None, stream_output=False, tail_lines=100,
+                 on_line=None, label=None):
+        self.command = command
+        self.log_file_path = log_file_path
+        self.logger = logger
+        self.stream_output = stream_output
+        # called with ('stdout' or 'stderr', line) for every line
+        self.on_line = on_line
+        # prefix of printed lines, tells parallel commands apart
+        self.label = label
+        self.stdout_tail = deque(maxlen=tail_lines)
+        self.stderr_tail = deque(maxlen=tail_lines)
+        self.returncode = None
+        self.cancelled = False
+        self.process = None
+        self._log_file = None
+        self._readers = []
+        self._lock = threading.Lock()
+
+    def start(self) -> 'DockerCommand':
+        """Start the command and the threads reading its output."""
+        if self.log_file_path is not None:
+            self._log_file = open(self.log_file_path, 'w')
+        try:
+            # a new session lets cancel() stop the shell and everything it started
+            self.process = subprocess.Popen(self.command, shell=isinstance(self.command, str),
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                            errors='replace', bufsize=1, start_new_session=True)
+        except OSError:
+            if self._log_file is not None:
+                self._log_file.close()
+            raise
+        for stream_name, pipe, tail in (('stdout', self.process.stdout, self.stdout_tail),
+                                        ('stderr', self.process.stderr, self.stderr_tail)):
+            reader = threading.Thread(target=self._read, args=(stream_name, pipe, tail), daemon=True)
+            reader.start()
+            self._readers.append(reader)
+        return self
+
+    def _read(self, stream_name, pipe, tail):
+        """Internal method to hand every line of one pipe on as soon as it is read."""
+        with pipe:
+            for line in pipe:
+                tail.append(line)
+                self._handle_line(stream_name, line.rstrip('\n'))
+
+    def _handle_line(self, stream_name, line):
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.write(line + '\n')
+                self._log_file.flush()
+        if self.stream_output:
+            with self._print_lock:
+                print(f'[{self.label}] {line}' if self.label else line,
+                      file=sys.stdout if stream_name == 'stdout' else sys.stderr, flush=True)
+            if self.logger is not None:
+                # already on the console, only the log file is missing
+                self.logger.log_message('%s', logging.INFO, line)
+        elif self.logger is not None:
+            self.logger.log('%s', line)
+        if self.on_line is not None:
+            self.on_line(stream_name, line)
+
+    def wait(self, timeout=None, cancel_event=None) -> int:
+        """Wait for the command and its output. Raises subprocess.TimeoutExpired after cancelling it."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.cancel()
+                    raise subprocess.TimeoutExpired(self.command, timeout)
+                if cancel_event is not None and cancel_event.is_set():
+                    self.cancel()
+                    break
+                try:
+                    # wake up regularly to notice the cancel event
+                    self.process.wait(0.1 if remaining is None else min(remaining, 0.1))
+                    break
+                except subprocess.TimeoutExpired:
+                    continue
+        finally:
+            self._finish()
+        return self.returncode
+
+    def cancel(self, grace_period=5.0):
+        """Stop the command: SIGTERM to its process group, SIGKILL after the grace period."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.cancelled = True
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(self.process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                return
+            try:
+                self.process.wait(grace_period)
+                return
+            except subprocess.TimeoutExpired:
+                continue
+
+    def _finish(self):
+        """Internal method to collect the exit status and the remaining output."""
+        self.returncode = self.process.poll()
+        for reader in self._readers:
+            # the pipes close once the last process holding them exits
+            reader.join(1.0 if self.cancelled else None)
+        if self._log_file is not None:
+            with self._lock:
+                self._log_file.close()
+                self._log_file = None
+
+    @property
+    def error_output(self) -> str:
+        """The last lines of stderr, or of stdout when the command wrote nothing to stderr."""
+        return ''.join(self.stderr_tail or self.stdout_tail)
@@ -1,61 +1,246 @@
+from collections import ChainMap
+from types import MappingProxyType
+import hashlib
 import json
-from typing import Any, Optional, Union
+import os
+import tempfile
+from typing import Any, Mapping, Optional, Union
 
 
 class DockerConfig:
+    """Configuration resolved from layered sources: defaults < file < environment < command line
+
+    Every key is resolved once into an immutable snapshot; writes go to the command line layer
+    and invalidate it. derive() gives a build its own copy-on-write layer on top.
+    """
+    ENV_PREFIX = 'DOCKER_MANAGER_'
+    EXTENDS_KEY = 'extends'
+    # merged configs keyed on the mtimes of their source files, None disables the cache
+    CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache')),
+                             'docker_manager', 'configs')
+    _cache_version = 1
+
     def __init__(self, config_path: Optional[str] = None, config_json: Optional[str] = None,
-                 config_dict: Optional[dict] = None):
+                 config_dict: Optional[dict] = None, environ: Optional[Mapping[str, str]] = None):
         if config_dict:
-            self.config = config_dict
+            source = config_dict
         elif config_path:
-            self.config = self.load_config_from_file(config_path)
+            source = self.load_config_from_file(config_path)
         elif config_json:
-            self.config = json.loads(config_json)
+            source = json.loads(config_json)
         else:
             raise ValueError("One of config_path, config_json, or config_dict must be provided")
 
+        self._source = source
+        default_fields = source.get('default_fields', {})
+        self._default_values = {key: field.get('default_value') for key, field in default_fields.items()}
+        self._field_names = {key: field.get('field_name') for key, field in default_fields.items()}
+        self._layers = ChainMap({}, self.load_config_from_environment(environ),
+                                source.setdefault('custom_fields', {}))
+        self._custom = None
+        self._resolved = None
+
+    @property
+    def config(self) -> dict:
+        """The file contents with custom_fields replaced by the merged file, environment and command line values."""
+        return dict(self._source, custom_fields=dict(self.custom_snapshot()))
+
     def print(self):
         print(json.dumps(self.config, indent=2))
 
     def load_config_from_file(self, config_path: str) -> dict:
-        """Loads configuration from a JSON file."""
+        """Loads configuration from a JSON file, merged over the configs it extends."""
+        config_path = os.path.abspath(config_path)
         try:
-            with open(config_path, 'r') as config_file:
-                return json.load(config_file)
+            config = self._load_cached_config(config_path)
+            if config is None:
+                sources = {}
+                config = self._load_merged_config(config_path, sources, ())
+                self.validate_config(config)
+                self._store_cached_config(config_path, sources, config)
+            return config
         except (IOError, json.JSONDecodeError) as e:
             raise ValueError(f"Error loading configuration from file: {e}")
 
+    @classmethod
+    def _load_merged_config(cls, config_path: str, sources: dict, chain: tuple) -> dict:
+        """Internal method to read a config file and deep merge it over its bases, in order."""
+        if config_path in chain:
+            raise ValueError(f"Configuration extends itself: {' -> '.join(chain + (config_path,))}")
+        with open(config_path, 'r') as config_file:
+            sources[config_path] = cls._source_signature(os.fstat(config_file.fileno()))
+            config = json.load(config_file)
+        if not isinstance(config, dict):
+            raise ValueError(f"Configuration is not a JSON object: {config_path}")
+
+        bases = config.pop(cls.EXTENDS_KEY, None) or []
+        if isinstance(bases, str):
+            bases = [bases]
+        merged = {}
+        for base in bases:
+            base_path = os.path.join(os.path.dirname(config_path), os.path.expanduser(base))
+            base_config = cls._load_merged_config(os.path.abspath(base_path), sources, chain + (config_path,))
+            merged = cls.deep_merge(merged, base_config)
+        return cls.deep_merge(merged, config)
+
+    @classmethod
+    def deep_merge(cls, base: dict, override: dict) -> dict:
+        """Returns base updated with override, nested dicts are merged and everything else is replaced."""
+        merged = dict(base)
+        for key, value in override.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = cls.deep_merge(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
+    @staticmethod
+    def validate_config(config: dict) -> None:
+        """Raises ValueError when the merged config does not have the expected shape."""
+        for section in ('custom_fields', 'default_fields'):
+            if not isinstance(config.get(section, {}), dict):
+                raise ValueError(f"'{section}' must be a JSON object")
+        for key, field in config.get('default_fields', {}).items():
+            if not isinstance(field, dict):
+                raise ValueError(f"Default field '{key}' must be a JSON object")
+
+    @staticmethod
+    def _source_signature(stat_result) -> list:
+        return [stat_result.st_mtime_ns, stat_result.st_size]
+
+    @classmethod
+    def _cache_path(cls, config_path: str) -> str:
+        return os.path.join(cls.CACHE_DIR, f"{hashlib.sha256(config_path.encode()).hexdigest()[:32]}.json")
+
+    @classmethod
+    def _load_cached_config(cls, config_path: str) -> Optional[dict]:
+        """Internal method to return the cached merge of config_path while none of its sources changed."""
+        if cls.CACHE_DIR is None:
+            return None
+        try:
+            with open(cls._cache_path(config_path), 'r') as cache_file:
+                cached = json.load(cache_file)
+            if cached.get('version') != cls._cache_version or cached.get('config_path') != config_path:
+                return None
+            for source_path, signature in cached['sources'].items():
+                if cls._source_signature(os.stat(source_path)) != signature:
+                    return None
+            return cached['config']
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+
+    @classmethod
+    def _store_cached_config(cls, config_path: str, sources: dict, config: dict) -> None:
+        """Internal method to save a merged config, the cache is best effort."""
+        if cls.CACHE_DIR is None:
+            return
+        temp_path = None
+        try:
+            os.makedirs(cls.CACHE_DIR, exist_ok=True)
+            cache_fd, temp_path = tempfile.mkstemp(dir=cls.CACHE_DIR, suffix='.json.tmp')
+            with os.fdopen(cache_fd, 'w') as cache_file:
+                json.dump({'version': cls._cache_version, 'config_path': config_path,
+                           'sources': sources, 'config': config}, cache_file)
+            os.replace(temp_path, cls._cache_path(config_path))
+        except (OSError, TypeError, ValueError):
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def load_config_from_environment(cls, environ: Optional[Mapping[str, str]] = None) -> dict:
+        """Loads DOCKER_MANAGER_<KEY> variables, values are parsed as JSON when possible."""
+        environ = os.environ if environ is None else environ
+        values = {}
+        for name, raw_value in environ.items():
+            if not name.startswith(cls.ENV_PREFIX) or name == cls.ENV_PREFIX:
+                continue
+            try:
+                value = json.loads(raw_value)
+            except json.JSONDecodeError:
+                value = raw_value
+            values[name[len(cls.ENV_PREFIX):].lower()] = value
+        return values
+
+    def overrides(self) -> dict:
+        """The environment and command line values, everything that is not read from the config files."""
+        return {key: value for mapping in reversed(self._layers.maps[:-1]) for key, value in mapping.items()}
+
+    def custom_snapshot(self) -> Mapping[str, Any]:
+        """Read-only view of the custom values of all layers, without defaults."""
+        custom = self._custom
+        if custom is None:
+            custom = MappingProxyType({key: value for key, value in self._layers.items() if value is not None})
+            self._custom = custom
+        return custom
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """Read-only view of every key resolved through all layers, defaults included."""
+        resolved = self._resolved
+        if resolved is None:
+            resolved = MappingProxyType({**self._default_values, **self.custom_snapshot()})
+            self._resolved = resolved
+        return resolved
+
+    def _invalidate(self):
+        self._custom = None
+        self._resolved = None
+
     def get_default_config_value(self, key: str) -> Any:
         """Gets a specific default configuration item value."""
-        return self.config.get('default_fields', {}).get(key, {}).get('default_value')
+        return self._default_values.get(key)
 
     def get_default_config_name(self, key: str) -> Any:
         """Gets a specific default configuration item name."""
-        return self.config.get('default_fields', {}).get(key, {}).get('field_name')
+        return self._field_names.get(key)
 
     def get_custom_config_value(self, key: str, use_default: bool = False) -> Any:
         """Gets a specific custom configuration item value."""
-        value = self.config.get('custom_fields', {}).get(key)
-        if use_default and value is None:
-            value = self.get_default_config_value(key)
-        return value
+        if use_default:
+            return self.snapshot().get(key)
+        return self.custom_snapshot().get(key)
 
     def add_custom_value(self, key: str, value: Union[str, list, bool]) -> None:
         """Adds a custom value to the configuration. Handles both single and multiple values."""
-        custom_fields = 'custom_fields'
-        if custom_fields not in self.config:
-            self.config[custom_fields] = {}
-
         if isinstance(value, list):
-            # Check if the key exists and its value is a list
-            if key in self.config[custom_fields] and isinstance(self.config[custom_fields][key], list):
-                # Append individual elements of the input list that are not already in the existing list
-                for item in value:
-                    if item not in self.config[custom_fields][key]:
-                        self.config[custom_fields][key].append(item)
+            existing = self.get_custom_config_value(key)
+            if isinstance(existing, list):
+                # Append the elements of the input list that are not already in the existing list,
+                # building a new list so snapshots and derived configs keep the old one
+                value = existing + self._missing_items(existing, value)
             else:
-                # Set the value for the key as the input list
-                self.config[custom_fields][key] = value
-        else:  # it's a str or bool
-            # Set the value for the key as the input string
-            self.config[custom_fields][key] = value
+                value = list(value)
+        self._layers.maps[0][key] = value
+        self._invalidate()
+
+    @staticmethod
+    def _missing_items(existing: list, items: list) -> list:
+        """Internal method to return the items not in the existing list, in order and without repeats."""
+        try:
+            seen = set(existing)
+            missing = []
+            for item in items:
+                if item not in seen:
+                    seen.add(item)
+                    missing.append(item)
+            return missing
+        except TypeError:
+            # unhashable items such as dicts, fall back to comparing by equality
+            missing = []
+            for item in items:
+                if item not in existing and item not in missing:
+                    missing.append(item)
+            return missing
+
+    def derive(self, **overrides) -> 'DockerConfig':
+        """Returns a config that sees this config's current values plus the overrides.
+
+        Writes to the derived config never reach this one, so concurrent builds can each own one.
+        """
+        derived = object.__new__(DockerConfig)
+        derived._source = self._source
+        derived._default_values = self._default_values
+        derived._field_names = self._field_names
+        derived._layers = ChainMap(dict(overrides), dict(self.custom_snapshot()))
+        derived._custom = None
+        derived._resolved = None
+        return derived
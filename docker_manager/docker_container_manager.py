@@ -1,19 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
 from docker.models.containers import Container
-from docker.errors import DockerException
-import docker
+from docker.errors import DockerException, NotFound
+import time
 
+from docker_manager.docker_client_session import DockerClientSession
 from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_metrics import DockerMetrics
+
+
+class DockerContainerResult:
+    """Outcome of one container in a bulk operation"""
+    def __init__(self, name, container=None, started=False, error=None):
+        self.name = name
+        self.container = container
+        self.started = started
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else f'error: {self.error}'
+        return f'DockerContainerResult({self.name}, {status})'
 
 
 class DockerContainerManager:
-    def __init__(self, config):
-        self.client = docker.from_env()
+    def __init__(self, config, client_session=None):
+        self.client_session = client_session or DockerClientSession(config)
         self.config = config
         self.default_tag = 'latest'
         self.container_name = config.get_custom_config_value('container_name', use_default=True)
-        # let the logger know it's us
-        self.config.add_custom_value('initializer', __class__.__name__)
-        self.logger = DockerLogging(config)
+        self.max_parallel_containers = config.get_custom_config_value('max_parallel_containers', use_default=True) or 4
+        self.logger = DockerLogging(config, initializer=__class__.__name__)
+
+    @property
+    def client(self):
+        return self.client_session.client
 
     def list_containers(self) -> [Container]:
         """List Docker containers."""
@@ -23,22 +46,206 @@ class DockerContainerManager:
             print(f"Failed to list Docker containers: {e}")
             return []
 
-    def create_container(self, image_name_tag: str) -> Container:
-        """Create a Docker container using the supplied image name and configuration settings."""
-        # set up variables
+    def _container_name_tag(self, image_name_tag: str) -> str:
+        """Internal method to name a container after the tag of its image."""
         if ':' in image_name_tag:
             name, tag = image_name_tag.split(':')
         else:
             name = image_name_tag
             tag = self.default_tag  # Default tag if not specified
 
-        # container_name = self.config.get_custom_config_value(self.container_name, use_default=True)
-        container_name_tag = f"{self.container_name}-{tag}"
+        return f"{self.container_name}-{tag}"
+
+    def create_container(self, image_name_tag: str) -> Container:
+        """Create a Docker container using the supplied image name and configuration settings."""
+        container_name_tag = self._container_name_tag(image_name_tag)
 
         self.logger.log(f"{container_name_tag}")
 
         try:
-            return self.client.containers.create(image_name_tag, name=container_name_tag, detach=True, tty=True)
+            with DockerMetrics.phase('create_container'):
+                return self.client.containers.create(image_name_tag, name=container_name_tag, detach=True, tty=True)
         except DockerException as e:
             self.logger.log(f"Failed to create Docker container: {e}")
             return None
+
+    def replica_names(self, image_name_tag: str, replicas: int) -> [str]:
+        """Deterministic names for the replicas of an image: {container_name}-{tag}-{index}."""
+        container_name_tag = self._container_name_tag(image_name_tag)
+        return [f"{container_name_tag}-{index}" for index in range(1, replicas + 1)]
+
+    def _create_replica(self, image_name_tag: str, name: str, start: bool) -> DockerContainerResult:
+        """Internal method to create, and optionally start, one replica."""
+        result = DockerContainerResult(name)
+        try:
+            with DockerMetrics.phase('create_container'):
+                result.container = self.client.containers.create(image_name_tag, name=name, detach=True, tty=True)
+            if start:
+                with DockerMetrics.phase('start_container'):
+                    result.container.start()
+                result.started = True
+        except DockerException as e:
+            result.error = e
+        return result
+
+    def create_containers(self, image_name_tag: str, replicas: int, start: bool = False) -> [DockerContainerResult]:
+        """Create replicas of an image concurrently. Every replica is attempted and gets its own result."""
+        names = self.replica_names(image_name_tag, replicas)
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_containers, max(replicas, 1))) as executor:
+            results = list(executor.map(lambda name: self._create_replica(image_name_tag, name, start), names))
+
+        for result in results:
+            if result.ok:
+                self.logger.log(f"{result.name}{' started' if result.started else ''}")
+            else:
+                self.logger.log(f"Failed to create Docker container {result.name}: {result.error}")
+        return results
+
+    # lifecycle actions and the low-level API calls behind them
+    _api_calls = {'start': 'start', 'stop': 'stop', 'restart': 'restart', 'remove': 'remove_container'}
+    _past_tense = {'start': 'started', 'stop': 'stopped', 'restart': 'restarted', 'remove': 'removed'}
+
+    @staticmethod
+    def _reference(container) -> str:
+        """Internal method to accept a Container, a name or an ID wherever a container is expected."""
+        return container.name if isinstance(container, Container) else container
+
+    def _operate(self, action: str, container, **kwargs) -> DockerContainerResult:
+        """Internal method to run one lifecycle call of the low-level API, which takes names without a lookup."""
+        result = DockerContainerResult(self._reference(container),
+                                       container if isinstance(container, Container) else None)
+        try:
+            with DockerMetrics.phase(f'{action}_container'):
+                getattr(self.client_session.api, self._api_calls[action])(result.name, **kwargs)
+            result.started = action in ('start', 'restart')
+        except DockerException as e:
+            result.error = e
+        return result
+
+    def _operate_all(self, action: str, containers, **kwargs) -> [DockerContainerResult]:
+        """Internal method to run one lifecycle call on many containers concurrently, each with its own result."""
+        containers = list(containers)
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_containers, max(len(containers), 1))) as executor:
+            results = list(executor.map(lambda container: self._operate(action, container, **kwargs), containers))
+
+        for result in results:
+            if result.ok:
+                self.logger.log(f"{result.name} {self._past_tense[action]}")
+            else:
+                self.logger.log(f"Failed to {action} Docker container {result.name}: {result.error}")
+        return results
+
+    def start_container(self, container) -> DockerContainerResult:
+        return self._operate_all('start', [container])[0]
+
+    def stop_container(self, container, timeout: int = None) -> DockerContainerResult:
+        """Stop a container, killing it after timeout seconds (the daemon's default of 10 when None)."""
+        return self._operate_all('stop', [container], **self._stop_timeout(timeout))[0]
+
+    def restart_container(self, container, timeout: int = None) -> DockerContainerResult:
+        return self._operate_all('restart', [container], **self._stop_timeout(timeout))[0]
+
+    def remove_container(self, container, force: bool = False, volumes: bool = False) -> DockerContainerResult:
+        """Remove a container, with force even while it runs."""
+        return self._operate_all('remove', [container], force=force, v=volumes)[0]
+
+    def start_containers(self, containers) -> [DockerContainerResult]:
+        return self._operate_all('start', containers)
+
+    def stop_containers(self, containers, timeout: int = None) -> [DockerContainerResult]:
+        return self._operate_all('stop', containers, **self._stop_timeout(timeout))
+
+    def restart_containers(self, containers, timeout: int = None) -> [DockerContainerResult]:
+        return self._operate_all('restart', containers, **self._stop_timeout(timeout))
+
+    def remove_containers(self, containers, force: bool = False, volumes: bool = False) -> [DockerContainerResult]:
+        return self._operate_all('remove', containers, force=force, v=volumes)
+
+    @staticmethod
+    def _stop_timeout(timeout) -> dict:
+        return {} if timeout is None else {'timeout': timeout}
+
+    @staticmethod
+    def _has_healthcheck(details: dict) -> bool:
+        """Internal method to tell from an inspect result whether the container, or its image, defines a healthcheck."""
+        test = ((details.get('Config') or {}).get('Healthcheck') or {}).get('Test')
+        return bool(test) and test != ['NONE']
+
+    @staticmethod
+    def _is_ready(state: dict, healthy: bool, has_healthcheck: bool) -> bool:
+        if not state.get('Running'):
+            return False
+        # a container without a healthcheck is ready once it runs
+        return not (healthy and has_healthcheck) or (state.get('Health') or {}).get('Status') == 'healthy'
+
+    def wait_until_ready(self, containers, healthy: bool = False, timeout: float = 60) -> [DockerContainerResult]:
+        """Wait until every container runs, or with healthy until its healthcheck passes.
+
+        Subscribes to the daemon's container events before looking at the current state, so a
+        container counts as ready the moment its start or health_status event arrives.
+        """
+        names = [self._reference(container) for container in containers]
+        results = {name: DockerContainerResult(name) for name in names}
+        has_healthcheck = {}
+        # events name containers by name and ID, either may have been passed in
+        aliases = {}
+        started = time.time()
+        with DockerMetrics.phase('wait_container', healthy=healthy):
+            # the daemon ends the stream at until, which bounds the wait without polling
+            events = self.client_session.api.events(
+                since=started, until=started + timeout, decode=True,
+                filters={'type': 'container', 'container': names,
+                         'event': ['start', 'restart', 'die', 'destroy', 'health_status']})
+            try:
+                pending = set(names)
+                for name in names:
+                    try:
+                        details = self.client_session.api.inspect_container(name)
+                    except NotFound as e:
+                        results[name].error = e
+                        pending.discard(name)
+                        continue
+                    has_healthcheck[name] = self._has_healthcheck(details)
+                    aliases.update({details.get('Name', '').lstrip('/'): name, details.get('Id'): name})
+                    if self._is_ready(details.get('State') or {}, healthy, has_healthcheck[name]):
+                        results[name].started = True
+                        pending.discard(name)
+
+                for event in events if pending else ():
+                    actor = event.get('Actor') or {}
+                    attributes = actor.get('Attributes') or {}
+                    name = aliases.get(attributes.get('name')) or aliases.get(actor.get('ID') or event.get('id'))
+                    if name not in pending:
+                        continue
+                    action = event.get('Action') or event.get('status') or ''
+                    if action == 'die':
+                        results[name].error = Exception(f"Exited with code {attributes.get('exitCode')} "
+                                                        f"before it was ready")
+                    elif action == 'destroy':
+                        results[name].error = Exception('Removed before it was ready')
+                    elif action == 'health_status: healthy' or \
+                            (action in ('start', 'restart') and not (healthy and has_healthcheck.get(name))):
+                        results[name].started = True
+                    else:
+                        continue
+                    pending.discard(name)
+                    if not pending:
+                        break
+            finally:
+                events.close()
+
+        for name in names:
+            result = results[name]
+            if not result.started and result.ok:
+                result.error = Exception(f"Not {'healthy' if healthy else 'running'} after {timeout} seconds")
+            if result.ok:
+                self.logger.log(f"{name} is {'healthy' if healthy else 'running'}")
+            else:
+                self.logger.log(f"{name} is not ready: {result.error}")
+        return [results[name] for name in names]
+
+    def wait_until_running(self, container, timeout: float = 60) -> DockerContainerResult:
+        return self.wait_until_ready([container], timeout=timeout)[0]
+
+    def wait_until_healthy(self, container, timeout: float = 60) -> DockerContainerResult:
+        return self.wait_until_ready([container], healthy=True, timeout=timeout)[0]
@@ -1,70 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
 import shutil
+import tempfile
+import time
 from docker_manager.docker_service_manager import DockerServiceManager
 
 from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_metrics import DockerMetrics
 
 
 class DockerDependencyChecker:
+    # file in context_cache_dir holding the results of successful environment checks
+    CACHE_FILE = 'environment.json'
 
-    def __init__(self, config):
+    def __init__(self, config, client_session=None):
         self.config = config
+        self.client_session = client_session
         self.os_dependencies = config.get_default_config_name('os_dependencies')
         self.config_files_dir = config.get_default_config_name('config_files_dir')
         self.required_config_files = config.get_default_config_name('required_config_files')
-        # let the logger know it's us
-        self.config.add_custom_value('initializer', __class__.__name__)
-        self.logging = DockerLogging(config)
+        self.cache_ttl = config.get_custom_config_value('dependency_cache_ttl', use_default=True) or 0
+        self.cache_dir = config.get_custom_config_value('context_cache_dir', use_default=True)
+        self.docker_start_timeout = config.get_custom_config_value('docker_start_timeout', use_default=True) or 30
+        self.logging = DockerLogging(config, initializer=__class__.__name__)
 
-    def _check_dependencies(self):
+    @staticmethod
+    def _resolve_dependency(dependency):
+        """Internal method to find a command on PATH. Returns [path, inode, mtime] or None."""
+        path = shutil.which(dependency)  # Using shutil.which to check for command availability
+        if not path:
+            return None
+        try:
+            stat_result = os.stat(path)
+            return [path, stat_result.st_ino, stat_result.st_mtime_ns]
+        except OSError:
+            return [path, None, None]
+
+    @staticmethod
+    def _stat_required_file(path) -> tuple:
+        """Internal method to check a required file. Returns (exists, mtime)."""
+        if not os.path.isfile(path):
+            return False, None
+        try:
+            return True, os.stat(path).st_mtime_ns
+        except OSError:
+            return True, None
+
+    def _dependencies(self) -> list:
+        return self.config.get_custom_config_value(self.os_dependencies, use_default=True) or []
+
+    def _required_file_paths(self) -> dict:
+        """Internal method to map every required file to the path it is checked at."""
+        config_dir = self.config.get_custom_config_value(self.config_files_dir, use_default=True)
+        required_files = self.config.get_custom_config_value(self.required_config_files, use_default=True) or []
+
+        paths = {}
+        for file in required_files:
+            # Check if the file already starts with config_dir and adjust accordingly
+            if config_dir is None or file.startswith(config_dir):
+                paths[file] = file
+            else:
+                paths[file] = os.path.join(config_dir, file)
+        return paths
+
+    def _check_dependencies(self, executor=None) -> dict:
         """Internal method to check for required dependencies."""
-        dependencies = self.config.get_custom_config_value(self.os_dependencies, use_default=True)
+        dependencies = self._dependencies()
 
         # No os_dependencies, no check needed
-        if dependencies is None or len(dependencies) == 0:
-            return
+        if len(dependencies) == 0:
+            return {}
 
-        missing_dependencies = []
-        for dep in dependencies:
-            if not shutil.which(dep):  # Using shutil.which to check for command availability
-                missing_dependencies.append(dep)
+        results = dict(zip(dependencies, (executor.map if executor else map)(self._resolve_dependency, dependencies)))
+        missing_dependencies = [dep for dep, binary in results.items() if binary is None]
 
         if missing_dependencies:
             raise Exception(f"Missing dependencies: {', '.join(missing_dependencies)}")
+        return results
 
-    def _check_required_files(self):
+    def _check_required_files(self, executor=None) -> dict:
         """Internal method to check for required files."""
-        config_dir = self.config.get_custom_config_value(self.config_files_dir, use_default=True)
-        required_files = self.config.get_custom_config_value(self.required_config_files, use_default=True)
+        paths = self._required_file_paths()
 
         # No required_files, no check needed
-        if required_files is None or len(required_files) == 0:
-            return
+        if len(paths) == 0:
+            return {}
 
-        missing_files = []
-
-        for file in required_files:
-            # Check if the file already starts with config_dir and adjust accordingly
-            if config_dir is None or file.startswith(config_dir):
-                req_file = file
-            else:
-                req_file = os.path.join(config_dir, file)
-
-            if not os.path.isfile(req_file):
-                missing_files.append(file)
+        results = dict(zip(paths, (executor.map if executor else map)(self._stat_required_file, paths.values())))
+        missing_files = [file for file, (exists, _) in results.items() if not exists]
 
         if missing_files:
             raise FileNotFoundError(f"Missing required files: {', '.join(missing_files)}")
+        return {os.path.abspath(paths[file]): mtime for file, (_, mtime) in results.items()}
+
+    @staticmethod
+    def _path_directories() -> dict:
+        """Internal method to stat the PATH directories, a new command in any of them changes an mtime."""
+        directories = {}
+        for directory in os.environ.get('PATH', '').split(os.pathsep):
+            try:
+                directories[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                directories[directory] = None
+        return directories
+
+    def _cache_key(self) -> str:
+        """Internal method to name the cache entry of this PATH and set of checks."""
+        key = [os.environ.get('PATH', ''), sorted(self._dependencies()),
+               sorted(os.path.abspath(path) for path in self._required_file_paths().values())]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def _cache_path(self) -> str:
+        return os.path.join(self.cache_dir, self.CACHE_FILE)
+
+    def _read_cache(self) -> dict:
+        try:
+            with open(self._cache_path(), 'r') as cache_file:
+                entries = json.load(cache_file)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _cached_check_is_valid(self) -> bool:
+        """Internal method to tell whether the last successful check still holds."""
+        if not self.cache_ttl or not self.cache_dir:
+            return False
+        entry = self._read_cache().get(self._cache_key())
+        if not entry or entry.get('expires', 0) < time.time():
+            return False
+        try:
+            if entry['path_directories'] != self._path_directories():
+                return False
+            for path, inode, mtime in entry['dependencies'].values():
+                stat_result = os.stat(path)
+                if [stat_result.st_ino, stat_result.st_mtime_ns] != [inode, mtime]:
+                    return False
+            for path, mtime in entry['files'].items():
+                if os.stat(path).st_mtime_ns != mtime:
+                    return False
+        except (OSError, KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def _store_check(self, dependencies, files):
+        """Internal method to remember a successful check, the cache is best effort."""
+        if not self.cache_ttl or not self.cache_dir:
+            return
+        now = time.time()
+        # drop expired entries so the file does not grow with every PATH seen
+        entries = {key: entry for key, entry in self._read_cache().items()
+                   if isinstance(entry, dict) and entry.get('expires', 0) >= now}
+        entries[self._cache_key()] = {
+            'expires': now + self.cache_ttl,
+            'path_directories': self._path_directories(),
+            'dependencies': dependencies,
+            'files': files
+        }
+        temp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+            with os.fdopen(cache_fd, 'w') as cache_file:
+                json.dump(entries, cache_file)
+            os.replace(temp_path, self._cache_path())
+        except OSError:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def check_environment(self):
+        """Checks the dependencies and required files, reusing a recent successful check."""
+        if self._cached_check_is_valid():
+            self.logging.log('Environment check cached, skipping dependency and file checks')
+            return
+        checks = len(self._dependencies()) + len(self._required_file_paths())
+        with ThreadPoolExecutor(max_workers=max(1, min(checks, 16))) as executor:
+            dependencies = self._check_dependencies(executor)
+            files = self._check_required_files(executor)
+        self._store_check(dependencies, files)
 
     def prepare_environment(self):
         """Public method that gets the env ready."""
         try:
-            self._check_dependencies()
-            self._check_required_files()
-            # ensure the docker service is up and running
-            if not DockerServiceManager.is_docker_running():
-                DockerServiceManager.start_docker()
-            # Additional setup or checks can go here
+            with DockerMetrics.phase('prepare_environment'):
+                with DockerMetrics.phase('dependency_check'):
+                    self.check_environment()
+                # ensure the docker service is up and running
+                with DockerMetrics.phase('docker_service'):
+                    if not DockerServiceManager.is_docker_running(self.client_session):
+                        DockerServiceManager.start_docker()
+                        # the service command returns before the socket accepts requests
+                        if not DockerServiceManager.wait_until_ready(self.client_session,
+                                                                     timeout=self.docker_start_timeout):
+                            raise Exception(f"Docker daemon not ready after {self.docker_start_timeout} seconds")
+                # Additional setup or checks can go here
         except Exception as e:
             print(e)
             exit(1)
@@ -0,0 +1,275 @@
+import asyncio
+import copy
+import logging
+import threading
+import time
+import weakref
+
+from docker.errors import NotFound
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_image_inventory import DockerImageInventory, DockerImageSummary
+from docker_manager.docker_logging import DockerLogging
+
+
+class DockerEventSubscription:
+    """A callback and the events it wants: type, actions, actor name and labels"""
+    def __init__(self, callback, event_type=None, actions=None, name=None, labels=None):
+        self.callback = callback
+        self.event_type = event_type
+        self.actions = set(actions) if actions else None
+        self.name = name
+        self.labels = DockerEventMonitor.label_pairs(labels)
+
+    def matches(self, event) -> bool:
+        attributes = (event.get('Actor') or {}).get('Attributes') or {}
+        if self.event_type and event.get('Type') != self.event_type:
+            return False
+        if self.actions and event.get('Action') not in self.actions:
+            return False
+        if self.name and attributes.get('name') != self.name:
+            return False
+        return DockerEventMonitor.labels_match(attributes, self.labels)
+
+
+class DockerEventMonitor:
+    """Holds one events stream to the daemon and keeps a view of its containers and images
+
+    The view is listed once per connection and then updated from container and image events,
+    so it can be queried without calling the API. Callbacks and async iterators receive the
+    decoded events, optionally filtered by type, action, name or labels. Use for_session()
+    to share one monitor, and one connection, per client session.
+    """
+    INITIAL_RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 30.0
+    # container actions and the state they leave the container in. kill and oom are not listed, a signal
+    # may leave the container running and a container that stops is reported by its own die event
+    CONTAINER_STATES = {'create': 'created', 'start': 'running', 'restart': 'running', 'unpause': 'running',
+                        'pause': 'paused', 'die': 'exited', 'stop': 'exited'}
+    _sessions = weakref.WeakKeyDictionary()
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, docker_config, client_session=None):
+        self.client_session = client_session or DockerClientSession(docker_config)
+        self.connections = 0
+        self.events_seen = 0
+        self.ready = threading.Event()
+        self._containers = {}
+        self._images = {}
+        self._subscriptions = []
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._stream = None
+        self._thread = None
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    @classmethod
+    def for_session(cls, docker_config, client_session) -> 'DockerEventMonitor':
+        """Returns the monitor shared by everything using client_session, started on first use."""
+        with cls._sessions_lock:
+            monitor = cls._sessions.get(client_session)
+            if monitor is None:
+                monitor = cls._sessions[client_session] = cls(docker_config, client_session).start()
+            return monitor
+
+    @classmethod
+    def running_for(cls, client_session):
+        """Returns the started monitor of client_session, None when nobody started one."""
+        with cls._sessions_lock:
+            monitor = cls._sessions.get(client_session)
+        return monitor if monitor is not None and monitor.ready.is_set() else None
+
+    @staticmethod
+    def label_pairs(labels) -> dict:
+        """Normalizes labels given as a dict, 'key=value' or 'key' strings to {key: value or None}."""
+        if not labels:
+            return {}
+        if isinstance(labels, dict):
+            return dict(labels)
+        pairs = {}
+        for label in [labels] if isinstance(labels, str) else labels:
+            key, separator, value = label.partition('=')
+            pairs[key] = value if separator else None
+        return pairs
+
+    @staticmethod
+    def labels_match(actual, wanted) -> bool:
+        return all(key in actual and (value is None or actual[key] == value) for key, value in wanted.items())
+
+    # the view
+
+    def _seed(self):
+        """Internal method to list the containers and images the events will keep up to date."""
+        containers = {container['Id']: container for container in self.client_session.api.containers(all=True)}
+        images = {image['Id']: DockerImageSummary(image) for image in self.client_session.api.images()}
+        with self._lock:
+            self._containers = containers
+            self._images = images
+
+    def _container_record(self, container_id):
+        """Internal method to inspect a container into the shape the list endpoint returns, None once it is gone."""
+        try:
+            details = self.client_session.api.inspect_container(container_id)
+        except NotFound:
+            return None
+        state = details.get('State') or {}
+        return {'Id': details['Id'], 'Names': [details.get('Name', '')], 'Image': details['Config'].get('Image'),
+                'ImageID': details.get('Image'), 'State': state.get('Status'),
+                'Labels': details['Config'].get('Labels') or {}, 'Health': (state.get('Health') or {}).get('Status')}
+
+    def _apply(self, event):
+        """Internal method to update the view from one event, inspecting only what the event does not tell."""
+        actor = event.get('Actor') or {}
+        action = event.get('Action') or ''
+        object_id = actor.get('ID') or event.get('id')
+        if event.get('Type') == 'container':
+            with self._lock:
+                container = self._containers.get(object_id)
+                if action == 'destroy':
+                    self._containers.pop(object_id, None)
+                    return
+                if container is not None and action not in ('create', 'rename'):
+                    if action.startswith('health_status:'):
+                        container['Health'] = action.split(':', 1)[1].strip()
+                    elif action in self.CONTAINER_STATES:
+                        container['State'] = self.CONTAINER_STATES[action]
+                    return
+            # a new or renamed container, or one created while we were not listening
+            record = self._container_record(object_id)
+            with self._lock:
+                if record is None:
+                    self._containers.pop(object_id, None)
+                else:
+                    self._containers[record['Id']] = record
+        elif event.get('Type') == 'image':
+            try:
+                summary = DockerImageSummary(self.client_session.api.inspect_image(object_id))
+            except NotFound:
+                summary = None
+            with self._lock:
+                if summary is None:
+                    self._images.pop(object_id, None)
+                else:
+                    self._images[summary.id] = summary
+
+    def containers(self, name=None, labels=None, state=None) -> list:
+        """Returns copies of the known containers, in the shape of the containers list endpoint."""
+        wanted = self.label_pairs(labels)
+        with self._lock:
+            return [copy.deepcopy(container) for container in self._containers.values()
+                    if (name is None or f'/{name}' in container.get('Names', []))
+                    and (state is None or container.get('State') == state)
+                    and self.labels_match(container.get('Labels') or {}, wanted)]
+
+    def container(self, name_or_id):
+        with self._lock:
+            for container in self._containers.values():
+                if container['Id'] == name_or_id or f'/{name_or_id}' in container.get('Names', []):
+                    return copy.deepcopy(container)
+        return None
+
+    def images(self, repository=None, labels=None) -> list:
+        """Returns the known images as DockerImageSummary."""
+        wanted = self.label_pairs(labels)
+        with self._lock:
+            return [image for image in self._images.values()
+                    if (repository is None or any(DockerImageInventory.split_repo_tag(tag)[0] == repository
+                                                  for tag in image.repo_tags))
+                    and self.labels_match(image.labels, wanted)]
+
+    # subscribers
+
+    def subscribe(self, callback, event_type=None, actions=None, name=None, labels=None) -> DockerEventSubscription:
+        """Call callback(event) from the monitor thread for every matching event. Returns the subscription."""
+        subscription = DockerEventSubscription(callback, event_type, actions, name, labels)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    async def stream(self, event_type=None, actions=None, name=None, labels=None):
+        """Async iterator over matching events, for use in an event loop."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        subscription = self.subscribe(lambda event: loop.call_soon_threadsafe(queue.put_nowait, event),
+                                      event_type, actions, name, labels)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(subscription)
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.matches(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.callback(event)
+            except Exception as e:
+                # one broken subscriber must not stop the others
+                self.logging.log(f'Event callback failed: {e}', level=logging.ERROR)
+
+    def handle_event(self, event):
+        """Apply one decoded event to the view and hand it to the subscribers."""
+        self.events_seen += 1
+        self._apply(event)
+        self._dispatch(event)
+
+    # the connection
+
+    def _connect(self):
+        """Internal method to subscribe, then list, so nothing that happens in between is lost."""
+        self._stream = self.client_session.api.events(since=time.time(), decode=True,
+                                                      filters={'type': ['container', 'image', 'builder']})
+        self._seed()
+        self.connections += 1
+        self.ready.set()
+
+    def _run(self):
+        delay = self.INITIAL_RECONNECT_DELAY
+        while not self._stop_event.is_set():
+            try:
+                self._connect()
+                delay = self.INITIAL_RECONNECT_DELAY
+                for event in self._stream:
+                    self.handle_event(event)
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                self.logging.log(f'Events stream failed, reconnecting in {delay:.1f}s: {e}', level=logging.WARNING)
+            # stale until the next connection lists everything again
+            self.ready.clear()
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    def start(self) -> 'DockerEventMonitor':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=__class__.__name__, daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_ready(self, timeout=None) -> bool:
+        """Wait until the view has been listed for the first time."""
+        return self.ready.wait(timeout)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._stream is not None:
+            # unblocks the thread waiting for the next event
+            self._stream.close()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        self.ready.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
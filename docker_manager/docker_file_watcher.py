@@ -0,0 +1,197 @@
+import ctypes
+import errno
+import os
+import select
+import struct
+import time
+
+
+class DockerFileWatcher:
+    """Waits for changes below a set of files and directories
+
+    Uses inotify where the C library provides it and polls modification times otherwise.
+    Directories are watched recursively, files through their parent directory so editors
+    that save by renaming a new file into place are noticed too.
+    """
+    EXCLUDED_NAMES = ('.git',)
+    # inotify(7)
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+                  IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    _event_header = struct.Struct('iIII')
+
+    def __init__(self, paths, debounce=0.3, exclude=(), poll_interval=0.5, use_inotify=True):
+        self.paths = [os.path.abspath(path) for path in paths]
+        # seconds without changes that end a burst of edits
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.exclude = [os.path.abspath(path) for path in exclude]
+        self.roots = [path for path in self.paths if os.path.isdir(path)]
+        self.files = {path for path in self.paths if path not in self.roots}
+        self._fd = None
+        self._watches = {}
+        self._snapshot = None
+        self.backend = 'polling'
+        if use_inotify:
+            try:
+                self._start_inotify()
+                self.backend = 'inotify'
+            except (AttributeError, OSError):
+                self._close_fd()
+        if self._fd is None:
+            self._snapshot = self._take_snapshot()
+
+    def _excluded(self, path) -> bool:
+        if os.path.basename(path) in self.EXCLUDED_NAMES:
+            return True
+        return any(path == excluded or path.startswith(excluded + os.sep) for excluded in self.exclude)
+
+    def _relevant(self, path) -> bool:
+        """Internal method to tell whether a changed path is one of ours."""
+        if path in self.files:
+            return True
+        return any(path == root or path.startswith(root + os.sep) for root in self.roots) and \
+            not self._excluded(path)
+
+    def _walk(self, root):
+        """Internal method to yield every directory below root that is not excluded."""
+        for directory, subdirectories, _ in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories
+                                 if not self._excluded(os.path.join(directory, name))]
+            yield directory
+
+    def _start_inotify(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            self._fd = None
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        for root in self.roots:
+            for directory in self._walk(root):
+                self._add_watch(directory)
+        for path in self.files:
+            self._add_watch(os.path.dirname(path))
+
+    def _add_watch(self, directory):
+        if directory in self._watches.values():
+            return
+        watch = self._inotify_add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK)
+        if watch < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOENT:
+                # removed before we got to it
+                return
+            raise OSError(error, f'Cannot watch {directory}: {os.strerror(error)}')
+        self._watches[watch] = directory
+
+    def _read_inotify(self) -> set:
+        """Internal method to drain pending events, returning the paths we care about."""
+        changed = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, name_length = self._event_header.unpack_from(data, offset)
+            offset += self._event_header.size
+            name = data[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # events were dropped, assume everything changed
+                changed.update(self.paths)
+                continue
+            directory = self._watches.get(watch)
+            if directory is None:
+                continue
+            if mask & self.IN_IGNORED:
+                del self._watches[watch]
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if not self._relevant(path):
+                continue
+            changed.add(path)
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                # new directories below a root are watched as well
+                for subdirectory in self._walk(path):
+                    self._add_watch(subdirectory)
+        return changed
+
+    def _take_snapshot(self) -> dict:
+        snapshot = {}
+        candidates = set(self.files)
+        for root in self.roots:
+            for directory in self._walk(root):
+                candidates.update(os.path.join(directory, name) for name in os.listdir(directory))
+        for path in candidates:
+            if self._excluded(path) and path not in self.files:
+                continue
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat_result.st_mtime_ns, stat_result.st_size)
+        return snapshot
+
+    def _poll(self) -> set:
+        """Internal method to compare the tree with the last snapshot."""
+        snapshot = self._take_snapshot()
+        changed = {path for path in snapshot.keys() | self._snapshot.keys()
+                   if snapshot.get(path) != self._snapshot.get(path)}
+        self._snapshot = snapshot
+        return changed
+
+    def _next_changes(self, timeout) -> set:
+        """Internal method to wait up to timeout seconds for the next relevant change."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if self._fd is not None:
+                readable, _, _ = select.select([self._fd], [], [], remaining)
+                changed = self._read_inotify() if readable else set()
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                changed = self._poll()
+            if changed or remaining == 0:
+                return changed
+
+    def wait_for_change(self, timeout=None) -> set:
+        """Wait for a burst of changes to end and return the changed paths, an empty set on timeout."""
+        changed = self._next_changes(timeout)
+        if not changed:
+            return changed
+        while True:
+            # debounce: an editor saving several files, or one file in several writes, is one change
+            more = self._next_changes(self.debounce)
+            if not more:
+                return changed
+            changed |= more
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches.clear()
+
+    def close(self):
+        self._close_fd()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,301 @@
+import hashlib
+import os
+import re
+import stat
+import struct
+import subprocess
+import threading
+
+
+class DockerGitMetadata:
+    """Commit, branch and dirty state of a git work tree, read from .git without running git
+
+    Results are memoized per process, use for_path() to share them and clear_cache() after
+    the tree changed. Layouts the reader does not understand fall back to the git binary.
+    """
+    SHORT_HASH_LENGTH = 7
+    _cache = {}
+    _cache_lock = threading.Lock()
+    _hash_pattern = re.compile(r'^[0-9a-f]{40}([0-9a-f]{24})?$')
+    _index_entry = struct.Struct('>10I20sH')
+    # index entry flags
+    _assume_valid = 0x8000
+    _extended = 0x4000
+    _stage_mask = 0x3000
+    _skip_worktree = 0x4000
+    _gitlink_mode = 0o160000
+    _symlink_mode = 0o120000
+    _filemode_disabled = re.compile(r'^\s*filemode\s*=\s*(false|no|off|0)\s*$', re.IGNORECASE | re.MULTILINE)
+
+    def __init__(self, path='.'):
+        self.path = os.path.abspath(path)
+        self.work_tree, self.git_dir, self.common_dir = self._find_git_dir(self.path)
+        # commit() memoizes packed-refs while it holds the lock
+        self._lock = threading.RLock()
+        self._values = {}
+
+    @classmethod
+    def for_path(cls, path='.') -> 'DockerGitMetadata':
+        """Returns the memoized metadata of the repository containing path."""
+        path = os.path.abspath(path)
+        with cls._cache_lock:
+            metadata = cls._cache.get(path)
+            if metadata is None:
+                metadata = cls._cache[path] = cls(path)
+            return metadata
+
+    @classmethod
+    def clear_cache(cls):
+        """Forget every memoized repository, e.g. after a commit in a long running process."""
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    @staticmethod
+    def _read_text(path):
+        try:
+            with open(path, 'r') as file:
+                return file.read().strip()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    @classmethod
+    def _find_git_dir(cls, path) -> tuple:
+        """Internal method to return (work tree, git dir, common dir) of the repository above path."""
+        directory = path
+        while True:
+            dot_git = os.path.join(directory, '.git')
+            if os.path.isdir(dot_git):
+                git_dir = dot_git
+                break
+            if os.path.isfile(dot_git):
+                # worktrees and submodules point at their git dir
+                content = cls._read_text(dot_git) or ''
+                if not content.startswith('gitdir:'):
+                    return None, None, None
+                git_dir = os.path.normpath(os.path.join(directory, content[len('gitdir:'):].strip()))
+                break
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None, None, None
+            directory = parent
+
+        common_dir = git_dir
+        relative_common_dir = cls._read_text(os.path.join(git_dir, 'commondir'))
+        if relative_common_dir:
+            common_dir = os.path.normpath(os.path.join(git_dir, relative_common_dir))
+        return directory, git_dir, common_dir
+
+    def _memoize(self, name, compute):
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = compute()
+            return self._values[name]
+
+    def _git(self, *args):
+        """Internal method to ask the git binary, for layouts the reader does not handle."""
+        try:
+            result = subprocess.run(['git', *args], cwd=self.path, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, text=True)
+        except OSError:
+            return None
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def _readable(self) -> bool:
+        """Internal method to tell whether the repository can be read without git."""
+        if self.git_dir is None or 'GIT_DIR' in os.environ:
+            return False
+        # the reftable backend stores refs in a binary format
+        return not os.path.isdir(os.path.join(self.common_dir, 'reftable'))
+
+    def _packed_refs(self) -> dict:
+        def read():
+            refs = {}
+            try:
+                with open(os.path.join(self.common_dir, 'packed-refs'), 'r') as packed_refs:
+                    for line in packed_refs:
+                        if line.startswith(('#', '^')):
+                            continue
+                        parts = line.split()
+                        if len(parts) == 2:
+                            refs[parts[1]] = parts[0]
+            except OSError:
+                pass
+            return refs
+        return self._memoize('packed_refs', read)
+
+    def _resolve_ref(self, ref, depth=0):
+        """Internal method to resolve a ref name to a commit hash, following symbolic refs."""
+        if depth > 5:
+            return None
+        # per-worktree refs live in the git dir, shared refs in the common dir
+        for base in (self.git_dir, self.common_dir):
+            content = self._read_text(os.path.join(base, ref))
+            if content is None:
+                continue
+            if content.startswith('ref:'):
+                return self._resolve_ref(content[len('ref:'):].strip(), depth + 1)
+            return content if self._hash_pattern.match(content) else None
+        return self._packed_refs().get(ref)
+
+    def _head(self):
+        return self._read_text(os.path.join(self.git_dir, 'HEAD')) if self.git_dir else None
+
+    def commit(self):
+        """Full hash of the checked out commit, None outside a repository."""
+        def read():
+            if not self._readable():
+                return self._git('rev-parse', 'HEAD')
+            head = self._head()
+            if head is None:
+                return None
+            if head.startswith('ref:'):
+                return self._resolve_ref(head[len('ref:'):].strip())
+            return head if self._hash_pattern.match(head) else None
+        return self._memoize('commit', read)
+
+    def short_commit(self, length=SHORT_HASH_LENGTH):
+        commit = self.commit()
+        return commit[:length] if commit else None
+
+    def branch(self):
+        """Name of the checked out branch, None for a detached HEAD."""
+        def read():
+            if not self._readable():
+                branch = self._git('rev-parse', '--abbrev-ref', 'HEAD')
+                return None if branch in (None, 'HEAD') else branch
+            head = self._head() or ''
+            if head.startswith('ref: refs/heads/'):
+                return head[len('ref: refs/heads/'):]
+            return None
+        return self._memoize('branch', read)
+
+    def is_dirty(self):
+        """Whether tracked files have staged or unstaged changes. None outside a repository."""
+        def read():
+            if not self._readable() or self._index_changed_since_commit():
+                return self._git_is_dirty()
+            try:
+                return self._index_is_dirty()
+            except (ValueError, struct.error):
+                # an index version or extension we do not parse
+                return self._git_is_dirty()
+        return self._memoize('dirty', read)
+
+    def _index_changed_since_commit(self) -> bool:
+        """Internal method to tell whether the index was written after HEAD last moved.
+
+        Only then can it hold staged changes. Comparing it with HEAD's tree means reading
+        git objects, so git status answers in that case.
+        """
+        try:
+            index_mtime = os.stat(os.path.join(self.git_dir, 'index')).st_mtime_ns
+        except OSError:
+            return False
+        head = self._head() or ''
+        ref_paths = [os.path.join(self.git_dir, 'HEAD')]
+        if head.startswith('ref:'):
+            ref = head[len('ref:'):].strip()
+            ref_paths = [os.path.join(self.git_dir, ref), os.path.join(self.common_dir, ref),
+                         os.path.join(self.common_dir, 'packed-refs')]
+        for ref_path in ref_paths:
+            try:
+                return index_mtime > os.stat(ref_path).st_mtime_ns
+            except OSError:
+                continue
+        # an unborn branch, everything in the index is staged
+        return True
+
+    def _git_is_dirty(self):
+        status = self._git('status', '--porcelain', '--untracked-files=no')
+        return None if status is None else status != ''
+
+    @staticmethod
+    def _blob_hash(data, algorithm) -> bytes:
+        return hashlib.new(algorithm, b'blob %d\0' % len(data) + data).digest()
+
+    def _entry_changed(self, relative_path, fields, object_id, index_mtime, file_mode=True) -> bool:
+        """Internal method to compare one index entry with the work tree."""
+        _, _, mtime_s, mtime_ns, _, _, mode, _, _, size = fields
+        path = os.path.join(self.work_tree, relative_path)
+        try:
+            stat_result = os.lstat(path)
+        except OSError:
+            return True
+        # a file that became a symlink or the other way round, or a directory
+        is_symlink = mode & 0o170000 == self._symlink_mode
+        if stat.S_ISLNK(stat_result.st_mode) != is_symlink or \
+                not (stat.S_ISLNK(stat_result.st_mode) or stat.S_ISREG(stat_result.st_mode)):
+            return True
+        # like git with core.fileMode, only the owner's executable bit counts
+        if file_mode and not is_symlink and bool(stat_result.st_mode & 0o100) != bool(mode & 0o100):
+            return True
+        if stat_result.st_size & 0xFFFFFFFF != size:
+            return True
+        same_mtime = divmod(stat_result.st_mtime_ns, 1000000000) == (mtime_s, mtime_ns)
+        # like git, a file written in the same second as the index is racily clean and gets hashed
+        if same_mtime and mtime_s < index_mtime:
+            return False
+        if os.path.islink(path):
+            data = os.fsencode(os.readlink(path))
+        else:
+            with open(path, 'rb') as file:
+                data = file.read()
+        algorithm = 'sha1' if len(object_id) == 20 else 'sha256'
+        return self._blob_hash(data, algorithm) != object_id
+
+    def _index_is_dirty(self) -> bool:
+        """Internal method to compare the work tree with .git/index, which is what git status does first."""
+        index_path = os.path.join(self.git_dir, 'index')
+        try:
+            with open(index_path, 'rb') as index_file:
+                data = index_file.read()
+            index_mtime = int(os.stat(index_path).st_mtime)
+        except OSError:
+            # no index yet, nothing is tracked
+            return False
+
+        signature, version, count = struct.unpack('>4sII', data[:12])
+        if signature != b'DIRC' or version not in (2, 3):
+            raise ValueError(f'Unsupported git index version {version}')
+        if self._read_text(os.path.join(self.common_dir, 'objectformat')) == 'sha256' or \
+                'objectformat = sha256' in (self._read_text(os.path.join(self.common_dir, 'config')) or ''):
+            raise ValueError('sha256 repositories are read with git')
+        file_mode = not self._filemode_disabled.search(self._read_text(os.path.join(self.common_dir, 'config')) or '')
+
+        offset = 12
+        for _ in range(count):
+            *fields, object_id, flags = self._index_entry.unpack_from(data, offset)
+            entry_length = self._index_entry.size
+            extended_flags = 0
+            if flags & self._extended:
+                extended_flags, = struct.unpack_from('>H', data, offset + entry_length)
+                entry_length += 2
+            name_end = data.index(b'\0', offset + entry_length)
+            relative_path = os.fsdecode(data[offset + entry_length:name_end])
+            # entries are NUL padded to a multiple of eight bytes
+            offset += (name_end - offset + 8) // 8 * 8
+
+            if flags & self._stage_mask:
+                # unmerged paths
+                return True
+            if flags & self._assume_valid or extended_flags & self._skip_worktree:
+                continue
+            if fields[6] & 0o170000 == self._gitlink_mode:
+                # submodules are not checked, like git describe --dirty --ignore-submodules
+                continue
+            if self._entry_changed(relative_path, fields, object_id, index_mtime, file_mode):
+                return True
+        return False
+
+    def tag_components(self, branch=False, dirty=False) -> list:
+        """Returns the optional tag parts: short commit, then branch and dirty marker when asked for."""
+        components = []
+        short_commit = self.short_commit()
+        if short_commit:
+            components.append(short_commit)
+        if branch and self.branch():
+            # docker tags only allow [A-Za-z0-9_.-]
+            components.append(re.sub(r'[^A-Za-z0-9_.-]', '-', self.branch()))
+        if dirty and self.is_dirty():
+            components.append('dirty')
+        return components
@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_metrics import DockerMetrics
+from docker_manager.docker_service_manager import DockerServiceManager
+
+
+class DockerHealthMonitor:
+    """Pings the daemon from a background thread, tracking its latency and reconnecting after failures"""
+    def __init__(self, docker_config, client_session=None, on_change=None):
+        self.config = docker_config
+        self.client_session = client_session or DockerClientSession(docker_config)
+        self.interval = docker_config.get_custom_config_value('health_check_interval', use_default=True) or 10
+        self.failure_threshold = docker_config.get_custom_config_value('health_check_failures', use_default=True) or 3
+        # called with the new health state whenever it flips
+        self.on_change = on_change
+        self.healthy = None
+        self.latency = None
+        self.consecutive_failures = 0
+        self.reconnects = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    def check(self) -> bool:
+        """Ping the daemon once and update the health state."""
+        start = time.perf_counter()
+        healthy = DockerServiceManager.is_docker_running(self.client_session)
+        latency = time.perf_counter() - start
+
+        if healthy:
+            self.latency = latency
+            self.consecutive_failures = 0
+            DockerMetrics.record('daemon_ping', latency)
+        else:
+            self.latency = None
+            self.consecutive_failures += 1
+            if self.consecutive_failures % self.failure_threshold == 0:
+                # pooled connections to a restarted daemon are dead, start over
+                self.logging.log('Docker daemon failed %d health checks, reconnecting',
+                                 self.consecutive_failures)
+                self.client_session.reconnect()
+                self.reconnects += 1
+
+        if healthy != self.healthy:
+            self.healthy = healthy
+            if healthy:
+                self.logging.log('Docker daemon healthy, ping took %.1f ms', latency * 1000)
+            else:
+                self.logging.log('Docker daemon unhealthy', level=logging.WARNING)
+            if self.on_change is not None:
+                self.on_change(healthy)
+        return healthy
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                self.logging.log('Health check failed: %s', e, level=logging.ERROR)
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """Start monitoring in a daemon thread, does nothing when already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=__class__.__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop monitoring and wait for the thread to finish."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,28 +1,54 @@
 from docker_manager.docker_utility import DockerUtility
 from docker.errors import BuildError, APIError
+from docker_manager.docker_build_context import DockerBuildContext
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_image_inventory import DockerImageInventory
 from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_metrics import DockerMetrics
+from docker_manager.docker_stage_graph import DockerStageGraph
+import hashlib
+import json
 import logging
-import docker
 import os
+import re
+import shlex
+import tempfile
+import time
 
 
 class DockerImageBuilder:
-    def __init__(self, docker_config):
+    # the same pattern the Docker SDK uses to find the image ID in a build stream
+    _build_success_pattern = re.compile(r'(^Successfully built |sha256:)([0-9a-f]+)$')
+    _build_step_pattern = re.compile(r'^Step (\d+/\d+) : (.*)')
+    # buildx --progress=plain names a step as '#5 [stage 2/3] RUN ...' and ends it with '#5 DONE 1.2s'
+    _buildkit_step_pattern = re.compile(r'^#(\d+) \[([^\]]+)\] (.*)')
+    _buildkit_done_pattern = re.compile(r'^#(\d+) DONE (\d+(?:\.\d+)?)s$')
+    # image label holding the hash of everything that went into a build
+    CONTENT_HASH_LABEL = 'docker_manager.content_hash'
+    # image label holding the hash of each Dockerfile stage of that build
+    STAGE_HASHES_LABEL = 'docker_manager.stage_hashes'
+
+    def __init__(self, docker_config, client_session=None, cancel_event=None):
         self.config = docker_config
-        # let the logger know it's us
-        self.config.add_custom_value('initializer', __class__.__name__)
-        self.logging = DockerLogging(docker_config)
+        self.client_session = client_session or DockerClientSession(docker_config)
+        # once set, streamed and BuildKit builds stop at their next line of output
+        self.cancel_event = cancel_event
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    @property
+    def inventory(self) -> DockerImageInventory:
+        return DockerImageInventory.for_session(self.config, self.client_session)
 
-    def list_images(self):
-        """List Docker images."""
+    def list_images(self, repository=None, labels=None, dangling=None):
+        """List Docker images as DockerImageSummary, filtered by the daemon. Logs a summary, not every image."""
         try:
-            client = docker.from_env()
-            image_list = client.images.list()
-            for item in image_list:
-                self.logging.log(f'Docker image: {item}')
-            return image_list
+            image_list = list(self.inventory.images(repository, labels, dangling))
         except APIError as e:
             return None
+        repositories = {DockerImageInventory.split_repo_tag(tag)[0] for image in image_list for tag in image.repo_tags}
+        untagged = sum(1 for image in image_list if not image.repo_tags)
+        self.logging.log(f'Docker images: {len(image_list)} in {len(repositories)} repositories, {untagged} untagged')
+        return image_list
 
     def build_image(self):
         """Build a Docker image using configuration settings."""
@@ -30,13 +56,22 @@ class DockerImageBuilder:
             image_name = self.config.get_custom_config_value('image_name', use_default=True)
             tag_format = self.config.get_custom_config_value('tag_format', use_default=True)
             # Assuming create_tag is a method that creates a tag based on the given format
-            image_tag = DockerUtility.create_tag(tag_format)
+            with DockerMetrics.phase('create_tag'):
+                image_tag = DockerUtility.create_tag(
+                    tag_format,
+                    branch=self.config.get_custom_config_value('tag_branch', use_default=True),
+                    dirty=self.config.get_custom_config_value('tag_dirty', use_default=True))
             dockerfile = self.config.get_custom_config_value('dockerfile', use_default=True)
             config_files_dir = self.config.get_custom_config_value('config_files_dir', use_default=True)
             image_build_path = os.path.join(os.getcwd(), config_files_dir)
             dockerfile_full_path = os.path.join(image_build_path, dockerfile)
             # Configure variables used in the Dockerfile
             ubuntu_buildargs = self.config.get_custom_config_value('buildargs', use_default=True)
+            stream_build = self.config.get_custom_config_value('stream_build', use_default=True)
+            skip_unchanged = self.config.get_custom_config_value('skip_unchanged_builds', use_default=True)
+            cache_build_context = self.config.get_custom_config_value('cache_build_context', use_default=True)
+            buildkit_enabled = self.config.get_custom_config_value('buildkit_enabled', use_default=True)
+            build_target = self.config.get_custom_config_value('build_target', use_default=True)
 
             # Validate image name and tag
             if not image_name or '/' in image_name or not image_tag:
@@ -46,6 +81,22 @@ class DockerImageBuilder:
             self.logging.log(f"Building image with name:tag {image_name_tag}")
             self.logging.log(f"Building image with Dockerfile: {dockerfile_full_path}")
 
+            labels = None
+            if skip_unchanged:
+                stage_hashes = self.compute_stage_hashes(image_build_path, dockerfile, ubuntu_buildargs, build_target)
+                content_hash = self.compute_content_hash(image_build_path, dockerfile, ubuntu_buildargs, build_target,
+                                                         stage_hashes=stage_hashes)
+                existing_image = self.find_image_by_content_hash(image_name, content_hash)
+                if existing_image is not None:
+                    # inputs are byte-identical to an earlier build, reuse it
+                    existing_image.tag(image_name, image_tag)
+                    self.logging.log(f"Inputs unchanged, tagged {existing_image.short_id} as {image_name_tag}")
+                    return image_name_tag
+                labels = {self.CONTENT_HASH_LABEL: content_hash}
+                if stage_hashes:
+                    labels[self.STAGE_HASHES_LABEL] = json.dumps(stage_hashes, separators=(',', ':'))
+                    self._log_changed_stages(image_name, stage_hashes)
+
             '''
             def build(self, path=None, tag=None, quiet=False, fileobj=None,
                       nocache=False, rm=False, timeout=None,
@@ -56,13 +107,50 @@ class DockerImageBuilder:
                       squash=None, extra_hosts=None, platform=None, isolation=None,
                       use_config_proxy=True):
             '''
-            # Build the docker image
-            client = docker.from_env()
-            image, build_logs, *rest = client.images.build(path=image_build_path,
-                                                           dockerfile=dockerfile,
-                                                           tag=image_name_tag,
-                                                           buildargs=ubuntu_buildargs,
-                                                           squash=False)
+            if buildkit_enabled:
+                # BuildKit reads the context itself and runs independent stages in parallel
+                with DockerMetrics.phase('image_build', **self._metric_labels(image_name_tag)):
+                    image_id = self.buildkit_build(path=image_build_path,
+                                                   dockerfile=dockerfile,
+                                                   tag=image_name_tag,
+                                                   buildargs=ubuntu_buildargs,
+                                                   labels=labels,
+                                                   target=build_target)
+                self.logging.log(f"Successfully built {image_name_tag} ({image_id})")
+                return image_name_tag
+
+            # Send the cached context archive when enabled, otherwise the SDK tars the path
+            context_file = self._open_build_context(image_build_path, dockerfile) if cache_build_context else None
+            if context_file is not None:
+                context = {'fileobj': context_file, 'custom_context': True}
+            else:
+                context = {'path': image_build_path}
+
+            try:
+                # Build the docker image
+                if stream_build:
+                    image_id = self.stream_build(dockerfile=dockerfile,
+                                                 tag=image_name_tag,
+                                                 buildargs=ubuntu_buildargs,
+                                                 labels=labels,
+                                                 target=build_target,
+                                                 **context)
+                    self.logging.log(f"Successfully built {image_name_tag} ({image_id})")
+                    return image_name_tag
+
+                client = self.client_session.client
+                with DockerMetrics.phase('image_build', **self._metric_labels(image_name_tag)):
+                    image, build_logs, *rest = client.images.build(dockerfile=dockerfile,
+                                                                   tag=image_name_tag,
+                                                                   buildargs=ubuntu_buildargs,
+                                                                   timeout=self.client_session.build_timeout,
+                                                                   labels=labels,
+                                                                   target=build_target,
+                                                                   squash=False,
+                                                                   **context)
+            finally:
+                if context_file is not None:
+                    context_file.close()
 
             # display and or log the build logs
             for line in build_logs:
@@ -82,3 +170,232 @@ class DockerImageBuilder:
         except ValueError as e:
             self.logging.log(f'Value Error: {e}', level=logging.ERROR)
             return None
+        except OSError as e:
+            # the build context could not be read or archived
+            self.logging.log(f'OS Error: {e}', level=logging.ERROR)
+            return None
+
+    @staticmethod
+    def compute_stage_hashes(build_path, dockerfile, buildargs=None, target=None, files=None):
+        """Hash the inputs of each stage a build of target needs, None when the Dockerfile is not fully understood."""
+        dockerfile_path = os.path.join(build_path, dockerfile)
+        if not os.path.isfile(dockerfile_path):
+            return None
+        stage_graph = DockerStageGraph.from_file(dockerfile_path, buildargs)
+        if not stage_graph.stages or stage_graph.unmodeled:
+            # the stage inputs would be incomplete, the caller hashes the whole context instead
+            return None
+        if files is None:
+            files = DockerBuildContext(build_path, dockerfile).list_files()
+        return stage_graph.stage_hashes(build_path, files, target)
+
+    @classmethod
+    def compute_content_hash(cls, build_path, dockerfile, buildargs=None, target=None, stage_hashes=None,
+                             files=None) -> str:
+        """Hash the build context, honoring .dockerignore, together with the Dockerfile, buildargs and target.
+
+        When the Dockerfile parses, only the stages target needs and the context files they copy
+        are hashed, so changes to anything else do not cause a rebuild. files are the context
+        files from DockerBuildContext.list_files(), listed here when not passed.
+        """
+        content_hash = hashlib.sha256()
+        content_hash.update(f'dockerfile:{dockerfile}\0'.encode())
+        content_hash.update(f'buildargs:{json.dumps(buildargs or {}, sort_keys=True)}\0'.encode())
+        content_hash.update(f'target:{target or ""}\0'.encode())
+        if stage_hashes is None:
+            stage_hashes = cls.compute_stage_hashes(build_path, dockerfile, buildargs, target, files)
+        if stage_hashes:
+            for name, stage_hash in stage_hashes.items():
+                content_hash.update(f'stage:{name}:{stage_hash}\0'.encode())
+            return content_hash.hexdigest()
+        if files is None:
+            # only the full context hash needs the file list when the caller passed the stage hashes
+            files = DockerBuildContext(build_path, dockerfile).list_files()
+        for relative_path in files:
+            full_path = os.path.join(build_path, relative_path)
+            if os.path.isdir(full_path) and not os.path.islink(full_path):
+                continue
+            file_stat = os.lstat(full_path)
+            content_hash.update(f'file:{relative_path}:{file_stat.st_mode:o}:{file_stat.st_size}\0'.encode())
+            if os.path.islink(full_path):
+                content_hash.update(os.readlink(full_path).encode())
+                continue
+            with open(full_path, 'rb') as file:
+                for block in iter(lambda: file.read(1024 * 1024), b''):
+                    content_hash.update(block)
+        return content_hash.hexdigest()
+
+    def _log_changed_stages(self, image_name, stage_hashes):
+        """Internal method to log the stages whose inputs changed since the latest build of image_name."""
+        try:
+            previous = self.inventory.latest(image_name)
+        except APIError:
+            return
+        if previous is None:
+            return
+        try:
+            previous_hashes = json.loads(previous.labels.get(self.STAGE_HASHES_LABEL) or '{}')
+        except ValueError:
+            previous_hashes = {}
+        changed = [name for name, stage_hash in stage_hashes.items() if previous_hashes.get(name) != stage_hash]
+        self.logging.log(f"Stages changed since {previous.short_id}: {', '.join(changed) or 'none'}, "
+                         f"{len(stage_hashes) - len(changed)} unchanged")
+
+    @staticmethod
+    def _buildkit_cache_option(cache, export=False) -> str:
+        """Internal method to turn a cache entry into a buildx --cache-from/--cache-to value."""
+        if '=' in cache:
+            # already a full buildx cache spec, e.g. type=registry,ref=...
+            return cache
+        if cache == 'inline':
+            return 'type=inline'
+        if cache.startswith(('.', '/', '~')) or os.path.isdir(cache):
+            cache_dir = os.path.abspath(os.path.expanduser(cache))
+            return f'type=local,dest={cache_dir},mode=max' if export else f'type=local,src={cache_dir}'
+        # anything else names an image built earlier
+        return f'type=registry,ref={cache}'
+
+    def buildkit_build(self, path, dockerfile, tag, buildargs=None, labels=None, target=None):
+        """Build with BuildKit through docker buildx, importing and exporting the layer cache. Returns the image ID."""
+        builder = self.config.get_custom_config_value('buildkit_builder', use_default=True)
+        cache_from = self.config.get_custom_config_value('buildkit_cache_from', use_default=True) or []
+        cache_to = self.config.get_custom_config_value('buildkit_cache_to', use_default=True)
+        log_file = self.config.get_custom_config_value('buildkit_log_file', use_default=True)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            iid_file = os.path.join(temp_dir, 'iid')
+            command = ['docker', 'buildx', 'build', '--load', '--progress=plain',
+                       '--file', os.path.join(path, dockerfile), '--tag', tag, '--iidfile', iid_file]
+            if builder:
+                command += ['--builder', builder]
+            if target:
+                command += ['--target', target]
+            cache_from_options = [self._buildkit_cache_option(cache) for cache in cache_from]
+            cache_to_option = self._buildkit_cache_option(cache_to, export=True) if cache_to else None
+            if any(option.startswith('type=registry') for option in cache_from_options) and \
+                    cache_to_option != 'type=inline':
+                # an image only serves as a cache source when it carries inline cache metadata
+                buildargs = {**(buildargs or {}), 'BUILDKIT_INLINE_CACHE': '1'}
+            if cache_to_option and cache_to_option.startswith('type=local') and not builder:
+                self.logging.log('Exporting a local BuildKit cache needs a docker-container builder, '
+                                 'set buildkit_builder', level=logging.WARNING)
+            for name, value in (buildargs or {}).items():
+                command += ['--build-arg', f'{name}={value}']
+            for name, value in (labels or {}).items():
+                command += ['--label', f'{name}={value}']
+            for option in cache_from_options:
+                command += ['--cache-from', option]
+            if cache_to_option:
+                command += ['--cache-to', cache_to_option]
+            command.append(path)
+
+            self.logging.log(f"BuildKit command: {shlex.join(command)}", level=logging.DEBUG)
+            try:
+                DockerUtility.run_command_with_output(shlex.join(command), f"BuildKit build of {tag} failed",
+                                                      log_file_path=log_file, logger=self.logging,
+                                                      timeout=self.client_session.build_timeout,
+                                                      cancel_event=self.cancel_event,
+                                                      on_line=self._buildkit_step_recorder(tag))
+            except Exception as e:
+                raise BuildError(str(e), [])
+
+            with open(iid_file, 'r') as file:
+                return file.read().strip()
+
+    @classmethod
+    def _buildkit_step_recorder(cls, tag):
+        """Internal method to create a line callback recording the time of each finished BuildKit step."""
+        steps = {}
+
+        def on_line(stream_name, line):
+            step_match = cls._buildkit_step_pattern.match(line)
+            if step_match:
+                steps[step_match.group(1)] = (step_match.group(2), step_match.group(3))
+                return
+            done_match = cls._buildkit_done_pattern.match(line)
+            if done_match and done_match.group(1) in steps:
+                number, instruction = steps.pop(done_match.group(1))
+                DockerMetrics.record('build_step', float(done_match.group(2)), **cls._metric_labels(tag), step=number,
+                                     instruction=instruction[:80])
+        return on_line
+
+    @staticmethod
+    def _metric_labels(tag) -> dict:
+        """Internal method to label a metric with the repository, for Prometheus, and the full tag, for JSON."""
+        return {'image_name': DockerImageInventory.split_repo_tag(tag)[0], 'image': tag}
+
+    @classmethod
+    def _record_step(cls, tag, step):
+        """Internal method to record the time of a finished Dockerfile step."""
+        if step is not None:
+            number, instruction, start = step
+            DockerMetrics.record('build_step', time.perf_counter() - start, **cls._metric_labels(tag), step=number,
+                                 instruction=instruction[:80])
+
+    def _open_build_context(self, build_path, dockerfile):
+        """Internal method to refresh the cached context archive and open it for sending."""
+        cache_dir = self.config.get_custom_config_value('context_cache_dir', use_default=True)
+        build_context = DockerBuildContext(build_path, dockerfile, cache_dir or '.docker_manager_cache')
+        with DockerMetrics.phase('context_archive'):
+            archive_path = build_context.archive()
+        self.logging.log(f"Build context {build_context.size} bytes, {build_context.reused_entries} entries reused, "
+                         f"{build_context.added_entries} re-tarred in {build_context.tar_seconds:.3f}s")
+        return open(archive_path, 'rb')
+
+    def find_image_by_content_hash(self, image_name, content_hash):
+        """Returns an image of image_name carrying the content hash label, or None."""
+        # one listing filtered by the daemon, then a single inspect for the match
+        for image in self.inventory.images(image_name, labels={self.CONTENT_HASH_LABEL: content_hash}):
+            return self.client_session.client.images.get(image.id)
+        return None
+
+    def stream_build(self, path=None, dockerfile=None, tag=None, buildargs=None, labels=None,
+                     fileobj=None, custom_context=False, target=None):
+        """Build through the low-level API, logging each line as it arrives. Returns the image ID."""
+        image_id = None
+        last_chunk = None
+        step = None
+        with DockerMetrics.phase('image_build', **self._metric_labels(tag)):
+            # the context is uploaded before the API returns the stream
+            with DockerMetrics.phase('context_upload', **self._metric_labels(tag)):
+                build_stream = self.client_session.api.build(path=path,
+                                                             fileobj=fileobj,
+                                                             custom_context=custom_context,
+                                                             dockerfile=dockerfile,
+                                                             tag=tag,
+                                                             buildargs=buildargs,
+                                                             labels=labels,
+                                                             target=target,
+                                                             timeout=self.client_session.build_timeout,
+                                                             decode=True)
+            try:
+                # only the current chunk is kept, the log is never buffered
+                for chunk in build_stream:
+                    if self.cancel_event is not None and self.cancel_event.is_set():
+                        # dropping the stream makes the daemon stop the build
+                        build_stream.close()
+                        raise BuildError('Build cancelled', [])
+                    last_chunk = chunk
+                    if 'error' in chunk:
+                        raise BuildError(chunk['error'].strip(), [chunk])
+                    if 'stream' in chunk:
+                        line = chunk['stream'].rstrip('\n')
+                        if line:
+                            self.logging.log(line)
+                        step_match = self._build_step_pattern.match(chunk['stream'])
+                        if step_match:
+                            self._record_step(tag, step)
+                            step = (step_match.group(1), step_match.group(2).strip(), time.perf_counter())
+                        match = self._build_success_pattern.search(chunk['stream'])
+                        if match:
+                            image_id = match.group(2)
+                    elif 'status' in chunk:
+                        self.logging.log(chunk['status'])
+                    if isinstance(chunk.get('aux'), dict) and 'ID' in chunk['aux']:
+                        image_id = chunk['aux']['ID']
+            finally:
+                self._record_step(tag, step)
+
+        if image_id is None:
+            raise BuildError('Unknown build error', [last_chunk] if last_chunk else [])
+        return image_id
@@ -0,0 +1,162 @@
+from datetime import datetime
+import threading
+import time
+import weakref
+
+from docker.errors import NotFound
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_metrics import DockerMetrics
+
+
+class DockerImageSummary:
+    """One image as the daemon lists it, without the per-image inspect the SDK models need"""
+    def __init__(self, data):
+        self.id = data['Id']
+        self.repo_tags = [tag for tag in data.get('RepoTags') or [] if tag != '<none>:<none>']
+        created = data.get('Created') or 0
+        # the list endpoint gives a unix timestamp, inspect an RFC 3339 string
+        self.created = datetime.fromisoformat(created).timestamp() if isinstance(created, str) else created
+        self.labels = data.get('Labels') or (data.get('Config') or {}).get('Labels') or {}
+        self.size = data.get('Size')
+        # -1 when the daemon did not compute the layers shared with other images
+        self.shared_size = data.get('SharedSize', -1)
+
+    @property
+    def short_id(self) -> str:
+        return self.id[len('sha256:'):][:12] if self.id.startswith('sha256:') else self.id[:12]
+
+    def __repr__(self):
+        return f"DockerImageSummary({self.short_id}, {', '.join(self.repo_tags) or '<none>'})"
+
+
+class DockerImageInventory:
+    """Lists images with daemon-side filters and indexes repository -> tag -> image ID
+
+    A repository is listed from the daemon the first time it is asked for, afterwards the
+    index is kept current from the daemon's image events. Use for_session() to share one
+    index between every builder of a client session.
+    """
+    # the daemon only buffers this many past events, a full page means some may be missing
+    EVENTS_BUFFER = 256
+    # overlap between refreshes, replaying an event is harmless, missing one is not
+    EVENTS_OVERLAP = 1.0
+    _sessions = weakref.WeakKeyDictionary()
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, docker_config, client_session=None):
+        self.client_session = client_session or DockerClientSession(docker_config)
+        self.page_size = docker_config.get_custom_config_value('image_page_size', use_default=True) or 100
+        self._images = {}
+        self._repositories = {}
+        self._since = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_session(cls, docker_config, client_session) -> 'DockerImageInventory':
+        """Returns the inventory shared by everything using client_session."""
+        with cls._sessions_lock:
+            inventory = cls._sessions.get(client_session)
+            if inventory is None:
+                inventory = cls._sessions[client_session] = cls(docker_config, client_session)
+            return inventory
+
+    @staticmethod
+    def _filters(labels=None, dangling=None) -> dict:
+        """Internal method to build the daemon-side filters: labels as a dict, 'key=value' or 'key' strings."""
+        filters = {}
+        if labels:
+            if isinstance(labels, dict):
+                labels = [f'{key}={value}' if value is not None else key for key, value in labels.items()]
+            filters['label'] = [labels] if isinstance(labels, str) else list(labels)
+        if dangling is not None:
+            filters['dangling'] = dangling
+        return filters
+
+    def pages(self, repository=None, labels=None, dangling=None, page_size=None):
+        """Yields lists of at most page_size DockerImageSummary, filtered by the daemon."""
+        page_size = page_size or self.page_size
+        with DockerMetrics.phase('list_images'):
+            images = self.client_session.api.images(name=repository, filters=self._filters(labels, dangling) or None)
+        for start in range(0, len(images), page_size):
+            # summaries are only created for the pages that are read
+            yield [DockerImageSummary(data) for data in images[start:start + page_size]]
+
+    def images(self, repository=None, labels=None, dangling=None):
+        """Yields DockerImageSummary one by one, see pages()."""
+        for page in self.pages(repository, labels, dangling):
+            yield from page
+
+    @staticmethod
+    def split_repo_tag(repo_tag) -> tuple:
+        """Splits 'repository:tag' into its parts, the tag defaults to latest."""
+        repository, _, tag = repo_tag.rpartition(':')
+        # a registry port is not a tag
+        if not repository or '/' in tag:
+            return repo_tag, 'latest'
+        return repository, tag
+
+    def _index(self, summary):
+        """Internal method to point the tags of an image at it in the loaded repositories."""
+        self._images[summary.id] = summary
+        for repo_tag in summary.repo_tags:
+            repository, tag = self.split_repo_tag(repo_tag)
+            if repository in self._repositories:
+                self._repositories[repository][tag] = summary.id
+
+    def _forget(self, image_id):
+        self._images.pop(image_id, None)
+        for tags in self._repositories.values():
+            for tag in [tag for tag, tagged_id in tags.items() if tagged_id == image_id]:
+                del tags[tag]
+
+    def _load_repository(self, repository):
+        self._repositories[repository] = {}
+        for summary in self.images(repository=repository):
+            self._index(summary)
+
+    def refresh(self):
+        """Apply the image events since the last refresh to the loaded repositories."""
+        with self._lock:
+            now = time.time()
+            since, self._since = self._since, now
+            if since is None or not self._repositories:
+                return
+            events = list(self.client_session.api.events(since=since - self.EVENTS_OVERLAP, until=now,
+                                                         filters={'type': 'image'}, decode=True))
+            if len(events) >= self.EVENTS_BUFFER:
+                # events may have been dropped, list the loaded repositories again
+                for repository in list(self._repositories):
+                    self._load_repository(repository)
+                return
+
+            changed = {event.get('Actor', {}).get('ID') or event.get('id') for event in events}
+            for image_id in changed - {None}:
+                self._forget(image_id)
+                try:
+                    data = self.client_session.api.inspect_image(image_id)
+                except NotFound:
+                    continue
+                self._index(DockerImageSummary(data))
+
+    def repository(self, repository) -> dict:
+        """Returns {tag: image ID} of a repository, listing it from the daemon only the first time."""
+        with self._lock:
+            self.refresh()
+            if repository not in self._repositories:
+                self._load_repository(repository)
+            return dict(self._repositories[repository])
+
+    def latest(self, image_name):
+        """Returns the most recently created DockerImageSummary of image_name, or None."""
+        with self._lock:
+            image_ids = set(self.repository(image_name).values())
+            summaries = [self._images[image_id] for image_id in image_ids if image_id in self._images]
+            return max(summaries, key=lambda summary: summary.created, default=None)
+
+    def invalidate(self):
+        """Forget the index, the next lookup lists from the daemon again."""
+        with self._lock:
+            self._images.clear()
+            self._repositories.clear()
+            self._since = None
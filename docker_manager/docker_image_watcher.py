@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_config import DockerConfig
+from docker_manager.docker_container_manager import DockerContainerManager
+from docker_manager.docker_file_watcher import DockerFileWatcher
+from docker_manager.docker_git_metadata import DockerGitMetadata
+from docker_manager.docker_image_builder import DockerImageBuilder
+from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_stage_graph import DockerStageGraph
+
+
+class DockerImageWatcher:
+    """Rebuilds the image whenever the Dockerfile, the build context or the config file change
+
+    A change while a build is running cancels that build and starts a new one right away,
+    unchanged layers come from the daemon's layer cache. With recreate_container set the
+    container of the previous build is replaced by one of the new image.
+    """
+    def __init__(self, docker_config, config_path=None, client_session=None, recreate_container=False,
+                 start_container=False):
+        self.config = docker_config
+        self.config_path = os.path.abspath(config_path) if config_path else None
+        self.client_session = client_session or DockerClientSession(docker_config)
+        self.recreate_container = recreate_container
+        self.start_container = start_container
+        self.image_name_tag = None
+        self.container = None
+        self.builds = 0
+        self.cancelled_builds = 0
+        self._build_thread = None
+        self._cancel_event = None
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    def watched_paths(self) -> tuple:
+        """Returns (paths to watch, paths to ignore) for the current config."""
+        config_files_dir = os.path.abspath(self.config.get_custom_config_value('config_files_dir',
+                                                                               use_default=True) or '.')
+        dockerfile = self.config.get_custom_config_value('dockerfile', use_default=True) or 'Dockerfile'
+        paths = [config_files_dir, os.path.join(config_files_dir, dockerfile)]
+        if self.config_path:
+            paths.append(self.config_path)
+        # files the build itself writes must not trigger the next build
+        exclude = [self.config.get_custom_config_value(key, use_default=True)
+                   for key in ('context_cache_dir', 'log_file', 'buildkit_log_file')]
+        return paths, [path for path in exclude if path]
+
+    def affects_build(self, changed) -> bool:
+        """Whether a change to these paths can change the image, judged by the stages build_target needs."""
+        if self.config_path and self.config_path in {os.path.abspath(path) for path in changed}:
+            # the config file can live in config_files_dir without any stage copying it
+            return True
+        config_files_dir = os.path.abspath(self.config.get_custom_config_value('config_files_dir',
+                                                                               use_default=True) or '.')
+        dockerfile = self.config.get_custom_config_value('dockerfile', use_default=True) or 'Dockerfile'
+        relative_paths = [os.path.relpath(path, config_files_dir) for path in changed]
+        if any(path.startswith('..') or path in (dockerfile, '.dockerignore') for path in relative_paths) or \
+                any(os.path.isdir(path) for path in changed):
+            # files outside the context, the Dockerfile, the ignore rules or whole directories changed
+            return True
+        try:
+            stage_graph = DockerStageGraph.from_file(os.path.join(config_files_dir, dockerfile),
+                                                     self.config.get_custom_config_value('buildargs', use_default=True))
+            needed = stage_graph.needed_stages(self.config.get_custom_config_value('build_target', use_default=True))
+        except (OSError, ValueError):
+            return True
+        if stage_graph.unmodeled:
+            return True
+        affected = stage_graph.affected_stages(files=relative_paths)
+        return not needed or any(stage in needed for stage in affected)
+
+    def _reload_config(self):
+        """Internal method to re-read the config file, keeping the command line and environment values."""
+        try:
+            self.config = DockerConfig(self.config_path).derive(**self.config.overrides())
+        except ValueError as e:
+            self.logging.log(f'Keeping the previous config, the new one does not load: {e}', level=logging.ERROR)
+
+    def _build(self, config, cancel_event):
+        # a streamed build can be stopped between two lines of output
+        build_config = config.derive(stream_build=True)
+        DockerGitMetadata.clear_cache()
+        image_name_tag = DockerImageBuilder(build_config, self.client_session, cancel_event=cancel_event).build_image()
+        if cancel_event.is_set():
+            self.logging.log('Build cancelled, the inputs changed again')
+            return
+        if image_name_tag is None:
+            self.logging.log('Build failed, waiting for the next change', level=logging.ERROR)
+            return
+        self.image_name_tag = image_name_tag
+        if self.recreate_container:
+            self._recreate_container(config, image_name_tag)
+
+    def _recreate_container(self, config, image_name_tag):
+        """Internal method to replace the container of the previous build with one of the new image."""
+        container_manager = DockerContainerManager(config, self.client_session)
+        if self.container is not None:
+            container_manager.remove_container(self.container, force=True)
+        self.container = container_manager.create_container(image_name_tag)
+        if self.container is not None and self.start_container:
+            container_manager.start_container(self.container)
+
+    def cancel(self):
+        """Cancel the running build, if any, and wait for it to stop."""
+        if self._build_thread is None:
+            return
+        if self._build_thread.is_alive():
+            self._cancel_event.set()
+            self.cancelled_builds += 1
+        self._build_thread.join()
+        self._build_thread = None
+
+    def rebuild(self):
+        """Start a build of the current inputs, cancelling the one still running."""
+        self.cancel()
+        self._cancel_event = threading.Event()
+        self._build_thread = threading.Thread(target=self._build, args=(self.config, self._cancel_event),
+                                              name=__class__.__name__, daemon=True)
+        self.builds += 1
+        self._build_thread.start()
+
+    def wait(self):
+        """Wait for the running build to finish."""
+        if self._build_thread is not None:
+            self._build_thread.join()
+
+    def run(self, stop_event=None, use_inotify=True):
+        """Build, then rebuild on every change until interrupted or stop_event is set."""
+        stop_event = stop_event or threading.Event()
+        debounce = self.config.get_custom_config_value('watch_debounce', use_default=True) or 0.3
+        paths, exclude = self.watched_paths()
+        watcher = DockerFileWatcher(paths, debounce=debounce, exclude=exclude, use_inotify=use_inotify)
+        self.logging.log(f"Watching {', '.join(paths)} ({watcher.backend})")
+        self.rebuild()
+        try:
+            while not stop_event.is_set():
+                changed = watcher.wait_for_change(timeout=0.5)
+                if not changed:
+                    continue
+                self.logging.log(f"Changed: {', '.join(sorted(changed))}")
+                if not self.affects_build(changed):
+                    self.logging.log('No stage of the build copies the changed files, not rebuilding')
+                    continue
+                if self.config_path in changed:
+                    self._reload_config()
+                    if self.watched_paths() != (paths, exclude):
+                        # the config moved the build context
+                        watcher.close()
+                        paths, exclude = self.watched_paths()
+                        watcher = DockerFileWatcher(paths, debounce=debounce, exclude=exclude,
+                                                    use_inotify=use_inotify)
+                self.rebuild()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            self.cancel()
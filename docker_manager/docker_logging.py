@@ -1,62 +1,121 @@
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
 import logging
 import os
+import queue
 import sys
+import threading
+
+
+class DockerJsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line"""
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'initializer': getattr(record, 'initializer', None),
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class DockerQueueHandler(QueueHandler):
+    """Queues records unformatted, so formatting happens on the writer thread"""
+    def prepare(self, record):
+        return record
 
 
 class DockerLogging:
     """Handles logging to file and or stdout"""
-    def __init__(self, docker_config):
+    TEXT_FORMAT = '%(asctime)s %(levelname)s:%(message)s'
+    # one queue and writer thread per log file, shared by every instance in the process
+    _lock = threading.Lock()
+    _writers = {}
+    _stdout_levels = frozenset((logging.DEBUG, logging.INFO, logging.WARNING))
+
+    def __init__(self, docker_config, initializer=None):
         self.config = docker_config
         self.log_file_path = self.config.get_custom_config_value('log_file', use_default=True)
         self.log_level = self.config.get_custom_config_value('log_level', use_default=True)
+        self.log_format = self.config.get_custom_config_value('log_format', use_default=True)
         self.log_enabled = self.config.get_custom_config_value('logging_enabled', use_default=True)
         self.verbose_enabled = self.config.get_custom_config_value('verbose', use_default=True)
-        self.initializer = self.config.get_custom_config_value('initializer', use_default=True)
+        self.initializer = initializer or self.config.get_custom_config_value('initializer', use_default=True)
+        if isinstance(self.log_level, str):
+            self.log_level = logging.getLevelName(self.log_level.upper())
+        if not isinstance(self.log_level, int):
+            self.log_level = logging.NOTSET
+        self._extra = {'initializer': self.initializer}
         self.logger = None
         self.setup_logging()
         # let logging begin
-        self.log(f'DockerLogging initialized by {self.initializer}')
+        self.log('DockerLogging initialized by %s', self.initializer)
 
     def setup_logging(self):
         if not self.log_enabled:
             return
 
-        if os.path.dirname(self.log_file_path) != '':
-            if not os.path.exists(os.path.dirname(self.log_file_path)):
-                os.makedirs(os.path.dirname(self.log_file_path))
-        logging.basicConfig(filename=self.log_file_path, level=self.log_level,
-                            format='%(asctime)s %(levelname)s:%(message)s')
-        self.logger = logging.getLogger(__name__)
+        self.logger = self._shared_logger(self.log_file_path, self.log_format)
+
+    @classmethod
+    def _shared_logger(cls, log_file_path, log_format) -> logging.Logger:
+        """Internal method to get the queue-backed logger writing to log_file_path."""
+        key = (os.path.abspath(log_file_path), log_format)
+        with cls._lock:
+            if key not in cls._writers:
+                if os.path.dirname(log_file_path) != '':
+                    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+                file_handler = logging.FileHandler(log_file_path)
+                if log_format == 'json':
+                    file_handler.setFormatter(DockerJsonFormatter())
+                else:
+                    file_handler.setFormatter(logging.Formatter(cls.TEXT_FORMAT))
 
-    def print_message(self, message, level):
+                log_queue = queue.SimpleQueue()
+                listener = QueueListener(log_queue, file_handler)
+                listener.start()
+
+                logger = logging.getLogger(f'{__name__}.{len(cls._writers)}')
+                logger.setLevel(1)  # each instance filters on its own log_level
+                logger.propagate = False
+                logger.addHandler(DockerQueueHandler(log_queue))
+                cls._writers[key] = (logger, listener, file_handler)
+            return cls._writers[key][0]
+
+    @classmethod
+    def shutdown(cls):
+        """Drain the queues and close the log files. Runs at exit."""
+        with cls._lock:
+            writers = list(cls._writers.values())
+            cls._writers.clear()
+        for logger, listener, file_handler in writers:
+            listener.stop()
+            file_handler.close()
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+
+    def print_message(self, message, level, *args):
         if not self.verbose_enabled:
             return
 
-        # Define a mapping of logging levels to corresponding print actions
-        action = {
-            logging.DEBUG: lambda msg: print(msg),
-            logging.INFO: lambda msg: print(msg),
-            logging.WARNING: lambda msg: print(msg),
-            logging.ERROR: lambda msg: print(msg, file=sys.stderr)
-        }.get(level, lambda msg: print(msg, file=sys.stderr))  # Default action
+        if args:
+            message = message % args
+        # debug, info and warning go to stdout, everything else to stderr
+        print(message, file=sys.stdout if level in self._stdout_levels else sys.stderr, flush=True)
 
-        # Execute the corresponding action
-        action(message)
-
-    def log_message(self, message, level):
-        if not self.log_enabled:
+    def log_message(self, message, level, *args):
+        if not self.log_enabled or level < self.log_level:
             return
 
-        # Define a mapping of logging levels to corresponding log actions
-        action = {
-            logging.DEBUG: lambda msg: self.logger.debug(msg),
-            logging.WARNING: lambda msg: self.logger.warning(msg),
-            logging.ERROR: lambda msg: self.logger.error(msg, file=sys.stderr)
-        }.get(level, lambda msg: self.logger.info(msg))  # Default action
+        # formatting and the file write happen on the writer thread
+        self.logger.log(level, message, *args, extra=self._extra)
+
+    def log(self, message, *args, level=logging.INFO):
+        self.print_message(message, level, *args)
+        self.log_message(message, level, *args)
 
-        # Execute the corresponding action
-        action(message)
 
-    def log(self, message, level=logging.INFO):
-        self.print_message(message, level)
-        self.log_message(message, level)
+atexit.register(DockerLogging.shutdown)
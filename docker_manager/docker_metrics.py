@@ -0,0 +1,119 @@
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+
+
+class DockerMetrics:
+    """Process-wide wall-clock and CPU timings for each phase of a run"""
+    PREFIX = 'docker_manager'
+    # labels with a bounded set of values, tags and instructions would add new series on every build
+    PROMETHEUS_LABELS = ('image_name', 'healthy', 'dry_run')
+    # records kept for the JSON export, a long running process drops the oldest
+    MAX_RECORDS = 10000
+    _lock = threading.Lock()
+    _records = deque(maxlen=MAX_RECORDS)
+    # the Prometheus sums per phase and bounded labels, which count every record ever made
+    _totals = {}
+    _started = time.perf_counter()
+    _started_at = datetime.now(timezone.utc)
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name, **labels):
+        """Time the enclosed block as one record of the named phase."""
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            cls.record(name, time.perf_counter() - start_wall, time.thread_time() - start_cpu,
+                       start=start_wall, **labels)
+
+    @classmethod
+    def record(cls, name, wall_seconds, cpu_seconds=0.0, start=None, **labels):
+        """Add a timing that was measured elsewhere, such as a build step."""
+        if start is None:
+            start = time.perf_counter() - wall_seconds
+        labels = {key: str(value) for key, value in labels.items()}
+        series = {key: value for key, value in labels.items() if key in cls.PROMETHEUS_LABELS}
+        series = tuple(sorted({**series, 'phase': name}.items()))
+        with cls._lock:
+            cls._records.append({
+                'phase': name,
+                'labels': labels,
+                'start_seconds': start - cls._started,
+                'wall_seconds': wall_seconds,
+                'cpu_seconds': cpu_seconds
+            })
+            total = cls._totals.setdefault(series, [0.0, 0.0, 0])
+            total[0] += wall_seconds
+            total[1] += cpu_seconds
+            total[2] += 1
+
+    @classmethod
+    def records(cls) -> list:
+        with cls._lock:
+            return list(cls._records)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._records = deque(maxlen=cls.MAX_RECORDS)
+            cls._totals = {}
+            cls._started = time.perf_counter()
+            cls._started_at = datetime.now(timezone.utc)
+
+    @classmethod
+    def write_json(cls, path):
+        """Write the records of the run to a JSON file, at most MAX_RECORDS of the latest."""
+        report = {'started_at': cls._started_at.isoformat(), 'phases': cls.records()}
+        cls._write_file(path, json.dumps(report, indent=2))
+
+    @staticmethod
+    def _escape_label(value) -> str:
+        return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+    @classmethod
+    def write_prometheus(cls, path):
+        """Write the records, summed per phase and image_name, in the Prometheus text format.
+
+        Per-tag and per-instruction detail is only kept in the JSON export. The sums include
+        the records the JSON export no longer holds, so the counters never go down.
+        """
+        with cls._lock:
+            totals = {key: list(total) for key, total in cls._totals.items()}
+
+        metrics = [
+            ('phase_wall_seconds_total', 'Wall-clock seconds spent in each phase', 0),
+            ('phase_cpu_seconds_total', 'CPU seconds spent in each phase by the timing thread', 1),
+            ('phase_runs_total', 'Number of times each phase ran', 2)
+        ]
+        lines = []
+        for metric, description, index in metrics:
+            lines.append(f'# HELP {cls.PREFIX}_{metric} {description}')
+            lines.append(f'# TYPE {cls.PREFIX}_{metric} counter')
+            for key, total in totals.items():
+                label_text = ','.join(f'{name}="{cls._escape_label(value)}"' for name, value in key)
+                lines.append(f'{cls.PREFIX}_{metric}{{{label_text}}} {total[index]}')
+        cls._write_file(path, '\n'.join(lines) + '\n')
+
+    @staticmethod
+    def _write_file(path, content):
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(content)
+
+    @classmethod
+    def export(cls, docker_config):
+        """Write the metrics files named in the configuration, if any."""
+        json_file = docker_config.get_custom_config_value('metrics_json_file', use_default=True)
+        prometheus_file = docker_config.get_custom_config_value('metrics_prometheus_file', use_default=True)
+        if json_file:
+            cls.write_json(json_file)
+        if prometheus_file:
+            cls.write_prometheus(prometheus_file)
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import re
+import time
+
+from docker.errors import DockerException
+
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_event_monitor import DockerEventMonitor
+from docker_manager.docker_image_inventory import DockerImageInventory
+from docker_manager.docker_logging import DockerLogging
+from docker_manager.docker_metrics import DockerMetrics
+
+
+class DockerPruneReport:
+    """What a prune removed, or with dry_run would remove"""
+    def __init__(self, image_name, dry_run):
+        self.image_name = image_name
+        self.dry_run = dry_run
+        self.containers = []
+        self.tags = []
+        self.kept = 0
+        self.in_use = 0
+        self.reclaimable = 0
+        self.errors = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @staticmethod
+    def _format_size(size) -> str:
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024 or unit == 'GB':
+                return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+            size /= 1024
+
+    def summary(self) -> str:
+        action = 'Would remove' if self.dry_run else 'Removed'
+        return (f'{action} {len(self.tags)} tags and {len(self.containers)} containers of {self.image_name}, '
+                f'reclaiming up to {self._format_size(self.reclaimable)}; kept {self.kept} tags, '
+                f'{self.in_use} images in use by containers')
+
+    def __repr__(self):
+        return f'DockerPruneReport({self.summary()})'
+
+
+class DockerPruner:
+    """Removes old builds of an image under the retention policy in config.json
+
+    The policy counts tags, since a build with unchanged inputs retags an existing image. The
+    newest prune_keep_last tags of image_name are kept, and so is every tag of an image younger
+    than prune_keep_younger_than seconds. Older tags are removed, which only untags an image
+    that keeps another one. An image used by any container keeps all its tags unless
+    prune_containers is set: then the stopped {container_name}-{tag} and
+    {container_name}-{tag}-{n} containers of an old image are removed first, then its tags,
+    prune_max_parallel at a time. Their volumes are kept.
+    """
+    # container states that can be removed without stopping anything
+    STOPPED_STATES = ('created', 'exited', 'dead')
+
+    def __init__(self, docker_config, client_session=None):
+        self.config = docker_config
+        self.client_session = client_session or DockerClientSession(docker_config)
+        self.image_name = docker_config.get_custom_config_value('image_name', use_default=True)
+        self.container_name = docker_config.get_custom_config_value('container_name', use_default=True)
+        self.keep_last = docker_config.get_custom_config_value('prune_keep_last', use_default=True) or 0
+        self.keep_younger_than = \
+            docker_config.get_custom_config_value('prune_keep_younger_than', use_default=True) or 0
+        self.max_parallel = docker_config.get_custom_config_value('prune_max_parallel', use_default=True) or 4
+        self.prune_containers = docker_config.get_custom_config_value('prune_containers', use_default=True)
+        self.logging = DockerLogging(docker_config, initializer=__class__.__name__)
+
+    def _owned(self, container, tags) -> bool:
+        """Internal method to tell whether create_container or create_containers named this container for a tag."""
+        if not self.container_name:
+            return False
+        names = [name.lstrip('/') for name in container.get('Names') or []]
+        patterns = [re.compile(rf'{re.escape(self.container_name)}-{re.escape(tag)}(-\d+)?') for tag in tags]
+        return any(pattern.fullmatch(name) for pattern in patterns for name in names)
+
+    def plan(self, image_name=None, dry_run=True) -> tuple:
+        """Returns (report, container IDs to remove, tags to remove) without removing anything."""
+        image_name = image_name or self.image_name
+        report = DockerPruneReport(image_name, dry_run)
+        inventory = DockerImageInventory.for_session(self.config, self.client_session)
+        # newest first
+        images = sorted(inventory.images(repository=image_name), key=lambda image: image.created, reverse=True)
+        # a running event monitor already knows every container
+        monitor = DockerEventMonitor.running_for(self.client_session)
+        containers = monitor.containers() if monitor is not None else self.client_session.api.containers(all=True)
+
+        # every build is a tag, a build with unchanged inputs only adds a tag to an existing image.
+        # Newest first: by image age, then by tag name, which tag_format starts with the build date.
+        builds = sorted(((tag, image) for image in images for tag in image.repo_tags
+                         if DockerImageInventory.split_repo_tag(tag)[0] == image_name),
+                        key=lambda build: (build[1].created, DockerImageInventory.split_repo_tag(build[0])[1]),
+                        reverse=True)
+        cutoff = time.time() - self.keep_younger_than
+        old_tags = {tag for index, (tag, image) in enumerate(builds)
+                    if index >= self.keep_last and image.created < cutoff}
+        report.kept = len(builds) - len(old_tags)
+
+        container_ids = []
+        tags = []
+        for image in images:
+            own_tags = [tag for tag in image.repo_tags if DockerImageInventory.split_repo_tag(tag)[0] == image_name]
+            image_old_tags = [tag for tag in own_tags if tag in old_tags]
+            if not image_old_tags:
+                continue
+            users = [container for container in containers if container.get('ImageID') == image.id]
+            if users and len(image_old_tags) == len(own_tags):
+                tags_only = [DockerImageInventory.split_repo_tag(tag)[1] for tag in own_tags]
+                # an image with containers is only pruned when all of them are stopped ones this tool created
+                if not self.prune_containers or \
+                        any(container.get('State') not in self.STOPPED_STATES or not self._owned(container, tags_only)
+                            for container in users):
+                    report.in_use += 1
+                    report.kept += len(own_tags)
+                    continue
+                container_ids += [container['Id'] for container in users]
+                report.containers += [(container.get('Names') or [container['Id']])[0].lstrip('/')
+                                      for container in users]
+            # while the image keeps another tag, removing one only untags it
+            tags += image_old_tags
+            report.tags += image_old_tags
+            if len(image_old_tags) == len(image.repo_tags) and image.size:
+                # the image is only deleted once its last tag is gone
+                report.reclaimable += image.size - max(image.shared_size, 0)
+        return report, container_ids, tags
+
+    def _remove_all(self, remove, items, report):
+        """Internal method to run remove on every item in parallel, collecting the failures in the report."""
+        def attempt(item):
+            try:
+                remove(item)
+            except DockerException as e:
+                report.errors.append(f'{item}: {e}')
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, max(len(items), 1))) as executor:
+            list(executor.map(attempt, items))
+
+    def prune(self, image_name=None, dry_run=False) -> DockerPruneReport:
+        """Remove the builds outside the retention policy, or with dry_run only report them."""
+        with DockerMetrics.phase('prune', dry_run=dry_run):
+            report, container_ids, tags = self.plan(image_name, dry_run)
+            if not dry_run:
+                api = self.client_session.api
+                # containers first, a tag of an image with containers cannot be deleted
+                self._remove_all(api.remove_container, container_ids, report)
+                self._remove_all(api.remove_image, tags, report)
+
+        self.logging.log(report.summary())
+        for tag in report.tags:
+            self.logging.log(f"{'Would remove' if dry_run else 'Removed'} {tag}", level=logging.DEBUG)
+        for error in report.errors:
+            self.logging.log(f'Prune failed for {error}', level=logging.ERROR)
+        return report
@@ -1,20 +1,56 @@
 import subprocess
-import docker
-from docker.errors import APIError
+import time
+
 
 class DockerServiceManager:
 
     @staticmethod
-    def is_docker_running():
+    def is_docker_running(client_session=None):
         """Internal method to check if the Docker service is running."""
-        client = docker.from_env()
+        # the SDK is only imported once the daemon is actually checked
+        import docker
+        from docker.errors import DockerException
+        from requests.exceptions import RequestException
+
+        if client_session is not None:
+            # reuse the shared client, it is closed by its owner
+            try:
+                return client_session.client.ping()  # pings the Docker daemon
+            except (DockerException, RequestException):
+                return False
+
+        client = None
         try:
+            client = docker.from_env()
             client.ping()  # pings the Docker daemon
             return True
-        except APIError:
+        except (DockerException, RequestException):
             return False
         finally:
-            client.close()
+            if client is not None:
+                client.close()
+
+    @staticmethod
+    def wait_until_ready(client_session=None, timeout=30.0, initial_delay=0.05, max_delay=2.0) -> bool:
+        """Poll the daemon with exponential backoff until it answers or timeout seconds have passed."""
+        from docker_manager.docker_client_session import DockerClientSession
+
+        # one client for every ping, its pool reconnects once the socket is up
+        session = client_session or DockerClientSession()
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        try:
+            while True:
+                if DockerServiceManager.is_docker_running(session):
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, max_delay)
+        finally:
+            if client_session is None:
+                session.close()
 
     @staticmethod
     def start_docker():
@@ -0,0 +1,308 @@
+import fnmatch
+import hashlib
+import json
+import os
+import re
+
+
+class DockerStage:
+    """One FROM section of a Dockerfile and everything that goes into it"""
+    def __init__(self, index, name, base):
+        self.index = index
+        self.name = name
+        # the image reference of the FROM line, with ARGs resolved
+        self.base = base
+        # the earlier stage the FROM line names, None for an external image
+        self.parent = None
+        # earlier stages read by COPY --from or RUN --mount=from
+        self.copies_from = set()
+        # ARGs declared in the stage and their values
+        self.args = {}
+        # the buildargs those values and the FROM line are derived from
+        self.arg_inputs = set()
+        # COPY and ADD sources and RUN bind mounts read from the build context
+        self.sources = []
+        self.instructions = []
+
+    @property
+    def dependencies(self) -> set:
+        return ({self.parent} if self.parent else set()) | self.copies_from
+
+    def __repr__(self):
+        return f'DockerStage({self.name}, from {self.parent or self.base})'
+
+
+class DockerStageGraph:
+    """Parses a Dockerfile into its stages and the stages, buildargs and context files each one depends on
+
+    ARG defaults are resolved in order against the buildargs, the way the builder does, so
+    chained ARGs such as BASE_IMAGE=${BASE_IMAGE_NAME}:${BASE_IMAGE_VERSION} give real values.
+    """
+    _variable_pattern = re.compile(r'\$(?:\{(\w+)(?::([-+])([^}]*))?\}|(\w+))')
+    _assignment_pattern = re.compile(r'''(\w+)(?:=("[^"]*"|'[^']*'|\S*))?''')
+    _heredoc_pattern = re.compile(r'<<-?\s*["\']?\w+')
+    # the RUN --mount types this parser knows, only bind mounts without from read the build context
+    _mount_types = ('bind', 'cache', 'tmpfs', 'secret', 'ssh')
+
+    def __init__(self, content: str, buildargs: dict = None):
+        self.buildargs = dict(buildargs or {})
+        # global ARGs before the first FROM, only visible to FROM lines and redeclared ARGs
+        self.meta_args = {}
+        # the ARGs each global ARG is derived from, itself included
+        self._meta_inputs = {}
+        self.stages = []
+        # the constructs this parser does not model, the stage inputs are incomplete when there are any
+        self.unmodeled = []
+        self._parse(content)
+
+    @classmethod
+    def from_file(cls, dockerfile_path: str, buildargs: dict = None) -> 'DockerStageGraph':
+        with open(dockerfile_path, 'r') as dockerfile:
+            return cls(dockerfile.read(), buildargs)
+
+    @classmethod
+    def resolve(cls, text: str, values: dict) -> str:
+        """Substitutes $NAME, ${NAME}, ${NAME:-default} and ${NAME:+alternative} from values."""
+        def substitute(match):
+            name = match.group(1) or match.group(4)
+            value = values.get(name)
+            if match.group(2) == '-':
+                return value if value else match.group(3)
+            if match.group(2) == '+':
+                return match.group(3) if value else ''
+            return value or ''
+        return cls._variable_pattern.sub(substitute, text)
+
+    @classmethod
+    def _references(cls, text: str) -> set:
+        """Internal method to return the names of the variables text refers to."""
+        return {match.group(1) or match.group(4) for match in cls._variable_pattern.finditer(text)}
+
+    @staticmethod
+    def _instructions(content: str):
+        """Internal method to yield each instruction with its continuation lines joined and comments dropped."""
+        current = None
+        for line in content.splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                # comments may sit between continuation lines
+                continue
+            if stripped.endswith('\\'):
+                current = (current or '') + stripped[:-1] + ' '
+                continue
+            yield (current or '') + stripped
+            current = None
+        if current:
+            yield current
+
+    def _assignments(self, text: str) -> list:
+        """Internal method to parse 'NAME[=value] ...' into (name, unresolved value or None)."""
+        return [(match.group(1), (match.group(2) or '').strip('"\'') if '=' in match.group(0) else None)
+                for match in self._assignment_pattern.finditer(text)]
+
+    @staticmethod
+    def _arguments(text: str) -> tuple:
+        """Internal method to split an instruction's flags from its arguments, handling the JSON form."""
+        flags = []
+        words = text.split()
+        while words and words[0].startswith('--'):
+            flags.append(words.pop(0))
+        rest = text.split(None, len(flags))[-1] if len(words) else ''
+        if rest.startswith('['):
+            try:
+                return flags, [str(word) for word in json.loads(rest)]
+            except ValueError:
+                pass
+        return flags, words
+
+    @staticmethod
+    def _mount_options(flag: str) -> dict:
+        """Internal method to split '--mount=type=bind,source=x,target=/y' into its options."""
+        options = {}
+        for option in flag[len('--mount='):].split(','):
+            key, separator, value = option.partition('=')
+            options[key.strip().lower()] = value.strip('"\'') if separator else 'true'
+        return options
+
+    def _stage_reference(self, reference: str, by_index=True):
+        """Internal method to return the stage a name or index refers to, None for an external image."""
+        # like docker, stage names are case insensitive
+        reference = reference.lower()
+        for stage in self.stages:
+            if reference == str(stage.index):
+                if by_index:
+                    return stage
+            elif reference == stage.name:
+                return stage
+        return None
+
+    def _parse(self, content: str):
+        stage = None
+        # ARG and ENV values visible to the current instruction, and the ARGs each ARG is derived from
+        values = {}
+        inputs = self._meta_inputs
+        for instruction in self._instructions(content):
+            keyword, _, text = instruction.partition(' ')
+            keyword = keyword.upper()
+            text = text.strip()
+
+            if keyword == 'FROM':
+                _, arguments = self._arguments(text)
+                if not arguments:
+                    continue
+                stage_name = arguments[2].lower() if len(arguments) >= 3 and arguments[1].lower() == 'as' else None
+                stage = DockerStage(len(self.stages), stage_name or str(len(self.stages)),
+                                    self.resolve(arguments[0], self.meta_args))
+                stage.arg_inputs = set().union(*(self._meta_inputs.get(name, {name})
+                                                 for name in self._references(arguments[0])))
+                parent = self._stage_reference(stage.base, by_index=False)
+                stage.parent = parent.name if parent else None
+                self.stages.append(stage)
+                values = {}
+                inputs = {}
+                continue
+
+            if keyword == 'ARG':
+                # each default sees the ARGs declared before it, also within one instruction
+                for name, default in self._assignments(text):
+                    if name in self.buildargs:
+                        value = str(self.buildargs[name])
+                        inputs[name] = {name}
+                    elif default is not None:
+                        value = self.resolve(default, values if stage else self.meta_args)
+                        inputs[name] = {name}.union(*(inputs.get(reference, {reference})
+                                                      for reference in self._references(default)))
+                    else:
+                        # a redeclared global ARG keeps its global value
+                        value = self.meta_args.get(name) if stage else None
+                        inputs[name] = {name} | (self._meta_inputs.get(name, set()) if stage else set())
+                    if stage is None:
+                        self.meta_args[name] = value
+                    else:
+                        stage.args[name] = value
+                        stage.arg_inputs |= inputs[name]
+                        values[name] = value
+            if stage is None:
+                continue
+            stage.instructions.append(instruction)
+            if keyword in ('RUN', 'COPY', 'ADD') and self._heredoc_pattern.search(text):
+                # the heredoc body would be read as instructions
+                self.unmodeled.append(f'heredoc in stage {stage.name}')
+
+            if keyword == 'ENV':
+                assignments = self._assignments(text)
+                if len(assignments) > 1 and '=' not in text.split()[0]:
+                    # the legacy 'ENV NAME value with spaces' form
+                    assignments = [(assignments[0][0], text.split(None, 1)[1])]
+                # all values of one ENV see the variables from before it
+                values.update({name: self.resolve(value or '', values) for name, value in assignments})
+            elif keyword in ('COPY', 'ADD'):
+                flags, arguments = self._arguments(text)
+                copy_from = [flag.split('=', 1)[1] for flag in flags if flag.startswith('--from=')]
+                if copy_from:
+                    source_stage = self._stage_reference(self.resolve(copy_from[0], values))
+                    if source_stage is not None:
+                        stage.copies_from.add(source_stage.name)
+                    continue
+                for source in arguments[:-1]:
+                    source = self.resolve(source, values)
+                    if keyword == 'ADD' and re.match(r'^[a-z]+://', source):
+                        continue
+                    stage.sources.append(source)
+            elif keyword == 'RUN':
+                flags, _ = self._arguments(text)
+                for flag in flags:
+                    if not flag.startswith('--mount='):
+                        continue
+                    options = self._mount_options(self.resolve(flag, values))
+                    mount_type = options.get('type', 'bind')
+                    if mount_type not in self._mount_types:
+                        self.unmodeled.append(f'--mount type {mount_type} in stage {stage.name}')
+                    elif 'from' in options:
+                        source_stage = self._stage_reference(options['from'])
+                        if source_stage is not None:
+                            stage.copies_from.add(source_stage.name)
+                    elif mount_type == 'bind':
+                        # a bind mount without from reads the build context, all of it by default
+                        stage.sources.append(options.get('source') or options.get('src') or '.')
+
+    def stage(self, name: str) -> DockerStage:
+        stage = self._stage_reference(name)
+        if stage is None:
+            raise ValueError(f"Unknown build target {name}, the stages are: {', '.join(self.stage_names)}")
+        return stage
+
+    @property
+    def stage_names(self) -> list:
+        return [stage.name for stage in self.stages]
+
+    def external_images(self) -> set:
+        """The images the FROM lines name that are not stages of this file."""
+        return {stage.base for stage in self.stages if stage.parent is None and stage.base != 'scratch'}
+
+    def needed_stages(self, target: str = None) -> list:
+        """The stages a build of target runs, in file order. Without a target the last stage is built."""
+        if not self.stages:
+            return []
+        needed = set()
+        pending = [self.stage(target) if target else self.stages[-1]]
+        while pending:
+            stage = pending.pop()
+            if stage.name not in needed:
+                needed.add(stage.name)
+                pending += [self.stage(dependency) for dependency in stage.dependencies]
+        return [stage for stage in self.stages if stage.name in needed]
+
+    @staticmethod
+    def source_matches(source: str, relative_path: str) -> bool:
+        """Whether a COPY or ADD source, a path, directory or wildcard pattern, includes a context file."""
+        source = os.path.normpath(source.lstrip('/'))
+        if source in ('.', ''):
+            return True
+        parts = relative_path.split('/')
+        # a source names the file itself or one of the directories above it
+        return any(fnmatch.fnmatchcase('/'.join(parts[:length]), source) for length in range(1, len(parts) + 1))
+
+    def affected_stages(self, buildargs=(), files=()) -> list:
+        """The stages that change with the given buildargs or context files, and every stage built on them."""
+        buildargs, files = set(buildargs), list(files)
+        affected = set()
+        for stage in self.stages:
+            if stage.dependencies & affected or buildargs & stage.arg_inputs or \
+                    any(self.source_matches(source, path) for source in stage.sources for path in files):
+                affected.add(stage.name)
+        return [stage for stage in self.stages if stage.name in affected]
+
+    def stage_hashes(self, build_path: str, files: list, target: str = None) -> dict:
+        """Hash the inputs of every stage target needs: instructions, ARG values, context files and dependencies."""
+        file_hashes = {}
+
+        def file_hash(relative_path):
+            if relative_path not in file_hashes:
+                full_path = os.path.join(build_path, relative_path)
+                digest = hashlib.sha256(f'{os.lstat(full_path).st_mode:o}\0'.encode())
+                if os.path.islink(full_path):
+                    digest.update(os.readlink(full_path).encode())
+                else:
+                    with open(full_path, 'rb') as file:
+                        for block in iter(lambda: file.read(1024 * 1024), b''):
+                            digest.update(block)
+                file_hashes[relative_path] = digest.hexdigest()
+            return file_hashes[relative_path]
+
+        files = [path for path in files
+                 if not os.path.isdir(os.path.join(build_path, path)) or os.path.islink(os.path.join(build_path, path))]
+        hashes = {}
+        for stage in self.needed_stages(target):
+            digest = hashlib.sha256()
+            digest.update(f'base:{hashes[stage.parent] if stage.parent else stage.base}\0'.encode())
+            for name in sorted(stage.copies_from):
+                digest.update(f'from:{name}:{hashes[name]}\0'.encode())
+            digest.update(f'args:{json.dumps(stage.args, sort_keys=True)}\0'.encode())
+            for instruction in stage.instructions:
+                digest.update(f'instruction:{instruction}\0'.encode())
+            for path in files:
+                if any(self.source_matches(source, path) for source in stage.sources):
+                    digest.update(f'file:{path}:{file_hash(path)}\0'.encode())
+            hashes[stage.name] = digest.hexdigest()
+        return hashes
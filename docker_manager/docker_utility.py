@@ -1,41 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import subprocess
 
+from docker_manager.docker_command import DockerCommand
+from docker_manager.docker_git_metadata import DockerGitMetadata
+
 
 class DockerUtility:
 
     @staticmethod
-    def run_command_with_output(command, error_message, log_file_path=None):
+    def run_command_with_output(command, error_message, log_file_path=None, logger=None, timeout=None,
+                                cancel_event=None, on_line=None):
         """Run a command and stream its output."""
-        DockerUtility.run_command(command=command, error_message=error_message, check=True, stream_output=True, log_file_path=log_file_path)
+        DockerUtility.run_command(command=command, error_message=error_message, check=True, stream_output=True,
+                                  log_file_path=log_file_path, logger=logger, timeout=timeout,
+                                  cancel_event=cancel_event, on_line=on_line)
 
     @staticmethod
-    def run_command(command, error_message, check=True, stream_output=False, log_file_path=None):
-        """Run a command and handle its output."""
-        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        stdout, stderr = process.communicate()
+    def run_command(command, error_message, check=True, stream_output=False, log_file_path=None, logger=None,
+                    timeout=None, cancel_event=None, on_line=None, tail_lines=100):
+        """Run a command and handle its output line by line as it arrives. Returns the finished DockerCommand."""
+        docker_command = DockerCommand(command, log_file_path=log_file_path, logger=logger,
+                                       stream_output=stream_output, tail_lines=tail_lines, on_line=on_line)
+        try:
+            docker_command.start().wait(timeout, cancel_event)
+        except subprocess.TimeoutExpired:
+            raise Exception(f"Error: {error_message}\nTimed out after {timeout} seconds\n{docker_command.error_output}")
+
+        if docker_command.returncode != 0 and check:
+            raise Exception(f"Error: {error_message}\n{docker_command.error_output}")
+        return docker_command
 
-        if log_file_path is not None:
-            with open(log_file_path, 'w') as file:
-                file.write(stdout)
-                if stderr:
-                    file.write(stderr)
+    @staticmethod
+    def run_commands(commands, error_message, check=True, stream_output=False, log_file_paths=None, logger=None,
+                     timeout=None, cancel_event=None, max_parallel=4):
+        """Run several commands in parallel, each with its own log file and labelled console output."""
+        log_file_paths = log_file_paths or [None] * len(commands)
+        docker_commands = [DockerCommand(command, log_file_path=log_file_path, logger=logger,
+                                         stream_output=stream_output, label=str(index) if len(commands) > 1 else None)
+                           for index, (command, log_file_path) in enumerate(zip(commands, log_file_paths))]
 
-        if stream_output:
-            print(stdout.strip())
+        def run(docker_command):
+            try:
+                docker_command.start().wait(timeout, cancel_event)
+            except subprocess.TimeoutExpired:
+                docker_command.returncode = None
+            return docker_command
 
-        if process.returncode != 0 and check:
-            raise Exception(f"Error: {error_message}\n{stderr}")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(commands)))) as executor:
+            finished = list(executor.map(run, docker_commands))
+
+        failed = [docker_command for docker_command in finished if docker_command.returncode != 0]
+        if failed and check:
+            details = '\n'.join(f"{docker_command.command}: "
+                                 f"{'timed out' if docker_command.returncode is None else docker_command.returncode}"
+                                 f"\n{docker_command.error_output}" for docker_command in failed)
+            raise Exception(f"Error: {error_message}\n{details}")
+        return finished
 
     @staticmethod
-    def create_tag(date_format):
-        """Create a tag using the current date and git commit hash."""
-        git_hash_cmd = ["git", "rev-parse", "--short", "HEAD"]
+    def create_tag(date_format, branch=False, dirty=False):
+        """Create a tag using the current date and git commit hash, optionally the branch and a dirty marker."""
         timestamp = datetime.now().strftime(date_format)
-        process = subprocess.Popen(git_hash_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        git_commit_hash, _ = process.communicate()
-
-        if git_commit_hash:
-            return f"{timestamp}-{git_commit_hash.strip()}"
-        else:
-            return timestamp
+        components = DockerGitMetadata.for_path().tag_components(branch=branch, dirty=dirty)
+        # docker limits tags to 128 characters
+        return '-'.join([timestamp] + components)[:128]
@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
+import os
 import sys
 from docker_manager.docker_config import DockerConfig
-from docker_manager.docker_container_manager import DockerContainerManager
-from docker_manager.docker_dependency_checker import DockerDependencyChecker
-from docker_manager.docker_image_builder import DockerImageBuilder
-from test_docker_manager.test_runner import DockerTestSuite
+from docker_manager.docker_metrics import DockerMetrics
+
+# The managers pull in the Docker SDK and the test runner pulls in every test
+# module, so they are imported by the code paths that need them. This keeps
+# --help and other short-lived calls fast.
+
+
+def positive_int(value) -> int:
+    """argparse type for counts, which must be at least 1."""
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise ArgumentTypeError(f'{value} is not a positive integer')
+    return count
 
 
 class BuilderArgumentParser:
@@ -21,12 +34,40 @@ class BuilderArgumentParser:
         self.parser.add_argument('-l', '--logging', action='store_true', help='Enable logging')
         self.parser.add_argument('-b', '--build-image', nargs='?', const='Dockerfile',
                                  help='Build Docker image, optionally specify a Dockerfile path')
+        self.parser.add_argument('-s', '--stream-build', action='store_true',
+                                 help='Stream build output as it arrives')
+        self.parser.add_argument('-k', '--buildkit', action='store_true',
+                                 help='Build with BuildKit (docker buildx) and its layer cache')
+        self.parser.add_argument('-T', '--target',
+                                 help='Build only this stage of a multi-stage Dockerfile and the stages it needs')
+        self.parser.add_argument('-p', '--build-plan', action='store_true',
+                                 help='Build every image listed in the build_plan config field')
         self.parser.add_argument('-cc', '--create-container', action='store_true', help='Create Docker container')
+        self.parser.add_argument('-r', '--replicas', type=positive_int,
+                                 help='Create this many containers from the image, named <container>-<tag>-<n>')
+        self.parser.add_argument('-st', '--start', action='store_true',
+                                 help='Start the created container, or every replica with --replicas')
+        self.parser.add_argument('-m', '--metrics',
+                                 help='Write phase timings to METRICS.json and METRICS.prom at the end of the run')
+        self.parser.add_argument('-S', '--serve', action='store_true',
+                                 help='Run a build server on the build_server_socket unix socket')
+        self.parser.add_argument('-C', '--client', action='store_true',
+                                 help='Send --build-image and --create-container to a running build server')
+        self.parser.add_argument('-w', '--watch', action='store_true',
+                                 help='Rebuild whenever the Dockerfile, config_files_dir or the config file change; '
+                                      'with --create-container the container is recreated after each build')
+        self.parser.add_argument('-P', '--prune', action='store_true',
+                                 help='Remove old builds of image_name under the prune_* retention policy')
+        self.parser.add_argument('-n', '--dry-run', action='store_true',
+                                 help='With --prune, only report what would be removed and the space it frees')
         self.parser.add_argument('-t', '--run-tests', action='store_true', help='Run unit tests')
 
-    def parse_args(self):
+    def parse_args(self, argv=None):
         # Parse and return the arguments
-        return self.parser.parse_args()
+        args = self.parser.parse_args(argv)
+        if (args.replicas or args.start) and not args.create_container:
+            self.parser.error('--replicas and --start need --create-container')
+        return args
 
 
 def parse_arguments():
@@ -48,8 +89,31 @@ def load_configuration_file(args):
             dockerfile = config.get_default_config_name('dockerfile')
             required_config_files = config.get_default_config_name('required_config_files')
 
-            config.add_custom_value(verbose, args.verbose)
-            config.add_custom_value(logging_enabled, args.logging)
+            stream_build = config.get_default_config_name('stream_build')
+            buildkit_enabled = config.get_default_config_name('buildkit_enabled')
+            build_target = config.get_default_config_name('build_target')
+            metrics_json_file = config.get_default_config_name('metrics_json_file')
+            metrics_prometheus_file = config.get_default_config_name('metrics_prometheus_file')
+
+            # unset flags must not hide the config file and DOCKER_MANAGER_* values
+            if args.verbose:
+                config.add_custom_value(verbose, True)
+
+            if args.logging:
+                config.add_custom_value(logging_enabled, True)
+
+            if args.stream_build:
+                config.add_custom_value(stream_build, True)
+
+            if args.buildkit:
+                config.add_custom_value(buildkit_enabled, True)
+
+            if args.target:
+                config.add_custom_value(build_target, args.target)
+
+            if args.metrics:
+                config.add_custom_value(metrics_json_file, f'{args.metrics}.json')
+                config.add_custom_value(metrics_prometheus_file, f'{args.metrics}.prom')
 
             if args.logging:
                 if isinstance(args.logging, str):
@@ -64,31 +128,130 @@ def load_configuration_file(args):
             raise ValueError(f'Error reading config file: {e}')
 
 
-def build_image(docker_config):
-    image_builder = DockerImageBuilder(docker_config)
+def build_image(docker_config, client_session=None):
+    from docker_manager.docker_image_builder import DockerImageBuilder
+    image_builder = DockerImageBuilder(docker_config, client_session)
     return image_builder.build_image()
 
 
-def create_container(image_name_tag, docker_config):
-    container_manager = DockerContainerManager(docker_config)
-    container_manager.create_container(image_name_tag)
+def build_plan(docker_config, client_session=None):
+    from docker_manager.docker_build_plan import DockerBuildPlan
+    plan = DockerBuildPlan(docker_config, client_session)
+    results = plan.execute()
+    not_built = [image_name for image_name, status in plan.status.items() if status != DockerBuildPlan.BUILT]
+    if not_built:
+        raise Exception(f"Build plan incomplete, not built: {', '.join(sorted(not_built))}")
+    return results
+
+
+def create_container(image_name_tag, docker_config, client_session=None, start=False):
+    from docker_manager.docker_container_manager import DockerContainerManager
+    container_manager = DockerContainerManager(docker_config, client_session)
+    container = container_manager.create_container(image_name_tag)
+    if container is None:
+        raise Exception(f'Failed to create a container from {image_name_tag}')
+    if start:
+        result = container_manager.start_container(container)
+        if not result.ok:
+            raise Exception(f'Failed to start {result.name}: {result.error}')
+    return container
+
+
+def create_containers(image_name_tag, replicas, start, docker_config, client_session=None):
+    from docker_manager.docker_container_manager import DockerContainerManager
+    container_manager = DockerContainerManager(docker_config, client_session)
+    results = container_manager.create_containers(image_name_tag, replicas, start=start)
+    failed = [result.name for result in results if not result.ok]
+    if failed:
+        raise Exception(f"{len(failed)} of {replicas} containers failed: {', '.join(failed)}")
+    return results
+
+
+def prune(dry_run, docker_config, client_session=None):
+    from docker_manager.docker_pruner import DockerPruner
+    report = DockerPruner(docker_config, client_session).prune(dry_run=dry_run)
+    print(report.summary())
+    for tag in report.tags:
+        print(f'  {tag}')
+    if not report.ok:
+        raise Exception(f"{len(report.errors)} removals failed: {'; '.join(report.errors)}")
+    return report
+
+
+def watch(args, docker_config, client_session=None):
+    from docker_manager.docker_image_watcher import DockerImageWatcher
+    watcher = DockerImageWatcher(docker_config, args.config, client_session,
+                                 recreate_container=args.create_container, start_container=args.start)
+    watcher.run()
+
+
+def serve(docker_config):
+    from docker_manager.docker_build_server import DockerBuildServer
+    from docker_manager.docker_client_session import DockerClientSession
+    from docker_manager.docker_dependency_checker import DockerDependencyChecker
+
+    client_session = DockerClientSession(docker_config)
+    try:
+        # checked once, every request reuses the environment and the client
+        DockerDependencyChecker(docker_config, client_session).prepare_environment()
+        DockerBuildServer(docker_config, client_session=client_session).serve_forever()
+    finally:
+        client_session.close()
+
+
+def submit_to_server(args, docker_config):
+    from docker_manager.docker_build_client import DockerBuildClient
+
+    client = DockerBuildClient(docker_config.get_custom_config_value('build_server_socket', use_default=True))
+    overrides = docker_config.overrides()
+    # the server resolves paths against its own working directory
+    config_files_dir = docker_config.get_custom_config_value('config_files_dir', use_default=True)
+    overrides['config_files_dir'] = os.path.abspath(config_files_dir or '.')
+
+    if args.create_container:
+        response = client.create(os.path.abspath(args.config), overrides, args.replicas, args.start)
+        print(f"Built {response['result']}, created {', '.join(c['name'] for c in response['containers'])}")
+    elif args.build_image:
+        print(f"Built {client.build(os.path.abspath(args.config), overrides)}")
 
 
 def run_tests():
+    from test_docker_manager.test_runner import DockerTestSuite
     test_suite = DockerTestSuite()
     test_suite.run()
 
 
 def execute_main_logic(args, docker_config):
-    # init the module
-    dependency_checker = DockerDependencyChecker(docker_config)
-    dependency_checker.prepare_environment()
+    from docker_manager.docker_client_session import DockerClientSession
+    from docker_manager.docker_dependency_checker import DockerDependencyChecker
 
-    image_name_tag = None
-    if args.build_image or args.create_container:
-        image_name_tag = build_image(docker_config)
-    if args.create_container:
-        create_container(image_name_tag, docker_config)
+    # one pooled client is shared by every manager for the whole run
+    client_session = DockerClientSession(docker_config)
+    try:
+        # init the module
+        dependency_checker = DockerDependencyChecker(docker_config, client_session)
+        dependency_checker.prepare_environment()
+
+        if args.build_plan:
+            build_plan(docker_config, client_session)
+
+        if args.watch:
+            watch(args, docker_config, client_session)
+            return
+
+        image_name_tag = None
+        if args.build_image or args.create_container:
+            image_name_tag = build_image(docker_config, client_session)
+        if args.create_container:
+            if args.replicas:
+                create_containers(image_name_tag, args.replicas, args.start, docker_config, client_session)
+            else:
+                create_container(image_name_tag, docker_config, client_session, start=args.start)
+        if args.prune:
+            prune(args.dry_run, docker_config, client_session)
+    finally:
+        client_session.close()
+        DockerMetrics.export(docker_config)
 
 
 def main():
@@ -106,7 +269,12 @@ def main():
             run_tests()
         else:
             docker_config = load_configuration_file(args)
-            execute_main_logic(args, docker_config)
+            if args.serve:
+                serve(docker_config)
+            elif args.client:
+                submit_to_server(args, docker_config)
+            else:
+                execute_main_logic(args, docker_config)
 
     except Exception as e:
         print(f'Error during Docker operations: {e}')
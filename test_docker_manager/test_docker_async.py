@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import asyncio
+import io
+import json
+import ssl
+import tarfile
+import tempfile
+import threading
+import sys
+import os
+import logging
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_async import AsyncDockerAPI, AsyncDockerImageBuilder, AsyncDockerContainerManager
+
+
+class FakeDaemon:
+    """Answers just enough of the Engine API for the asyncio client"""
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.requests = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        request_line = (await reader.readline()).decode()
+        method, target, _ = request_line.split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+        self.requests.append((method, target, body))
+
+        path = target.split('?')[0]
+        if path == '/_ping':
+            self.respond(writer, 200, b'OK', 'text/plain')
+        elif path == '/containers/json':
+            self.respond(writer, 200, json.dumps([{'Id': 'abc', 'Names': ['/bot-1']}]).encode())
+        elif path == '/containers/create':
+            if json.loads(body)['Image'] == 'missing:tag':
+                self.respond(writer, 404, json.dumps({'message': 'No such image'}).encode())
+            else:
+                self.respond(writer, 201, json.dumps({'Id': 'new-id', 'Warnings': []}).encode())
+        elif path == '/build':
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n')
+            # split an object across chunks to check reassembly
+            for piece in [b'{"stream": "Step 1/1 : FROM ub', b'untu\\n"}\r\n', b'{"aux": {"ID": "sha256:abc"}}\r\n']:
+                writer.write(f'{len(piece):x}\r\n'.encode() + piece + b'\r\n')
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        elif path == '/hang':
+            await asyncio.sleep(10)
+        await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def respond(writer, status, body, content_type='application/json'):
+        writer.write(f'HTTP/1.1 {status} X\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+
+
+class TestDockerAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.daemon = FakeDaemon(os.path.join(self.temp_dir.name, 'docker.sock'))
+        await self.daemon.start()
+        self.api = AsyncDockerAPI(base_url=f'unix://{self.daemon.socket_path}', timeout=5)
+
+        self.mock_config = MagicMock()
+        self.test_config = {
+            'image_name': 'test_image',
+            'container_name': 'test_container',
+            'tag_format': 'latest',
+            'dockerfile': 'Dockerfile',
+            'config_files_dir': self.temp_dir.name,
+            'context_cache_dir': os.path.join(self.temp_dir.name, 'cache'),
+            'logging_enabled': False,
+            'verbose': False,
+            'log_level': logging.DEBUG,
+            'initializer': 'unit_testing'
+        }
+        self.mock_config.get_custom_config_value.side_effect = lambda key, use_default=False: self.test_config.get(key)
+        with open(os.path.join(self.temp_dir.name, 'Dockerfile'), 'w') as dockerfile:
+            dockerfile.write('FROM ubuntu\n')
+
+    async def asyncTearDown(self):
+        await self.daemon.stop()
+        self.temp_dir.cleanup()
+
+    async def test_ping(self):
+        manager = AsyncDockerContainerManager(self.mock_config, api=self.api)
+        self.assertTrue(await manager.is_docker_running())
+
+    async def test_concurrent_container_operations(self):
+        manager = AsyncDockerContainerManager(self.mock_config, api=self.api)
+
+        results = await asyncio.gather(manager.create_container('image_name:tag'),
+                                       manager.create_container('image_name:tag', name='second'),
+                                       manager.list_containers())
+
+        self.assertEqual(results[0], 'new-id')
+        self.assertEqual(results[1], 'new-id')
+        self.assertEqual(results[2][0]['Id'], 'abc')
+        targets = [target for _, target, _ in self.daemon.requests]
+        self.assertIn('/containers/create?name=test_container-tag', targets)
+        self.assertIn('/containers/create?name=second', targets)
+
+    async def test_create_container_api_error(self):
+        manager = AsyncDockerContainerManager(self.mock_config, api=self.api)
+        self.assertIsNone(await manager.create_container('missing:tag'))
+
+    async def test_stream_build(self):
+        builder = AsyncDockerImageBuilder(self.mock_config, api=self.api)
+
+        chunks = [chunk async for chunk in builder.stream_build(self.temp_dir.name, 'Dockerfile', 'test_image:tag')]
+
+        self.assertEqual(chunks, [{'stream': 'Step 1/1 : FROM ubuntu\n'}, {'aux': {'ID': 'sha256:abc'}}])
+        method, target, body = self.daemon.requests[-1]
+        self.assertEqual(method, 'POST')
+        self.assertTrue(target.startswith('/build?t=test_image%3Atag'))
+        self.assertGreater(len(body), 0)
+        # without cache_build_context the archive is not kept
+        self.assertFalse(os.path.exists(self.test_config['context_cache_dir']))
+
+        self.test_config['cache_build_context'] = True
+        chunks = [chunk async for chunk in builder.stream_build(self.temp_dir.name, 'Dockerfile', 'test_image:tag')]
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(os.listdir(self.test_config['context_cache_dir']))
+        with tarfile.open(fileobj=io.BytesIO(body)) as archive, \
+                tarfile.open(fileobj=io.BytesIO(self.daemon.requests[-1][2])) as cached_archive:
+            self.assertEqual(archive.getnames(), cached_archive.getnames())
+
+    @patch('docker_manager.docker_async.DockerUtility.create_tag')
+    async def test_build_image(self, mock_create_tag):
+        tag_threads = []
+        mock_create_tag.side_effect = lambda *args, **kwargs: tag_threads.append(threading.get_ident()) or 'test_async'
+        builder = AsyncDockerImageBuilder(self.mock_config, api=self.api)
+        self.assertEqual(await builder.build_image(), 'test_image:test_async')
+        # the tag is created off the event loop thread
+        self.assertNotEqual(tag_threads, [threading.get_ident()])
+
+    @patch('docker_manager.docker_async.DockerUtility.create_tag', return_value='test_async')
+    async def test_build_image_unreachable_daemon(self, _):
+        api = AsyncDockerAPI(base_url=f'unix://{self.temp_dir.name}/missing.sock', timeout=5)
+        builder = AsyncDockerImageBuilder(self.mock_config, api=api)
+        self.assertIsNone(await builder.build_image())
+
+    def test_host_schemes(self):
+        tls = ssl.create_default_context()
+
+        self.assertIsNone(AsyncDockerAPI(base_url='tcp://docker:2375').ssl_context)
+        self.assertEqual(AsyncDockerAPI(base_url='tcp://docker').port, 2375)
+        api = AsyncDockerAPI.from_config(self.mock_config, environ={'DOCKER_HOST': 'tcp://docker'})
+        self.assertEqual((api.host, api.port, api.ssl_context), ('docker', 2375, None))
+        api = AsyncDockerAPI(base_url='tcp://docker', tls=tls)
+        self.assertEqual((api.port, api.ssl_context), (2376, tls))
+        self.assertIsNotNone(AsyncDockerAPI(base_url='https://docker').ssl_context)
+        with self.assertRaises(ValueError):
+            AsyncDockerAPI(base_url='ssh://user@docker')
+
+    def test_tls_context_from_environment(self):
+        self.assertIsNone(AsyncDockerAPI.tls_context({}))
+        self.assertIsNone(AsyncDockerAPI.tls_context({'DOCKER_TLS_VERIFY': ''}))
+        # the certificates are required once TLS is asked for
+        with self.assertRaises(OSError):
+            AsyncDockerAPI.tls_context({'DOCKER_TLS_VERIFY': '1', 'DOCKER_CERT_PATH': self.temp_dir.name})
+
+    async def test_timeout_cancels_request(self):
+        api = AsyncDockerAPI(base_url=f'unix://{self.daemon.socket_path}', timeout=0.1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await api.request('GET', '/hang')
+
+
+if __name__ == '__main__':
+    unittest.main()
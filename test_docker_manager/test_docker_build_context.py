@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch
+import tarfile
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_build_context import DockerBuildContext
+
+
+class TestDockerBuildContext(unittest.TestCase):
+
+    def setUp(self):
+        self.build_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.write_file('Dockerfile', 'FROM ubuntu\n')
+        self.write_file('assets/vendor.bin', 'x' * 5000)
+        self.write_file('notes.log', 'ignored')
+        self.write_file('.dockerignore', '# comment\n*.log\n')
+        self.build_context = DockerBuildContext(self.build_dir.name, 'Dockerfile', self.cache_dir.name)
+
+    def tearDown(self):
+        self.build_dir.cleanup()
+        self.cache_dir.cleanup()
+
+    def write_file(self, relative_path, content):
+        full_path = os.path.join(self.build_dir.name, relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as file:
+            file.write(content)
+
+    def read_archive(self, archive_path):
+        with tarfile.open(archive_path) as archive:
+            return {member.name: archive.extractfile(member).read().decode()
+                    for member in archive.getmembers() if member.isfile()}
+
+    def test_read_dockerignore(self):
+        self.assertEqual(DockerBuildContext.read_dockerignore(self.build_dir.name), ['*.log'])
+
+    def test_archive_honors_dockerignore(self):
+        contents = self.read_archive(self.build_context.archive())
+
+        self.assertEqual(contents['Dockerfile'], 'FROM ubuntu\n')
+        self.assertEqual(contents['assets/vendor.bin'], 'x' * 5000)
+        self.assertNotIn('notes.log', contents)
+        self.assertEqual(self.build_context.size, os.path.getsize(self.build_context.archive()))
+
+    def test_archive_reuses_unchanged_entries(self):
+        self.build_context.archive()
+        self.write_file('Dockerfile', 'FROM debian\n')
+
+        archive_path = self.build_context.archive()
+        contents = self.read_archive(archive_path)
+
+        self.assertEqual(contents['Dockerfile'], 'FROM debian\n')
+        self.assertEqual(contents['assets/vendor.bin'], 'x' * 5000)
+        self.assertEqual(self.build_context.added_entries, 1)
+        self.assertGreater(self.build_context.reused_entries, 0)
+
+    def test_file_changing_while_archived_is_read_again(self):
+        copy = tarfile.copyfileobj
+        writes = []
+
+        def copy_then_grow(source, destination, length=None, **kwargs):
+            copy(source, destination, length, **kwargs)
+            if source.name.endswith('vendor.bin') and not writes:
+                writes.append(length)
+                self.write_file('assets/vendor.bin', 'y' * 6000)
+
+        with patch('docker_manager.docker_build_context.tarfile.copyfileobj', side_effect=copy_then_grow):
+            contents = self.read_archive(self.build_context.archive())
+
+        # the entry matches its header, so the archive can be read to the end
+        self.assertEqual(contents['assets/vendor.bin'], 'y' * 6000)
+        self.assertEqual(contents['Dockerfile'], 'FROM ubuntu\n')
+
+    def test_file_that_keeps_changing_fails(self):
+        copy = tarfile.copyfileobj
+
+        def copy_then_grow(source, destination, length=None, **kwargs):
+            copy(source, destination, length, **kwargs)
+            with open(source.name, 'a') as file:
+                file.write('z')
+
+        with patch('docker_manager.docker_build_context.tarfile.copyfileobj', side_effect=copy_then_grow):
+            with self.assertRaises(OSError):
+                self.build_context.archive()
+
+    def test_cache_inside_context_is_excluded(self):
+        build_context = DockerBuildContext(self.build_dir.name, 'Dockerfile',
+                                           os.path.join(self.build_dir.name, '.cache'))
+        build_context.archive()
+        self.assertFalse(any(path.startswith('.cache') for path in build_context.list_files()))
+
+    def test_old_archives_are_removed(self):
+        self.build_context.archive()
+        archive_path = self.build_context.archive()
+
+        archives = [name for name in os.listdir(self.cache_dir.name) if name.endswith('.tar')]
+        self.assertEqual(archives, [os.path.basename(archive_path)])
+
+
+if __name__ == '__main__':
+    unittest.main()
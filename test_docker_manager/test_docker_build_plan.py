@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_build_plan import DockerBuildPlan
+from docker_manager.docker_config import DockerConfig
+
+
+class TestDockerBuildPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dockerfiles = {
+            'Dockerfile.base': 'FROM ubuntu:22.04\n',
+            'Dockerfile.app': 'ARG base_image=unused\nFROM ${base_image}:latest as app\nFROM app\n',
+            'Dockerfile.tool': 'FROM base-image AS tool\n',
+            'Dockerfile.other': 'FROM scratch\n',
+        }
+        for name, content in self.dockerfiles.items():
+            with open(os.path.join(self.temp_dir.name, name), 'w') as dockerfile:
+                dockerfile.write(content)
+
+        self.config = DockerConfig(config_dict={
+            "custom_fields": {
+                "config_files_dir": self.temp_dir.name,
+                "max_parallel_builds": 2,
+                "build_plan": [
+                    {"image_name": "base-image", "dockerfile": "Dockerfile.base"},
+                    {"image_name": "app-image", "dockerfile": "Dockerfile.app",
+                     "buildargs": {"base_image": "base-image"}},
+                    {"image_name": "tool-image", "dockerfile": "Dockerfile.tool"},
+                    {"image_name": "other-image", "dockerfile": "Dockerfile.other"}
+                ]
+            },
+            "default_fields": {}
+        })
+        self.plan = DockerBuildPlan(self.config, client_session=MagicMock())
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parse_base_images(self):
+        dockerfile_path = os.path.join(self.temp_dir.name, 'Dockerfile.app')
+        self.assertEqual(DockerBuildPlan.parse_base_images(dockerfile_path), {'unused'})
+        self.assertEqual(DockerBuildPlan.parse_base_images(dockerfile_path, {'base_image': 'registry:5000/base'}),
+                         {'registry:5000/base'})
+
+    def test_resolve_dependencies(self):
+        dependencies = self.plan.resolve_dependencies()
+        self.assertEqual(dependencies, {
+            'base-image': set(),
+            'app-image': {'base-image'},
+            'tool-image': {'base-image'},
+            'other-image': set()
+        })
+
+    def test_duplicate_image_name(self):
+        self.config.config['custom_fields']['build_plan'].append({"image_name": "base-image"})
+        with self.assertRaises(ValueError):
+            DockerBuildPlan(self.config, client_session=MagicMock())
+
+    def test_execute_builds_parents_first(self):
+        order = []
+
+        def fake_build(image_name, has_dependents):
+            order.append(image_name)
+            return f'{image_name}:tag'
+
+        with patch.object(self.plan, '_build', side_effect=fake_build):
+            results = self.plan.execute()
+
+        self.assertEqual(results['app-image'], 'app-image:tag')
+        self.assertLess(order.index('base-image'), order.index('app-image'))
+        self.assertLess(order.index('base-image'), order.index('tool-image'))
+        self.assertTrue(all(status == DockerBuildPlan.BUILT for status in self.plan.status.values()))
+
+    def test_failure_cancels_only_downstream(self):
+        def fake_build(image_name, has_dependents):
+            if image_name == 'base-image':
+                raise RuntimeError('build failed')
+            return f'{image_name}:tag'
+
+        with patch.object(self.plan, '_build', side_effect=fake_build):
+            results = self.plan.execute()
+
+        self.assertEqual(self.plan.status['base-image'], DockerBuildPlan.FAILED)
+        self.assertEqual(self.plan.status['app-image'], DockerBuildPlan.CANCELLED)
+        self.assertEqual(self.plan.status['tool-image'], DockerBuildPlan.CANCELLED)
+        self.assertEqual(self.plan.status['other-image'], DockerBuildPlan.BUILT)
+        self.assertIsNone(results['app-image'])
+        self.assertEqual(results['other-image'], 'other-image:tag')
+
+    def test_circular_dependencies(self):
+        with open(os.path.join(self.temp_dir.name, 'Dockerfile.base'), 'w') as dockerfile:
+            dockerfile.write('FROM tool-image\n')
+        with self.assertRaises(ValueError):
+            self.plan.resolve_dependencies()
+
+
+if __name__ == '__main__':
+    unittest.main()
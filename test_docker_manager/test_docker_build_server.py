@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_build_client import DockerBuildClient
+from docker_manager.docker_build_server import DockerBuildServer
+from docker_manager.docker_config import DockerConfig
+
+
+class TestDockerBuildServer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, 'build.sock')
+        self.config = DockerConfig(config_dict={
+            "custom_fields": {
+                "image_name": "test_image",
+                "build_server_max_parallel": 2,
+                "logging_enabled": False
+            },
+            "default_fields": {}
+        }, environ={})
+        client_session = MagicMock()
+        client_session.client.ping.return_value = True
+        self.server = DockerBuildServer(self.config, self.socket_path, client_session=client_session)
+        self.client = DockerBuildClient(self.socket_path, timeout=10)
+        self.release_build = threading.Event()
+        self.builds = []
+
+    def tearDown(self):
+        self.release_build.set()
+        self.server.stop()
+        self.temp_dir.cleanup()
+
+    def fake_build(self, config):
+        self.builds.append(config.get_custom_config_value('image_name'))
+        self.release_build.wait(5)
+        if config.get_custom_config_value('image_name') == 'broken':
+            raise Exception('Build failed, see the build server log')
+        return f"{config.get_custom_config_value('image_name')}:tag{len(self.builds)}"
+
+    def test_ping_and_status(self):
+        with self.server:
+            self.assertTrue(self.client.ping())
+            self.assertEqual(self.client.status()['max_parallel'], 2)
+            # the health monitor pings through the server's client session
+            self.assertTrue(self.server.health_monitor._thread.is_alive())
+            self.server.health_monitor.check()
+            self.assertTrue(self.client.status()['daemon_healthy'])
+        self.assertIsNone(self.server.health_monitor._thread)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_identical_builds_are_coalesced(self):
+        with patch.object(DockerBuildServer, '_build', side_effect=self.fake_build), self.server:
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [executor.submit(self.client.build) for _ in range(3)]
+                # wait until the first build runs and the others joined it
+                while self.server.status()['coalesced'] < 2:
+                    threading.Event().wait(0.01)
+                self.release_build.set()
+                results = [future.result() for future in futures]
+
+        self.assertEqual(results, ['test_image:tag1'] * 3)
+        self.assertEqual(self.builds, ['test_image'])
+
+    def test_different_builds_run_separately(self):
+        self.release_build.set()
+        with patch.object(DockerBuildServer, '_build', side_effect=self.fake_build), self.server:
+            first = self.client.build(overrides={'image_name': 'first'})
+            second = self.client.build(overrides={'image_name': 'second'})
+
+        self.assertEqual([first, second], ['first:tag1', 'second:tag2'])
+
+    def test_build_error_reaches_client(self):
+        self.release_build.set()
+        with patch.object(DockerBuildServer, '_build', side_effect=self.fake_build), self.server:
+            with self.assertRaises(Exception) as context:
+                self.client.build(overrides={'image_name': 'broken'})
+
+        self.assertIn('Build failed', str(context.exception))
+        self.assertEqual(self.server.status()['in_flight'], 0)
+
+    @patch('docker_manager.docker_container_manager.DockerContainerManager')
+    def test_create_reports_the_container(self, mock_manager_class):
+        container_manager = mock_manager_class.return_value
+        container_manager._container_name_tag.return_value = 'app-tag1'
+        container_manager.create_container.return_value.name = 'app-tag1'
+
+        self.assertEqual(self.server._create(self.config, 'test_image:tag1', None, False),
+                         [{'name': 'app-tag1', 'ok': True, 'error': None}])
+        container_manager.create_container.return_value = None
+        result, = self.server._create(self.config, 'test_image:tag1', None, False)
+        self.assertEqual((result['name'], result['ok']), ('app-tag1', False))
+        self.assertIn('creation failed', result['error'])
+
+    def test_stale_socket_is_replaced(self):
+        open(self.socket_path, 'w').close()
+        with self.server:
+            self.assertTrue(self.client.ping())
+
+    def test_no_server(self):
+        self.assertFalse(self.client.ping())
+        with self.assertRaises(Exception):
+            self.client.build()
+
+
+if __name__ == '__main__':
+    unittest.main()
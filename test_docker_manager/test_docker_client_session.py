@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import gc
+import sys
+import weakref
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_client_session import DockerClientSession
+from docker_manager.docker_config import DockerConfig
+
+
+class TestDockerClientSession(unittest.TestCase):
+
+    def setUp(self):
+        self.config = DockerConfig(config_dict={
+            "custom_fields": {
+                "client_pool_size": 4,
+                "client_keep_alive": False
+            },
+            "default_fields": {
+                "client_timeout": {
+                    "field_name": "client_timeout",
+                    "default_value": 30
+                }
+            }
+        })
+
+    @patch('docker.from_env')
+    def test_client_is_created_once(self, mock_from_env):
+        mock_from_env.return_value = MagicMock(api=MagicMock(headers={}))
+        session = DockerClientSession(self.config)
+
+        first = session.client
+        second = session.client
+
+        self.assertIs(first, second)
+        mock_from_env.assert_called_once_with(timeout=30, max_pool_size=4)
+
+    @patch('docker.from_env')
+    def test_keep_alive_disabled(self, mock_from_env):
+        mock_from_env.return_value = MagicMock(api=MagicMock(headers={}))
+        session = DockerClientSession(self.config)
+
+        self.assertEqual(session.api.headers['Connection'], 'close')
+
+    @patch('docker.from_env')
+    def test_defaults_without_config(self, mock_from_env):
+        session = DockerClientSession()
+
+        self.assertEqual(session.pool_size, 10)
+        self.assertEqual(session.timeout, 60)
+        self.assertEqual(session.build_timeout, 60)
+        mock_from_env.assert_not_called()
+
+    @patch('docker.from_env')
+    def test_close_is_idempotent(self, mock_from_env):
+        mock_client = MagicMock(api=MagicMock(headers={}))
+        mock_from_env.return_value = mock_client
+        session = DockerClientSession(self.config)
+        session.client
+
+        session.close()
+        session.close()
+
+        mock_client.close.assert_called_once()
+
+    @patch('docker.from_env')
+    def test_reconnect(self, mock_from_env):
+        first_client = MagicMock(api=MagicMock(headers={}))
+        second_client = MagicMock(api=MagicMock(headers={}))
+        mock_from_env.side_effect = [first_client, second_client]
+        session = DockerClientSession(self.config)
+        session.client
+
+        session.reconnect()
+
+        first_client.close.assert_called_once()
+        self.assertIs(session.client, second_client)
+
+    @patch('atexit.register')
+    @patch('docker.from_env')
+    def test_close_all_at_exit(self, mock_from_env, mock_register):
+        mock_client = MagicMock(api=MagicMock(headers={}))
+        mock_from_env.return_value = mock_client
+        sessions = [DockerClientSession(self.config) for _ in range(3)]
+        sessions[0].client
+        discarded = DockerClientSession(self.config)
+        discarded.client
+        discarded_ref = weakref.ref(discarded)
+        del discarded
+        gc.collect()
+
+        # the exit hook does not keep sessions alive
+        self.assertIsNone(discarded_ref())
+        self.assertIn(sessions[0], DockerClientSession._connected)
+        self.assertNotIn(sessions[1], DockerClientSession._connected)
+        DockerClientSession.close_all()
+
+        # one exit hook for the module, none per session
+        mock_register.assert_not_called()
+        self.assertNotIn(sessions[0], DockerClientSession._connected)
+        self.assertIsNone(sessions[0]._client)
+
+    def test_close_without_connecting(self):
+        session = DockerClientSession(self.config)
+        session.close()  # Should not raise an exception
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
 import unittest
+from unittest.mock import patch
+import importlib.util
 import json
 import sys
 import os
+import tempfile
 
 sys.path.append(os.path.abspath('../'))
 from docker_manager.docker_config import DockerConfig
@@ -38,9 +41,21 @@ class TestDockerConfig(unittest.TestCase):
         with open(self.mock_config_path, 'w') as mock_config_file:
             json.dump(self.mock_config, mock_config_file)
 
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir_patch = patch.object(DockerConfig, 'CACHE_DIR', os.path.join(self.temp_dir.name, 'cache'))
+        self.cache_dir_patch.start()
+
     def tearDown(self):
         # Clean up the mock configuration file
         os.remove(self.mock_config_path)
+        self.cache_dir_patch.stop()
+        self.temp_dir.cleanup()
+
+    def write_config(self, name, config):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w') as config_file:
+            json.dump(config, config_file)
+        return path
 
     def test_instantiation_methods(self):
         # Instantiate with file path
@@ -140,6 +155,121 @@ class TestDockerConfig(unittest.TestCase):
         docker_config.add_custom_value('new_list_key', ['item1', 'item2'])
         self.assertEqual(docker_config.get_custom_config_value('new_list_key'), ['item1', 'item2'])
 
+    def test_add_list_value_deduplicates(self):
+        docker_config = DockerConfig(config_dict=self.mock_config)
+        original = docker_config.get_custom_config_value('os_dependencies')
+
+        docker_config.add_custom_value('os_dependencies', ['git', 'curl', 'curl'])
+        self.assertEqual(docker_config.get_custom_config_value('os_dependencies'),
+                         ['docker', 'service', 'date', 'git', 'curl'])
+        # the list seen before the write is left untouched
+        self.assertEqual(original, ['docker', 'service', 'date', 'git'])
+
+        docker_config.add_custom_value('build_plan', [{'image_name': 'a'}])
+        docker_config.add_custom_value('build_plan', [{'image_name': 'a'}, {'image_name': 'b'}])
+        self.assertEqual(docker_config.get_custom_config_value('build_plan'),
+                         [{'image_name': 'a'}, {'image_name': 'b'}])
+
+    def test_layer_precedence(self):
+        environ = {'DOCKER_MANAGER_IMAGE_NAME': 'env-image', 'DOCKER_MANAGER_VERBOSE': 'true',
+                   'DOCKER_MANAGER_CONTAINER_NAME': 'env-bot', 'OTHER_VARIABLE': '1'}
+        docker_config = DockerConfig(config_dict=self.mock_config, environ=environ)
+
+        self.assertEqual(docker_config.get_custom_config_value('image_name'), 'env-image')
+        self.assertIs(docker_config.get_custom_config_value('verbose', use_default=True), True)
+        self.assertEqual(docker_config.get_custom_config_value('log_file', use_default=True), 'docker_manager.log')
+        self.assertIsNone(docker_config.get_custom_config_value('other_variable'))
+
+        docker_config.add_custom_value('container_name', 'cli-bot')
+        self.assertEqual(docker_config.get_custom_config_value('container_name'), 'cli-bot')
+
+    def test_cli_keeps_environment_values(self):
+        # flags that are not passed must not override DOCKER_MANAGER_* values
+        cli_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image-builder.py')
+        spec = importlib.util.spec_from_file_location('image_builder', cli_path)
+        image_builder = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(image_builder)
+
+        with patch.dict(os.environ, {'DOCKER_MANAGER_VERBOSE': 'true'}):
+            args = image_builder.BuilderArgumentParser().parse_args(['-c', self.mock_config_path])
+            self.assertTrue(image_builder.load_configuration_file(args).get_custom_config_value('verbose', True))
+            args = image_builder.BuilderArgumentParser().parse_args(['-c', self.mock_config_path, '-v'])
+            self.assertTrue(image_builder.load_configuration_file(args).get_custom_config_value('verbose', True))
+
+    def test_snapshot_is_read_only(self):
+        docker_config = DockerConfig(config_dict=self.mock_config, environ={})
+        snapshot = docker_config.snapshot()
+
+        self.assertEqual(snapshot['log_file'], 'docker_manager.log')
+        with self.assertRaises(TypeError):
+            snapshot['image_name'] = 'changed'
+
+        docker_config.add_custom_value('image_name', 'changed')
+        self.assertEqual(snapshot['image_name'], 'arbitrage-bot')
+        self.assertEqual(docker_config.snapshot()['image_name'], 'changed')
+
+    def test_derive_is_copy_on_write(self):
+        docker_config = DockerConfig(config_dict=self.mock_config, environ={})
+        derived = docker_config.derive(image_name='derived-image')
+
+        derived.add_custom_value('container_name', 'derived-bot')
+        docker_config.add_custom_value('verbose', True)
+
+        self.assertEqual(derived.get_custom_config_value('image_name'), 'derived-image')
+        self.assertEqual(derived.get_custom_config_value('container_name'), 'derived-bot')
+        self.assertEqual(derived.get_custom_config_value('log_file', use_default=True), 'docker_manager.log')
+        self.assertIsNone(derived.get_custom_config_value('verbose'))
+        self.assertEqual(docker_config.get_custom_config_value('image_name'), 'arbitrage-bot')
+        self.assertEqual(docker_config.get_custom_config_value('container_name'), 'bot')
+
+    def test_extends_deep_merges_bases(self):
+        self.write_config('base.json', self.mock_config)
+        self.write_config('tags.json', {"custom_fields": {"tag_format": "%Y", "image_name": "tagged"}})
+        child_path = self.write_config('child.json', {
+            "extends": ["base.json", "tags.json"],
+            "custom_fields": {"container_name": "child"},
+            "default_fields": {"verbose": {"default_value": True}}
+        })
+
+        docker_config = DockerConfig(child_path, environ={})
+
+        self.assertEqual(docker_config.get_custom_config_value('image_name'), 'tagged')
+        self.assertEqual(docker_config.get_custom_config_value('container_name'), 'child')
+        self.assertEqual(docker_config.get_custom_config_value('config_files_dir'), 'config_files')
+        self.assertIs(docker_config.get_default_config_value('verbose'), True)
+        self.assertEqual(docker_config.get_default_config_name('verbose'), 'verbose')
+        self.assertNotIn('extends', docker_config.config)
+
+    def test_extends_cycle(self):
+        self.write_config('a.json', {"extends": "b.json"})
+        a_path = self.write_config('b.json', {"extends": "a.json"})
+
+        with self.assertRaises(ValueError):
+            DockerConfig(a_path)
+
+    def test_invalid_default_field(self):
+        path = self.write_config('invalid.json', {"default_fields": {"verbose": False}})
+
+        with self.assertRaises(ValueError):
+            DockerConfig(path)
+
+    def test_parsed_config_cache(self):
+        base_path = self.write_config('base.json', self.mock_config)
+        child_path = self.write_config('child.json', {"extends": "base.json"})
+        DockerConfig(child_path)
+
+        with patch.object(DockerConfig, '_load_merged_config') as mock_load:
+            docker_config = DockerConfig(child_path, environ={})
+            mock_load.assert_not_called()
+        self.assertEqual(docker_config.get_custom_config_value('image_name'), 'arbitrage-bot')
+
+        # changing a base invalidates the cached merge
+        self.mock_config['custom_fields']['image_name'] = 'changed-bot'
+        self.write_config('base.json', self.mock_config)
+        os.utime(base_path, ns=(0, 0))
+        docker_config = DockerConfig(child_path, environ={})
+        self.assertEqual(docker_config.get_custom_config_value('image_name'), 'changed-bot')
+
 
 if __name__ == '__main__':
     unittest.main()
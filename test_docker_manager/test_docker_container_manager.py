@@ -3,6 +3,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
 from docker.models.containers import Container
+from docker.errors import APIError
 import sys
 import os
 import logging
@@ -57,6 +58,122 @@ class TestDockerContainerManager(unittest.TestCase):
         self.assertIsInstance(container, Container)
         mock_containers.create.assert_called_with('image_name:tag', name='test_container-tag', detach=True, tty=True)
 
+    def test_replica_names(self):
+        names = self.docker_container_manager.replica_names('image_name:tag', 3)
+        self.assertEqual(names, ['test_container-tag-1', 'test_container-tag-2', 'test_container-tag-3'])
+
+    def test_create_containers_reports_partial_failures(self):
+        # Every replica is attempted, failures are reported per container
+        mock_session = MagicMock()
+        manager = DockerContainerManager(self.mock_config, client_session=mock_session)
+
+        def fake_create(image_name_tag, name, detach, tty):
+            if name.endswith('-2'):
+                raise APIError('name in use')
+            return MagicMock(spec=Container)
+        mock_session.client.containers.create.side_effect = fake_create
+
+        results = manager.create_containers('image_name:tag', 3, start=True)
+
+        self.assertEqual([result.name for result in results],
+                         ['test_container-tag-1', 'test_container-tag-2', 'test_container-tag-3'])
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertEqual([result.started for result in results], [True, False, True])
+        self.assertIsInstance(results[1].error, APIError)
+        self.assertEqual(mock_session.client.containers.create.call_count, 3)
+
+    def test_lifecycle_operations(self):
+        # Single operations go straight to the low-level API by name
+        mock_session = MagicMock()
+        manager = DockerContainerManager(self.mock_config, client_session=mock_session)
+        container = MagicMock(spec=Container)
+        container.name = 'test_container-tag'
+
+        self.assertTrue(manager.start_container(container).started)
+        self.assertTrue(manager.stop_container('test_container-tag', timeout=3).ok)
+        self.assertTrue(manager.restart_container('test_container-tag').started)
+        self.assertTrue(manager.remove_container('test_container-tag', force=True).ok)
+
+        mock_session.api.start.assert_called_once_with('test_container-tag')
+        mock_session.api.stop.assert_called_once_with('test_container-tag', timeout=3)
+        mock_session.api.restart.assert_called_once_with('test_container-tag')
+        mock_session.api.remove_container.assert_called_once_with('test_container-tag', force=True, v=False)
+        mock_session.client.containers.get.assert_not_called()
+
+    def test_bulk_operations_report_partial_failures(self):
+        mock_session = MagicMock()
+        manager = DockerContainerManager(self.mock_config, client_session=mock_session)
+
+        def fake_stop(name):
+            if name == 'b':
+                raise APIError('no such container')
+        mock_session.api.stop.side_effect = fake_stop
+
+        results = manager.stop_containers(['a', 'b', 'c'])
+
+        self.assertEqual([result.name for result in results], ['a', 'b', 'c'])
+        self.assertEqual([result.ok for result in results], [True, False, True])
+
+    def wait_session(self, states, events):
+        """A session whose containers are in states and whose event stream yields events."""
+        mock_session = MagicMock()
+        mock_session.api.inspect_container.side_effect = lambda name: dict(states[name], Name=f'/{name}',
+                                                                            Id=f'id-{name}')
+        stream = MagicMock()
+        stream.__iter__.return_value = iter(events)
+        mock_session.api.events.return_value = stream
+        return mock_session, stream
+
+    @staticmethod
+    def event(name, action, **attributes):
+        return {'Type': 'container', 'Action': action, 'Actor': {'ID': f'id-{name}',
+                                                                 'Attributes': dict(attributes, name=name)}}
+
+    def test_wait_until_running_from_events(self):
+        states = {'a': {'State': {'Running': True}}, 'b': {'State': {'Running': False}},
+                  'c': {'State': {'Running': False}}}
+        mock_session, stream = self.wait_session(states, [
+            self.event('other', 'start'),
+            self.event('b', 'start'),
+            self.event('c', 'die', exitCode='1'),
+        ])
+        manager = DockerContainerManager(self.mock_config, client_session=mock_session)
+
+        results = manager.wait_until_ready(['a', 'b', 'c'], timeout=5)
+
+        self.assertEqual([result.ok for result in results], [True, True, False])
+        self.assertIn('code 1', str(results[2].error))
+        filters = mock_session.api.events.call_args.kwargs['filters']
+        self.assertEqual(filters['container'], ['a', 'b', 'c'])
+        stream.close.assert_called_once()
+
+    def test_wait_until_healthy(self):
+        healthcheck = {'Healthcheck': {'Test': ['CMD', 'true']}}
+        states = {'a': {'State': {'Running': True, 'Health': {'Status': 'starting'}}, 'Config': healthcheck},
+                  'b': {'State': {'Running': False}, 'Config': {}}}
+        mock_session, stream = self.wait_session(states, [
+            self.event('a', 'start'),
+            self.event('b', 'start'),
+            self.event('a', 'health_status: healthy'),
+        ])
+        manager = DockerContainerManager(self.mock_config, client_session=mock_session)
+
+        results = manager.wait_until_ready(['a', 'b'], healthy=True, timeout=5)
+
+        # b has no healthcheck, running is enough
+        self.assertEqual([result.ok for result in results], [True, True])
+
+    def test_wait_times_out_when_the_stream_ends(self):
+        mock_session, stream = self.wait_session({'a': {'State': {'Running': False}}}, [])
+        manager = DockerContainerManager(self.mock_config, client_session=mock_session)
+
+        result = manager.wait_until_running('a', timeout=5)
+
+        self.assertFalse(result.ok)
+        self.assertIn('after 5 seconds', str(result.error))
+        until = mock_session.api.events.call_args.kwargs['until']
+        self.assertAlmostEqual(until - mock_session.api.events.call_args.kwargs['since'], 5)
+
     # Additional tests can be added for failure scenarios and edge cases
 
 
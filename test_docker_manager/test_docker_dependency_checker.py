@@ -5,6 +5,7 @@ from unittest.mock import patch, MagicMock
 import json
 import sys
 import os
+import tempfile
 
 sys.path.append(os.path.abspath('../'))
 from docker_manager.docker_dependency_checker import DockerDependencyChecker
@@ -22,6 +23,16 @@ class TestDockerDependencyChecker(unittest.TestCase):
                     "config_files_dir": "config_files"
                 },
                 "default_fields": {
+                    "os_dependencies": {
+                        "field_name": "os_dependencies",
+                        "default_value": [],
+                        "required": false
+                    },
+                    "config_files_dir": {
+                        "field_name": "config_files_dir",
+                        "default_value": "config_files",
+                        "required": false
+                    },
                     "logging_enabled": {
                         "field_name": "logging_enabled",
                         "default_value": false,
@@ -43,9 +54,15 @@ class TestDockerDependencyChecker(unittest.TestCase):
 
         # Create an instance of DockerConfig to use with DockerDependencyChecker
         docker_config = DockerConfig(config_json=json_config)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        docker_config.add_custom_value('context_cache_dir', self.temp_dir.name)
+        docker_config.add_custom_value('dependency_cache_ttl', 60)
         # Create an instance of DockerDependencyChecker with the mocked config
         self.dependency_checker = DockerDependencyChecker(docker_config)
 
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
     @patch('shutil.which')
     def test_check_dependencies_all_present(self, mock_which):
         # Test all dependencies are present
@@ -74,6 +91,47 @@ class TestDockerDependencyChecker(unittest.TestCase):
             self.dependency_checker._check_required_files()
             self.assertIn("Missing required files", str(context.exception))
 
+    @patch('shutil.which')
+    def test_check_environment_is_cached(self, mock_which):
+        mock_which.side_effect = lambda x: sys.executable
+        self.dependency_checker.check_environment()
+        self.assertEqual(mock_which.call_count, 4)
+
+        self.dependency_checker.check_environment()
+        self.assertEqual(mock_which.call_count, 4)
+
+    @patch('shutil.which')
+    def test_check_environment_cache_invalidated(self, mock_which):
+        binary_path = os.path.join(self.temp_dir.name, 'git')
+        with open(binary_path, 'w') as binary_file:
+            binary_file.write('#!/bin/sh\n')
+        mock_which.side_effect = lambda x: binary_path
+        self.dependency_checker.check_environment()
+
+        # a reinstalled binary gets a new mtime
+        os.utime(binary_path, ns=(0, 0))
+        self.dependency_checker.check_environment()
+        self.assertEqual(mock_which.call_count, 8)
+
+    @patch('shutil.which')
+    def test_check_environment_failures_not_cached(self, mock_which):
+        mock_which.return_value = None
+        with self.assertRaises(Exception):
+            self.dependency_checker.check_environment()
+
+        mock_which.side_effect = lambda x: sys.executable
+        self.dependency_checker.check_environment()  # This should not raise an exception
+
+    @patch('shutil.which')
+    def test_check_environment_cache_disabled(self, mock_which):
+        mock_which.side_effect = lambda x: sys.executable
+        self.dependency_checker.cache_ttl = 0
+        self.dependency_checker.check_environment()
+        self.dependency_checker.check_environment()
+
+        self.assertEqual(mock_which.call_count, 8)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir.name, DockerDependencyChecker.CACHE_FILE)))
+
 
 if __name__ == '__main__':
     unittest.main()
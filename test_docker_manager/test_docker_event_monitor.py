@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import MagicMock
+from docker.errors import NotFound
+import asyncio
+import threading
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_event_monitor import DockerEventMonitor
+
+
+class TestDockerEventMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.test_config = {'logging_enabled': False, 'verbose': False}
+        self.mock_config = MagicMock()
+        self.mock_config.get_custom_config_value.side_effect = \
+            lambda key, use_default=False: self.test_config.get(key)
+        self.client_session = MagicMock()
+        self.api = self.client_session.api
+        self.api.containers.return_value = [
+            {'Id': 'c1', 'Names': ['/web'], 'ImageID': 'sha256:i1', 'State': 'running', 'Labels': {'team': 'web'}},
+            {'Id': 'c2', 'Names': ['/worker'], 'ImageID': 'sha256:i1', 'State': 'exited', 'Labels': {}},
+        ]
+        self.api.images.return_value = [{'Id': 'sha256:i1', 'RepoTags': ['app:1'], 'Labels': {'ci': 'yes'}}]
+        self.monitor = DockerEventMonitor(self.mock_config, self.client_session)
+        self.monitor._seed()
+
+    @staticmethod
+    def event(event_type, action, object_id, **attributes):
+        return {'Type': event_type, 'Action': action, 'Actor': {'ID': object_id, 'Attributes': attributes}}
+
+    def test_view_queries(self):
+        self.assertEqual([container['Id'] for container in self.monitor.containers(state='running')], ['c1'])
+        self.assertEqual([container['Id'] for container in self.monitor.containers(labels='team=web')], ['c1'])
+        self.assertEqual(self.monitor.container('worker')['Id'], 'c2')
+        self.assertEqual([image.id for image in self.monitor.images(repository='app', labels=['ci'])],
+                         ['sha256:i1'])
+        # queries return copies, the view cannot be changed from outside
+        self.monitor.container('web')['State'] = 'paused'
+        self.assertEqual(self.monitor.container('web')['State'], 'running')
+
+    def test_container_events_update_the_view(self):
+        self.api.inspect_container.return_value = {
+            'Id': 'c3', 'Name': '/new', 'Image': 'sha256:i1', 'State': {'Status': 'created'},
+            'Config': {'Image': 'app:1', 'Labels': {'team': 'web'}}}
+
+        self.monitor.handle_event(self.event('container', 'stop', 'c1', name='web'))
+        self.monitor.handle_event(self.event('container', 'create', 'c3', name='new'))
+        self.monitor.handle_event(self.event('container', 'start', 'c3', name='new'))
+        self.monitor.handle_event(self.event('container', 'health_status: healthy', 'c3', name='new'))
+        self.monitor.handle_event(self.event('container', 'destroy', 'c2', name='worker'))
+
+        self.assertEqual(self.monitor.container('web')['State'], 'exited')
+        self.assertEqual(self.monitor.container('new')['State'], 'running')
+        # a signal is not a state change, only the die that may follow it is
+        self.monitor.handle_event(self.event('container', 'kill', 'c3', name='new', signal='1'))
+        self.monitor.handle_event(self.event('container', 'oom', 'c3', name='new'))
+        self.assertEqual(self.monitor.container('new')['State'], 'running')
+        self.assertEqual(self.monitor.container('new')['Health'], 'healthy')
+        self.assertIsNone(self.monitor.container('worker'))
+        # only the new container needed an API call
+        self.api.inspect_container.assert_called_once_with('c3')
+
+    def test_image_events_update_the_view(self):
+        self.api.inspect_image.side_effect = NotFound('gone')
+
+        self.monitor.handle_event(self.event('image', 'delete', 'sha256:i1'))
+
+        self.assertEqual(self.monitor.images(), [])
+
+    def test_subscriptions_filter_events(self):
+        web_events = []
+        starts = []
+        self.monitor.subscribe(web_events.append, labels={'team': 'web'})
+        subscription = self.monitor.subscribe(starts.append, event_type='container', actions=['start'], name='web')
+
+        self.monitor.handle_event(self.event('container', 'start', 'c1', name='web', team='web'))
+        self.monitor.handle_event(self.event('container', 'start', 'c2', name='worker'))
+        self.monitor.unsubscribe(subscription)
+        self.monitor.handle_event(self.event('container', 'start', 'c1', name='web', team='web'))
+
+        self.assertEqual(len(web_events), 2)
+        self.assertEqual(len(starts), 1)
+
+    def test_failing_callback_does_not_stop_others(self):
+        received = []
+        self.monitor.subscribe(lambda event: 1 / 0)
+        self.monitor.subscribe(received.append)
+
+        self.monitor.handle_event(self.event('builder', 'prune', 'b1'))
+
+        self.assertEqual(len(received), 1)
+
+    def test_async_stream(self):
+        async def consume():
+            events = self.monitor.stream(event_type='container', name='web')
+            first = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0.05)
+            feeder = threading.Thread(target=lambda: [
+                self.monitor.handle_event(self.event('container', 'start', 'c2', name='worker')),
+                self.monitor.handle_event(self.event('container', 'stop', 'c1', name='web'))])
+            feeder.start()
+            event = await asyncio.wait_for(first, 2)
+            feeder.join()
+            await events.aclose()
+            return event
+
+        event = asyncio.run(consume())
+
+        self.assertEqual(event['Action'], 'stop')
+        self.assertEqual(self.monitor._subscriptions, [])
+
+    def test_background_connection(self):
+        finished = threading.Event()
+
+        def events():
+            yield self.event('container', 'die', 'c1', name='web')
+            finished.set()
+            # the daemon keeps the stream open until the monitor closes it
+            threading.Event().wait(0.2)
+        stream = MagicMock()
+        stream.__iter__.side_effect = events
+        self.api.events.return_value = stream
+        monitor = DockerEventMonitor(self.mock_config, self.client_session)
+
+        with monitor:
+            self.assertTrue(monitor.wait_ready(2))
+            self.assertTrue(finished.wait(2))
+            self.assertEqual(monitor.container('web')['State'], 'exited')
+            self.assertEqual(self.api.events.call_args.kwargs['filters'], {'type': ['container', 'image', 'builder']})
+        stream.close.assert_called()
+        self.assertFalse(monitor.ready.is_set())
+
+    def test_running_for(self):
+        self.assertIsNone(DockerEventMonitor.running_for(self.client_session))
+
+
+if __name__ == '__main__':
+    unittest.main()
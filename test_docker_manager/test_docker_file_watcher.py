@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import unittest
+import tempfile
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_file_watcher import DockerFileWatcher
+
+
+class TestDockerFileWatcher(unittest.TestCase):
+    use_inotify = True
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.context_dir = os.path.join(self.temp_dir.name, 'config_files')
+        os.makedirs(os.path.join(self.context_dir, '.git'))
+        os.makedirs(os.path.join(self.context_dir, 'cache'))
+        self.dockerfile = os.path.join(self.context_dir, 'Dockerfile')
+        self.config_file = os.path.join(self.temp_dir.name, 'config.json')
+        self.other_file = os.path.join(self.temp_dir.name, 'other.json')
+        for path in (self.dockerfile, self.config_file, self.other_file):
+            self.write(path, 'initial')
+        self.watcher = DockerFileWatcher([self.context_dir, self.config_file], debounce=0.1,
+                                         exclude=[os.path.join(self.context_dir, 'cache')],
+                                         poll_interval=0.02, use_inotify=self.use_inotify)
+
+    def tearDown(self):
+        self.watcher.close()
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def write(path, content):
+        with open(path, 'w') as file:
+            file.write(content)
+        # polling compares modification times, make every write visible
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1000000))
+
+    def test_backend(self):
+        self.assertEqual(self.watcher.backend, 'inotify' if self.use_inotify else 'polling')
+
+    def test_file_in_directory(self):
+        self.write(self.dockerfile, 'FROM ubuntu\n')
+
+        self.assertIn(self.dockerfile, self.watcher.wait_for_change(timeout=2))
+
+    def test_single_file(self):
+        self.write(self.config_file, '{}')
+
+        self.assertEqual(self.watcher.wait_for_change(timeout=2), {self.config_file})
+
+    def test_ignored_paths(self):
+        self.write(self.other_file, 'changed')
+        self.write(os.path.join(self.context_dir, '.git', 'index'), 'changed')
+        self.write(os.path.join(self.context_dir, 'cache', 'context.tar'), 'changed')
+
+        self.assertEqual(self.watcher.wait_for_change(timeout=0.3), set())
+
+    def test_new_subdirectory(self):
+        subdirectory = os.path.join(self.context_dir, 'scripts')
+        os.makedirs(subdirectory)
+        self.watcher.wait_for_change(timeout=2)
+
+        self.write(os.path.join(subdirectory, 'setup.sh'), 'echo')
+        self.assertIn(os.path.join(subdirectory, 'setup.sh'), self.watcher.wait_for_change(timeout=2))
+
+    def test_burst_is_one_change(self):
+        def edit():
+            for index in range(5):
+                self.write(self.dockerfile, f'FROM ubuntu:{index}\n')
+                time.sleep(0.03)
+            self.write(self.config_file, '{"edited": true}')
+        editor = threading.Thread(target=edit)
+        editor.start()
+
+        changed = self.watcher.wait_for_change(timeout=2)
+        editor.join()
+        self.assertEqual(changed, {self.dockerfile, self.config_file})
+        self.assertEqual(self.watcher.wait_for_change(timeout=0.3), set())
+
+
+class TestDockerFileWatcherPolling(TestDockerFileWatcher):
+    use_inotify = False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch
+import shutil
+import subprocess
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_git_metadata import DockerGitMetadata
+
+
+@unittest.skipIf(shutil.which('git') is None, 'git is needed to create the test repository')
+class TestDockerGitMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = self.temp_dir.name
+        self.git('init', '-q', '-b', 'feature/tags')
+        with open(os.path.join(self.repo, 'Dockerfile'), 'w') as dockerfile:
+            dockerfile.write('FROM ubuntu\n')
+        os.makedirs(os.path.join(self.repo, 'config_files'))
+        with open(os.path.join(self.repo, 'config_files', 'config.json'), 'w') as config_file:
+            config_file.write('{}\n')
+        self.git('add', '.')
+        self.git('-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'initial')
+        self.commit = self.git('rev-parse', 'HEAD')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def git(self, *args):
+        return subprocess.run(['git', *args], cwd=self.repo, check=True, stdout=subprocess.PIPE,
+                              text=True).stdout.strip()
+
+    @patch('subprocess.run')
+    def test_reads_without_git(self, mock_run):
+        metadata = DockerGitMetadata(os.path.join(self.repo, 'config_files'))
+
+        self.assertEqual(metadata.commit(), self.commit)
+        self.assertEqual(metadata.short_commit(), self.commit[:7])
+        self.assertEqual(metadata.branch(), 'feature/tags')
+        self.assertFalse(metadata.is_dirty())
+        mock_run.assert_not_called()
+
+    def test_packed_refs(self):
+        self.git('pack-refs', '--all')
+
+        self.assertEqual(DockerGitMetadata(self.repo).commit(), self.commit)
+
+    def test_detached_head(self):
+        self.git('checkout', '-q', '--detach')
+        metadata = DockerGitMetadata(self.repo)
+
+        self.assertEqual(metadata.commit(), self.commit)
+        self.assertIsNone(metadata.branch())
+
+    def test_dirty_tree(self):
+        with open(os.path.join(self.repo, 'Dockerfile'), 'a') as dockerfile:
+            dockerfile.write('CMD ["bash"]\n')
+
+        self.assertTrue(DockerGitMetadata(self.repo).is_dirty())
+
+    def test_touched_file_is_clean(self):
+        os.utime(os.path.join(self.repo, 'Dockerfile'), ns=(0, 0))
+
+        self.assertFalse(DockerGitMetadata(self.repo).is_dirty())
+
+    def test_mode_change_is_dirty(self):
+        os.chmod(os.path.join(self.repo, 'Dockerfile'), 0o755)
+
+        self.assertTrue(DockerGitMetadata(self.repo).is_dirty())
+        self.git('config', 'core.fileMode', 'false')
+        self.assertFalse(DockerGitMetadata(self.repo).is_dirty())
+
+    def test_staged_change_is_dirty(self):
+        with open(os.path.join(self.repo, 'Dockerfile'), 'a') as dockerfile:
+            dockerfile.write('RUN true\n')
+        self.git('add', 'Dockerfile')
+
+        # the work tree matches the index, the index does not match HEAD
+        self.assertTrue(DockerGitMetadata(self.repo).is_dirty())
+        self.git('-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'staged')
+        self.assertFalse(DockerGitMetadata(self.repo).is_dirty())
+
+    def test_deleted_file_is_dirty(self):
+        os.remove(os.path.join(self.repo, 'Dockerfile'))
+
+        self.assertTrue(DockerGitMetadata(self.repo).is_dirty())
+
+    def test_tag_components(self):
+        with open(os.path.join(self.repo, 'Dockerfile'), 'a') as dockerfile:
+            dockerfile.write('CMD ["bash"]\n')
+        metadata = DockerGitMetadata(self.repo)
+
+        self.assertEqual(metadata.tag_components(), [self.commit[:7]])
+        self.assertEqual(metadata.tag_components(branch=True, dirty=True),
+                         [self.commit[:7], 'feature-tags', 'dirty'])
+
+    def test_memoized_per_path(self):
+        first = DockerGitMetadata.for_path(self.repo)
+        self.assertIs(DockerGitMetadata.for_path(self.repo), first)
+
+        DockerGitMetadata.clear_cache()
+        self.assertIsNot(DockerGitMetadata.for_path(self.repo), first)
+
+    def test_outside_repository(self):
+        with tempfile.TemporaryDirectory() as empty_dir:
+            metadata = DockerGitMetadata(empty_dir)
+            with patch.object(metadata, '_git', return_value=None):
+                self.assertIsNone(metadata.commit())
+                self.assertEqual(metadata.tag_components(branch=True, dirty=True), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_health_monitor import DockerHealthMonitor
+from docker_manager.docker_service_manager import DockerServiceManager
+
+
+class TestDockerHealthMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.test_config = {
+            'health_check_interval': 0.01,
+            'health_check_failures': 2,
+            'logging_enabled': False,
+            'verbose': False
+        }
+        self.mock_config = MagicMock()
+        self.mock_config.get_custom_config_value.side_effect = \
+            lambda key, use_default=False: self.test_config.get(key)
+        self.client_session = MagicMock()
+        self.changes = []
+        self.monitor = DockerHealthMonitor(self.mock_config, self.client_session, on_change=self.changes.append)
+
+    @patch.object(DockerServiceManager, 'is_docker_running')
+    def test_check_reports_latency(self, mock_is_running):
+        mock_is_running.return_value = True
+
+        self.assertTrue(self.monitor.check())
+        self.assertTrue(self.monitor.healthy)
+        self.assertIsNotNone(self.monitor.latency)
+        mock_is_running.assert_called_once_with(self.client_session)
+
+    @patch.object(DockerServiceManager, 'is_docker_running')
+    def test_reconnects_after_failures(self, mock_is_running):
+        mock_is_running.side_effect = [True, False, False, True]
+
+        for _ in range(4):
+            self.monitor.check()
+
+        self.client_session.reconnect.assert_called_once()
+        self.assertEqual(self.monitor.reconnects, 1)
+        self.assertEqual(self.changes, [True, False, True])
+
+    @patch.object(DockerServiceManager, 'is_docker_running')
+    def test_background_thread(self, mock_is_running):
+        mock_is_running.return_value = True
+
+        with self.monitor:
+            self.monitor._stop_event.wait(0.05)
+
+        self.assertIsNone(self.monitor._thread)
+        self.assertGreaterEqual(mock_is_running.call_count, 1)
+        self.assertEqual(self.changes, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 import unittest
 from unittest.mock import MagicMock, Mock, patch
 from docker.errors import BuildError, APIError
+import tempfile
+import json
+import threading
+import shlex
 import sys
 import os
 import logging
@@ -8,6 +12,7 @@ import logging
 sys.path.append(os.path.abspath('../'))
 from docker_manager.docker_image_builder import DockerImageBuilder
 from docker_manager.docker_utility import DockerUtility
+from docker_manager.docker_metrics import DockerMetrics
 
 
 class TestDockerImageBuilder(unittest.TestCase):
@@ -39,19 +44,26 @@ class TestDockerImageBuilder(unittest.TestCase):
         # Now, this mock behavior will be used for initializing DockerImageBuilder
         self.builder = DockerImageBuilder(self.mock_config)
 
-    @patch('docker.models.images.ImageCollection.list')
-    def test_list_images(self, mock_list):
-        # Setup mock response
-        mock_list.return_value = [Mock(tags=['image1:latest']), Mock(tags=['image2:v1'])]
+    @patch('docker.from_env')
+    def test_list_images(self, mock_docker_from_env):
+        # Images are listed through the low-level API, filtered by the daemon, and only summarized in the log
+        mock_client = MagicMock()
+        mock_docker_from_env.return_value = mock_client
+        mock_client.api.images.return_value = [{'Id': 'sha256:1', 'RepoTags': ['image1:latest']},
+                                               {'Id': 'sha256:2', 'RepoTags': ['image1:v1', 'image2:v1']},
+                                               {'Id': 'sha256:3', 'RepoTags': ['<none>:<none>']}]
 
-        # Execute the method
-        self.builder.list_images()
+        with patch.object(self.builder.logging, 'log') as mock_log:
+            images = self.builder.list_images(labels={'team': 'infra'}, dangling=False)
 
-        # Check if the docker list method was called
-        mock_list.assert_called_once()
+        self.assertEqual([image.id for image in images], ['sha256:1', 'sha256:2', 'sha256:3'])
+        mock_client.api.images.assert_called_once_with(name=None, filters={'label': ['team=infra'],
+                                                                           'dangling': False})
+        mock_client.images.list.assert_not_called()
+        mock_log.assert_called_once_with('Docker images: 3 in 2 repositories, 1 untagged')
 
     @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_success")
-    @patch('docker_manager.docker_image_builder.docker.from_env')
+    @patch('docker.from_env')
     def test_build_image_success(self, mock_docker_from_env, mock_create_tag):
         # Create a mock for the Docker client and its chain of method calls
         mock_client = MagicMock()
@@ -68,23 +80,271 @@ class TestDockerImageBuilder(unittest.TestCase):
         self.assertEqual(result, expected_image_name_tag)
 
     @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_build_error")
-    @patch('docker_manager.docker_image_builder.docker')
-    def test_build_image_build_error(self, mock_docker, mock_create_tag):
+    @patch('docker.from_env')
+    def test_build_image_build_error(self, mock_docker_from_env, mock_create_tag):
         # Simulate a BuildError
-        mock_docker.from_env().images.build.side_effect = BuildError(reason="build failed", build_log=[])
+        mock_docker_from_env().images.build.side_effect = BuildError(reason="build failed", build_log=[])
 
         # Call the method and assert None is returned
         self.assertIsNone(self.builder.build_image())
 
     @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_api_error")
-    @patch('docker_manager.docker_image_builder.docker')
-    def test_build_image_api_error(self, mock_docker, mock_create_tag):
+    @patch('docker.from_env')
+    def test_build_image_api_error(self, mock_docker_from_env, mock_create_tag):
         # Simulate an APIError
-        mock_docker.from_env().images.build.side_effect = APIError("api error")
+        mock_docker_from_env().images.build.side_effect = APIError("api error")
 
         # Call the method and assert None is returned
         self.assertIsNone(self.builder.build_image())
 
+    @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_stream")
+    @patch('docker.from_env')
+    def test_build_image_streaming(self, mock_docker_from_env, mock_create_tag):
+        # Stream the build through the low-level API
+        self.test_config['stream_build'] = True
+        mock_client = MagicMock()
+        mock_docker_from_env.return_value = mock_client
+        mock_client.api.build.return_value = iter([
+            {'stream': 'Step 1/2 : FROM ubuntu\n'},
+            {'stream': 'Step 2/2 : CMD ["bash"]\n'},
+            {'aux': {'ID': 'sha256:abc123'}},
+            {'stream': 'Successfully built abc123\n'},
+        ])
+
+        DockerMetrics.reset()
+        with patch.object(self.builder.logging, 'log') as mock_log:
+            result = self.builder.build_image()
+
+        self.assertEqual(result, 'test_image:test_stream')
+        steps = [record['labels']['step'] for record in DockerMetrics.records() if record['phase'] == 'build_step']
+        self.assertEqual(steps, ['1/2', '2/2'])
+        mock_client.images.build.assert_not_called()
+        self.assertEqual(mock_client.api.build.call_args.kwargs['decode'], True)
+        mock_log.assert_any_call('Step 1/2 : FROM ubuntu')
+        mock_log.assert_any_call('Successfully built test_image:test_stream (abc123)')
+
+    @patch('docker.from_env')
+    def test_stream_build_error(self, mock_docker_from_env):
+        # An error chunk in the stream fails the build
+        mock_client = MagicMock()
+        mock_docker_from_env.return_value = mock_client
+        mock_client.api.build.return_value = iter([
+            {'stream': 'Step 1/2 : FROM ubuntu\n'},
+            {'error': 'step failed\n'},
+        ])
+
+        with self.assertRaises(BuildError):
+            self.builder.stream_build('path', 'Dockerfile', 'test_image:tag')
+
+    @patch('docker.from_env')
+    def test_stream_build_cancelled(self, mock_docker_from_env):
+        # A set cancel event stops the build at the next chunk and closes the stream
+        mock_client = MagicMock()
+        mock_docker_from_env.return_value = mock_client
+        cancel_event = threading.Event()
+        closed = []
+
+        def build_stream():
+            try:
+                yield {'stream': 'Step 1/2 : FROM ubuntu\n'}
+                cancel_event.set()
+                yield {'stream': 'Step 2/2 : RUN make\n'}
+                yield {'stream': 'Successfully built abc123\n'}
+            finally:
+                closed.append(True)
+        mock_client.api.build.return_value = build_stream()
+        self.builder.cancel_event = cancel_event
+
+        with self.assertRaises(BuildError):
+            self.builder.stream_build('path', 'Dockerfile', 'test_image:tag')
+        self.assertEqual(closed, [True])
+
+    def test_compute_content_hash(self):
+        with tempfile.TemporaryDirectory() as build_path:
+            with open(os.path.join(build_path, 'Dockerfile'), 'w') as dockerfile:
+                dockerfile.write('FROM ubuntu\n')
+            with open(os.path.join(build_path, 'ignored.log'), 'w') as ignored:
+                ignored.write('first')
+            with open(os.path.join(build_path, '.dockerignore'), 'w') as dockerignore:
+                dockerignore.write('*.log\n')
+
+            first_hash = DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', {'a': '1'})
+            # ignored files and buildarg ordering do not change the hash
+            with open(os.path.join(build_path, 'ignored.log'), 'w') as ignored:
+                ignored.write('second')
+            self.assertEqual(first_hash, DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', {'a': '1'}))
+            # buildargs and context files do
+            self.assertNotEqual(first_hash,
+                                DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', {'a': '2'}))
+            with open(os.path.join(build_path, 'Dockerfile'), 'w') as dockerfile:
+                dockerfile.write('FROM debian\n')
+            self.assertNotEqual(first_hash,
+                                DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', {'a': '1'}))
+
+    def test_compute_content_hash_follows_target(self):
+        with tempfile.TemporaryDirectory() as build_path:
+            with open(os.path.join(build_path, 'Dockerfile'), 'w') as dockerfile:
+                dockerfile.write('FROM ubuntu AS app\nCOPY app.py /\nFROM app AS docs\nCOPY docs /docs\n')
+            for name in ('app.py', 'docs'):
+                with open(os.path.join(build_path, name), 'w') as file:
+                    file.write('first')
+
+            app_hash = DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', target='app')
+            full_hash = DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile')
+            # docs is only copied by a stage the app target does not need
+            with open(os.path.join(build_path, 'docs'), 'w') as file:
+                file.write('second')
+            self.assertEqual(app_hash, DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', target='app'))
+            self.assertNotEqual(full_hash, DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile'))
+            self.assertEqual(list(DockerImageBuilder.compute_stage_hashes(build_path, 'Dockerfile', target='app')),
+                             ['app'])
+
+    def test_compute_content_hash_bind_mounts_and_fallback(self):
+        with tempfile.TemporaryDirectory() as build_path:
+            with open(os.path.join(build_path, 'Makefile'), 'w') as makefile:
+                makefile.write('all:\n')
+            for content in ('FROM ubuntu AS build\nRUN --mount=type=bind,target=/src make -C /src\n',
+                            'FROM ubuntu\nRUN <<EOF\nmake\nEOF\n'):
+                with open(os.path.join(build_path, 'Dockerfile'), 'w') as dockerfile:
+                    dockerfile.write(content)
+                first_hash = DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile')
+                # a bind mounted context, and a Dockerfile the stage graph does not model, cover every file
+                with open(os.path.join(build_path, 'Makefile'), 'a') as makefile:
+                    makefile.write('\ttrue\n')
+                self.assertNotEqual(first_hash, DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile'))
+            # the full context hash still tells a build_target build from a full one
+            self.assertNotEqual(DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile', target='build'),
+                                DockerImageBuilder.compute_content_hash(build_path, 'Dockerfile'))
+
+    @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_target")
+    @patch('docker.from_env')
+    def test_build_image_target(self, mock_docker_from_env, mock_create_tag):
+        # The build stops at build_target and logs the stages changed since the latest build
+        with tempfile.TemporaryDirectory() as build_path:
+            with open(os.path.join(build_path, 'Dockerfile.test'), 'w') as dockerfile:
+                dockerfile.write('FROM ubuntu AS base\nRUN true\nFROM base AS app\nRUN make\nFROM app\n')
+            self.test_config.update({'config_files_dir': build_path, 'build_target': 'app',
+                                     'skip_unchanged_builds': True})
+            base_hash = DockerImageBuilder.compute_stage_hashes(build_path, 'Dockerfile.test', target='app')['base']
+            mock_client = MagicMock()
+            mock_docker_from_env.return_value = mock_client
+            mock_client.api.images.side_effect = lambda name=None, filters=None, **kwargs: [] if filters else [
+                {'Id': 'sha256:old', 'RepoTags': ['test_image:old'], 'Created': 1,
+                 'Labels': {'docker_manager.stage_hashes': f'{{"base":"{base_hash}","app":"stale"}}'}}]
+            mock_client.images.build.return_value = ("mock_image_id", [])
+
+            with patch.object(self.builder.logging, 'log') as mock_log:
+                self.assertEqual(self.builder.build_image(), 'test_image:test_target')
+
+            build_kwargs = mock_client.images.build.call_args.kwargs
+            self.assertEqual(build_kwargs['target'], 'app')
+            self.assertEqual(list(json.loads(build_kwargs['labels']['docker_manager.stage_hashes'])), ['base', 'app'])
+            mock_log.assert_any_call('Stages changed since old: app, 1 unchanged')
+
+            # the context is walked once for the stage and content hashes
+            with patch('docker_manager.docker_image_builder.DockerBuildContext.list_files',
+                       return_value=['Dockerfile.test']) as mock_list_files:
+                self.builder.build_image()
+            mock_list_files.assert_called_once_with()
+
+    @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_skip")
+    @patch('docker_manager.docker_image_builder.DockerImageBuilder.compute_content_hash', return_value="abc")
+    @patch('docker.from_env')
+    def test_build_image_skips_unchanged(self, mock_docker_from_env, mock_hash, mock_create_tag):
+        # An image with the same content hash label is retagged instead of rebuilt
+        self.test_config['skip_unchanged_builds'] = True
+        mock_client = MagicMock()
+        mock_docker_from_env.return_value = mock_client
+        existing_image = MagicMock()
+        mock_client.api.images.return_value = [{'Id': 'sha256:abc', 'RepoTags': ['test_image:old']}]
+        mock_client.images.get.return_value = existing_image
+
+        result = self.builder.build_image()
+
+        self.assertEqual(result, 'test_image:test_skip')
+        mock_client.api.images.assert_called_with(name='test_image',
+                                                  filters={'label': ['docker_manager.content_hash=abc']})
+        mock_client.images.get.assert_called_once_with('sha256:abc')
+        existing_image.tag.assert_called_with('test_image', 'test_skip')
+        mock_client.images.build.assert_not_called()
+
+    @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_label")
+    @patch('docker_manager.docker_image_builder.DockerImageBuilder.compute_content_hash', return_value="abc")
+    @patch('docker.from_env')
+    def test_build_image_labels_new_build(self, mock_docker_from_env, mock_hash, mock_create_tag):
+        # A changed input is built and labelled with its content hash
+        self.test_config['skip_unchanged_builds'] = True
+        mock_client = MagicMock()
+        mock_docker_from_env.return_value = mock_client
+        mock_client.api.images.return_value = []
+        mock_client.images.build.return_value = ("mock_image_id", [])
+
+        self.assertEqual(self.builder.build_image(), 'test_image:test_label')
+        self.assertEqual(mock_client.images.build.call_args.kwargs['labels'],
+                         {'docker_manager.content_hash': 'abc'})
+
+    @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_context")
+    @patch('docker.from_env')
+    def test_build_image_cached_context(self, mock_docker_from_env, mock_create_tag):
+        # The cached archive is sent as a custom context
+        with tempfile.TemporaryDirectory() as build_path, tempfile.TemporaryDirectory() as cache_dir:
+            with open(os.path.join(build_path, 'Dockerfile.test'), 'w') as dockerfile:
+                dockerfile.write('FROM ubuntu\n')
+            self.test_config.update({'cache_build_context': True, 'context_cache_dir': cache_dir,
+                                     'config_files_dir': build_path})
+            mock_client = MagicMock()
+            mock_docker_from_env.return_value = mock_client
+            mock_client.images.build.return_value = ("mock_image_id", [])
+
+            self.assertEqual(self.builder.build_image(), 'test_image:test_context')
+            build_kwargs = mock_client.images.build.call_args.kwargs
+            self.assertTrue(build_kwargs['custom_context'])
+            self.assertNotIn('path', build_kwargs)
+            self.assertTrue(build_kwargs['fileobj'].closed)
+
+    @patch('docker_manager.docker_image_builder.DockerUtility.run_command_with_output')
+    def test_buildkit_build(self, mock_run_command):
+        # BuildKit builds run docker buildx with the configured cache sources
+        self.test_config.update({'buildkit_cache_from': ['/tmp/buildkit-cache', 'test_image:latest'],
+                                 'buildkit_cache_to': '/tmp/buildkit-cache'})
+
+        def fake_run(command, error_message, log_file_path=None, **kwargs):
+            arguments = shlex.split(command)
+            for line in ('#5 [build 2/3] RUN make', '#5 0.512 compiling', '#5 DONE 1.5s'):
+                kwargs['on_line']('stderr', line)
+            with open(arguments[arguments.index('--iidfile') + 1], 'w') as iid_file:
+                iid_file.write('sha256:abc123\n')
+            fake_run.arguments = arguments
+        mock_run_command.side_effect = fake_run
+
+        image_id = self.builder.buildkit_build('/context', 'Dockerfile', 'test_image:tag', {'base_version': '22.04'})
+
+        self.assertEqual(image_id, 'sha256:abc123')
+        arguments = fake_run.arguments
+        self.assertEqual(arguments[:3], ['docker', 'buildx', 'build'])
+        self.assertIn('--load', arguments)
+        self.assertIn('base_version=22.04', arguments)
+        self.assertIn('type=local,src=/tmp/buildkit-cache', arguments)
+        self.assertIn('type=registry,ref=test_image:latest', arguments)
+        self.assertIn('type=local,dest=/tmp/buildkit-cache,mode=max', arguments)
+        # the image cache source needs inline cache metadata in the built images
+        self.assertIn('BUILDKIT_INLINE_CACHE=1', arguments)
+        self.assertEqual(arguments[-1], '/context')
+        # steps are timed from the streamed progress output
+        steps = [record for record in DockerMetrics.records() if record['phase'] == 'build_step']
+        self.assertEqual(steps[-1]['wall_seconds'], 1.5)
+        self.assertEqual(steps[-1]['labels']['step'], 'build 2/3')
+        self.assertEqual(steps[-1]['labels']['instruction'], 'RUN make')
+
+    @patch('docker_manager.docker_image_builder.DockerUtility.create_tag', return_value="test_buildkit")
+    @patch('docker_manager.docker_image_builder.DockerUtility.run_command_with_output')
+    def test_build_image_buildkit_error(self, mock_run_command, mock_create_tag):
+        # A failed buildx run is reported like any other build error
+        self.test_config['buildkit_enabled'] = True
+        mock_run_command.side_effect = Exception('Error: BuildKit build failed')
+
+        self.assertIsNone(self.builder.build_image())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import MagicMock
+from docker.errors import NotFound
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_image_inventory import DockerImageInventory, DockerImageSummary
+
+
+class TestDockerImageInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.test_config = {'image_page_size': 2}
+        self.mock_config = MagicMock()
+        self.mock_config.get_custom_config_value.side_effect = \
+            lambda key, use_default=False: self.test_config.get(key)
+        self.client_session = MagicMock()
+        self.api = self.client_session.api
+        self.api.images.return_value = [
+            {'Id': 'sha256:aaa', 'RepoTags': ['app:20240101', 'app:latest'], 'Created': 300},
+            {'Id': 'sha256:bbb', 'RepoTags': ['app:20231231'], 'Created': 200},
+            {'Id': 'sha256:ccc', 'RepoTags': ['app:20231230'], 'Created': 100},
+        ]
+        self.api.events.return_value = iter([])
+        self.inventory = DockerImageInventory(self.mock_config, self.client_session)
+
+    def test_pages(self):
+        pages = self.inventory.pages(repository='app', labels=['team=infra', 'ci'], dangling=True)
+
+        first_page = next(pages)
+        self.assertEqual([image.id for image in first_page], ['sha256:aaa', 'sha256:bbb'])
+        self.api.images.assert_called_once_with(name='app', filters={'label': ['team=infra', 'ci'],
+                                                                     'dangling': True})
+        self.assertEqual([image.id for image in next(pages)], ['sha256:ccc'])
+        self.assertIsNone(next(pages, None))
+
+    def test_repository_index(self):
+        self.assertEqual(self.inventory.repository('app'), {'20240101': 'sha256:aaa', 'latest': 'sha256:aaa',
+                                                            '20231231': 'sha256:bbb', '20231230': 'sha256:ccc'})
+        self.inventory.repository('app')
+
+        # the second lookup is answered from the index
+        self.api.images.assert_called_once_with(name='app', filters=None)
+
+    def test_latest(self):
+        self.assertEqual(self.inventory.latest('app').id, 'sha256:aaa')
+
+    def test_latest_unknown_repository(self):
+        self.api.images.return_value = []
+
+        self.assertIsNone(self.inventory.latest('missing'))
+
+    def test_refresh_applies_events(self):
+        self.inventory.repository('app')
+        self.api.events.return_value = iter([
+            {'Type': 'image', 'Action': 'tag', 'Actor': {'ID': 'sha256:ddd'}},
+            {'Type': 'image', 'Action': 'delete', 'Actor': {'ID': 'sha256:ccc'}},
+        ])
+
+        def inspect_image(image_id):
+            if image_id != 'sha256:ddd':
+                raise NotFound('gone')
+            # inspect reports the creation time as a string
+            return {'Id': 'sha256:ddd', 'RepoTags': ['app:20240102'], 'Created': '2024-01-02T00:00:00Z'}
+        self.api.inspect_image.side_effect = inspect_image
+
+        latest = self.inventory.latest('app')
+
+        self.assertEqual(latest.id, 'sha256:ddd')
+        self.assertNotIn('20231230', self.inventory.repository('app'))
+        self.assertEqual(self.api.images.call_count, 1)
+        self.assertEqual(self.api.events.call_args.kwargs['filters'], {'type': 'image'})
+
+    def test_refresh_reloads_after_event_overflow(self):
+        self.inventory.repository('app')
+        self.api.events.return_value = iter([{'Actor': {'ID': 'sha256:x'}}] * DockerImageInventory.EVENTS_BUFFER)
+
+        self.inventory.repository('app')
+
+        self.assertEqual(self.api.images.call_count, 2)
+        self.api.inspect_image.assert_not_called()
+
+    def test_shared_per_session(self):
+        inventory = DockerImageInventory.for_session(self.mock_config, self.client_session)
+
+        self.assertIs(DockerImageInventory.for_session(self.mock_config, self.client_session), inventory)
+        self.assertIsNot(DockerImageInventory.for_session(self.mock_config, MagicMock()), inventory)
+
+    def test_summary(self):
+        summary = DockerImageSummary({'Id': 'sha256:0123456789abcdef', 'RepoTags': ['<none>:<none>'],
+                                      'Config': {'Labels': {'a': 'b'}}})
+
+        self.assertEqual(summary.short_id, '0123456789ab')
+        self.assertEqual(summary.repo_tags, [])
+        self.assertEqual(summary.labels, {'a': 'b'})
+
+    def test_split_repo_tag(self):
+        self.assertEqual(DockerImageInventory.split_repo_tag('app:v1'), ('app', 'v1'))
+        self.assertEqual(DockerImageInventory.split_repo_tag('localhost:5000/app'), ('localhost:5000/app', 'latest'))
+        self.assertEqual(DockerImageInventory.split_repo_tag('localhost:5000/app:v1'), ('localhost:5000/app', 'v1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import tempfile
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_config import DockerConfig
+from docker_manager.docker_image_watcher import DockerImageWatcher
+
+
+class TestDockerImageWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.context_dir = os.path.join(self.temp_dir.name, 'config_files')
+        os.makedirs(self.context_dir)
+        with open(os.path.join(self.context_dir, 'Dockerfile'), 'w') as dockerfile:
+            dockerfile.write('FROM ubuntu\n')
+        self.cache_patch = patch.object(DockerConfig, 'CACHE_DIR', os.path.join(self.temp_dir.name, 'cache'))
+        self.cache_patch.start()
+        self.config_path = os.path.join(self.temp_dir.name, 'config.json')
+        self.write_config(image_name='first')
+        self.docker_config = DockerConfig(self.config_path, environ={}).derive(
+            config_files_dir=self.context_dir)
+        self.builder_patch = patch('docker_manager.docker_image_watcher.DockerImageBuilder')
+        self.mock_builder = self.builder_patch.start()
+        self.manager_patch = patch('docker_manager.docker_image_watcher.DockerContainerManager')
+        self.mock_manager = self.manager_patch.start()
+        self.watcher = DockerImageWatcher(self.docker_config, self.config_path, client_session=MagicMock(),
+                                          recreate_container=True, start_container=True)
+
+    def tearDown(self):
+        self.builder_patch.stop()
+        self.manager_patch.stop()
+        self.cache_patch.stop()
+        self.temp_dir.cleanup()
+
+    def write_config(self, **custom_fields):
+        with open(self.config_path, 'w') as config_file:
+            json.dump({'custom_fields': dict(custom_fields, logging_enabled=False),
+                       'default_fields': {'watch_debounce': {'field_name': 'watch_debounce',
+                                                             'default_value': 0.05}}}, config_file)
+
+    def test_build_recreates_container(self):
+        self.mock_builder.return_value.build_image.side_effect = ['image:1', 'image:2']
+        first, second = MagicMock(), MagicMock()
+        self.mock_manager.return_value.create_container.side_effect = [first, second]
+
+        self.watcher.rebuild()
+        self.watcher.wait()
+        self.watcher.rebuild()
+        self.watcher.wait()
+
+        self.assertEqual(self.watcher.image_name_tag, 'image:2')
+        self.mock_manager.return_value.remove_container.assert_called_once_with(first, force=True)
+        self.mock_manager.return_value.start_container.assert_called_with(second)
+        self.assertIs(self.watcher.container, second)
+        # builds always stream so they can be cancelled
+        build_config = self.mock_builder.call_args.args[0]
+        self.assertTrue(build_config.get_custom_config_value('stream_build'))
+
+    def test_change_cancels_running_build(self):
+        started = threading.Event()
+
+        def build_image():
+            cancel_event = self.mock_builder.call_args.kwargs['cancel_event']
+            if not started.is_set():
+                started.set()
+                cancel_event.wait(2)
+                return None
+            return 'image:2'
+        self.mock_builder.return_value.build_image.side_effect = build_image
+
+        self.watcher.rebuild()
+        started.wait(2)
+        self.watcher.rebuild()
+        self.watcher.wait()
+
+        self.assertEqual(self.watcher.cancelled_builds, 1)
+        self.assertEqual(self.watcher.image_name_tag, 'image:2')
+        self.mock_manager.return_value.create_container.assert_called_once_with('image:2')
+
+    def test_run_rebuilds_on_change(self):
+        self.mock_builder.return_value.build_image.return_value = 'image:1'
+        stop_event = threading.Event()
+        runner = threading.Thread(target=self.watcher.run, args=(stop_event, False))
+        runner.start()
+        try:
+            deadline = time.monotonic() + 5
+            while self.watcher.builds < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.6)
+            self.write_config(image_name='second')
+            os.utime(self.config_path, ns=(time.time_ns(), time.time_ns() + 1000000))
+            while self.watcher.builds < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            stop_event.set()
+            runner.join(5)
+
+        self.assertEqual(self.watcher.builds, 2)
+        # the reloaded config keeps the command line values
+        self.assertEqual(self.watcher.config.get_custom_config_value('image_name'), 'second')
+        self.assertEqual(self.watcher.config.get_custom_config_value('config_files_dir'), self.context_dir)
+
+    def test_affects_build(self):
+        with open(os.path.join(self.context_dir, 'Dockerfile'), 'w') as dockerfile:
+            dockerfile.write('FROM ubuntu AS build\nCOPY src/ /src/\nFROM ubuntu AS docs\nCOPY docs /docs\n')
+        self.watcher.config = self.docker_config.derive(build_target='build')
+
+        self.assertTrue(self.watcher.affects_build([os.path.join(self.context_dir, 'src', 'main.c')]))
+        # only the docs stage copies docs, and build does not need it
+        self.assertFalse(self.watcher.affects_build([os.path.join(self.context_dir, 'docs', 'index.md')]))
+        self.assertTrue(self.watcher.affects_build([os.path.join(self.context_dir, 'Dockerfile')]))
+        self.assertTrue(self.watcher.affects_build([self.config_path]))
+        # also when the config file sits inside the build context, as config_files/config.json does
+        self.watcher.config_path = os.path.join(self.context_dir, 'config.json')
+        self.assertTrue(self.watcher.affects_build([self.watcher.config_path]))
+
+    def test_watched_paths(self):
+        paths, exclude = self.watcher.watched_paths()
+
+        self.assertEqual(paths, [self.context_dir, os.path.join(self.context_dir, 'Dockerfile'), self.config_path])
+        self.assertEqual(exclude, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import io
+import json
+import tempfile
+import sys
+import os
+import logging
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_logging import DockerLogging
+
+
+class TestDockerLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.mock_config = MagicMock()
+        self.test_config = {
+            'logging_enabled': True,
+            'verbose': False,
+            'log_file': os.path.join(self.temp_dir.name, 'logs', 'test_log.txt'),
+            'log_level': logging.DEBUG,
+            'log_format': 'text',
+            'initializer': 'unit_testing'
+        }
+        self.mock_config.get_custom_config_value.side_effect = lambda key, use_default=False: self.test_config.get(key)
+
+    def tearDown(self):
+        DockerLogging.shutdown()
+        self.temp_dir.cleanup()
+
+    def read_log(self):
+        DockerLogging.shutdown()  # drains the queue
+        with open(self.test_config['log_file'], 'r') as log_file:
+            return log_file.read().splitlines()
+
+    def test_text_log_file(self):
+        docker_logging = DockerLogging(self.mock_config)
+        docker_logging.log('built %s', 'image:tag')
+        docker_logging.log('failed', level=logging.ERROR)
+
+        lines = self.read_log()
+        self.assertTrue(lines[0].endswith('INFO:DockerLogging initialized by unit_testing'))
+        self.assertTrue(lines[1].endswith('INFO:built image:tag'))
+        self.assertTrue(lines[2].endswith('ERROR:failed'))
+
+    def test_json_log_file(self):
+        self.test_config['log_format'] = 'json'
+        docker_logging = DockerLogging(self.mock_config, initializer='TestCaller')
+        docker_logging.log('step %d of %d', 1, 2, level=logging.WARNING)
+
+        entry = json.loads(self.read_log()[-1])
+        self.assertEqual(entry['message'], 'step 1 of 2')
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['initializer'], 'TestCaller')
+
+    def test_instances_share_one_writer(self):
+        first = DockerLogging(self.mock_config)
+        second = DockerLogging(self.mock_config)
+        self.assertIs(first.logger, second.logger)
+
+    def test_formatting_is_lazy(self):
+        self.test_config.update({'logging_enabled': False, 'verbose': False})
+        docker_logging = DockerLogging(self.mock_config)
+        argument = MagicMock()
+
+        docker_logging.log('value %s', argument)
+
+        argument.__str__.assert_not_called()
+
+    def test_below_log_level_is_dropped(self):
+        self.test_config['log_level'] = logging.WARNING
+        docker_logging = DockerLogging(self.mock_config)
+        docker_logging.log('debug detail', level=logging.DEBUG)
+
+        self.assertEqual(self.read_log(), [])
+
+    def test_print_message_streams(self):
+        self.test_config.update({'logging_enabled': False, 'verbose': True})
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            docker_logging = DockerLogging(self.mock_config)
+            docker_logging.log('to stdout')
+            docker_logging.log('to stderr', level=logging.ERROR)
+
+        self.assertIn('to stdout', stdout.getvalue())
+        self.assertEqual(stderr.getvalue(), 'to stderr\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
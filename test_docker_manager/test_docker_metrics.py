@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_metrics import DockerMetrics
+
+
+class TestDockerMetrics(unittest.TestCase):
+
+    def setUp(self):
+        DockerMetrics.reset()
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        DockerMetrics.reset()
+        self.temp_dir.cleanup()
+
+    def test_phase_records_timing(self):
+        with DockerMetrics.phase('create_tag'):
+            sum(range(1000))
+
+        record = DockerMetrics.records()[0]
+        self.assertEqual(record['phase'], 'create_tag')
+        self.assertGreaterEqual(record['wall_seconds'], 0)
+        self.assertGreaterEqual(record['cpu_seconds'], 0)
+
+    def test_phase_records_on_error(self):
+        with self.assertRaises(ValueError):
+            with DockerMetrics.phase('image_build', image='test:tag'):
+                raise ValueError('build failed')
+
+        self.assertEqual(DockerMetrics.records()[0]['labels'], {'image': 'test:tag'})
+
+    def test_write_json(self):
+        DockerMetrics.record('build_step', 1.5, image='test:tag', step='1/2')
+        json_path = os.path.join(self.temp_dir.name, 'metrics', 'run.json')
+
+        DockerMetrics.write_json(json_path)
+
+        with open(json_path, 'r') as json_file:
+            report = json.load(json_file)
+        self.assertEqual(report['phases'][0]['phase'], 'build_step')
+        self.assertEqual(report['phases'][0]['wall_seconds'], 1.5)
+
+    def test_write_prometheus_sums_label_sets(self):
+        DockerMetrics.record('create_container', 1.0, 0.25)
+        DockerMetrics.record('create_container', 2.0, 0.25)
+        DockerMetrics.record('build_step', 3.0, image_name='app', image='app:20240101-abc', step='1/2',
+                             instruction='RUN echo "hi"')
+        prometheus_path = os.path.join(self.temp_dir.name, 'run.prom')
+
+        DockerMetrics.write_prometheus(prometheus_path)
+
+        with open(prometheus_path, 'r') as prometheus_file:
+            lines = prometheus_file.read().splitlines()
+        self.assertIn('docker_manager_phase_wall_seconds_total{phase="create_container"} 3.0', lines)
+        self.assertIn('docker_manager_phase_cpu_seconds_total{phase="create_container"} 0.5', lines)
+        self.assertIn('docker_manager_phase_runs_total{phase="create_container"} 2', lines)
+        # the tag, step and instruction would add new series on every build
+        self.assertIn('docker_manager_phase_wall_seconds_total{image_name="app",phase="build_step"} 3.0', lines)
+
+    @patch.object(DockerMetrics, 'MAX_RECORDS', 3)
+    def test_records_are_bounded(self):
+        DockerMetrics.reset()
+        for step in range(5):
+            DockerMetrics.record('build_step', 1.0, image_name='app', step=step)
+        prometheus_path = os.path.join(self.temp_dir.name, 'run.prom')
+
+        DockerMetrics.write_prometheus(prometheus_path)
+
+        self.assertEqual([record['labels']['step'] for record in DockerMetrics.records()], ['2', '3', '4'])
+        # the counters still include the dropped records
+        with open(prometheus_path, 'r') as prometheus_file:
+            self.assertIn('docker_manager_phase_runs_total{image_name="app",phase="build_step"} 5',
+                          prometheus_file.read().splitlines())
+
+    def test_export_uses_config(self):
+        DockerMetrics.record('create_tag', 0.1)
+        json_path = os.path.join(self.temp_dir.name, 'run.json')
+        mock_config = MagicMock()
+        mock_config.get_custom_config_value.side_effect = \
+            lambda key, use_default=False: {'metrics_json_file': json_path}.get(key)
+
+        DockerMetrics.export(mock_config)
+
+        self.assertTrue(os.path.isfile(json_path))
+        self.assertEqual(os.listdir(self.temp_dir.name), ['run.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch, MagicMock
+from docker.errors import APIError
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_pruner import DockerPruner
+
+
+class TestDockerPruner(unittest.TestCase):
+
+    def setUp(self):
+        self.test_config = {
+            'image_name': 'app',
+            'container_name': 'app-container',
+            'prune_keep_last': 2,
+            'prune_keep_younger_than': 3600,
+            'logging_enabled': False,
+            'verbose': False
+        }
+        self.mock_config = MagicMock()
+        self.mock_config.get_custom_config_value.side_effect = \
+            lambda key, use_default=False: self.test_config.get(key)
+        self.client_session = MagicMock()
+        self.api = self.client_session.api
+        now = time.time()
+        day = 86400
+        self.api.images.return_value = [
+            {'Id': 'sha256:new', 'RepoTags': ['app:5'], 'Created': now - 60, 'Size': 100},
+            {'Id': 'sha256:recent', 'RepoTags': ['app:4'], 'Created': now - 120, 'Size': 100},
+            {'Id': 'sha256:young', 'RepoTags': ['app:3'], 'Created': now - 600, 'Size': 100},
+            {'Id': 'sha256:running', 'RepoTags': ['app:2'], 'Created': now - 2 * day, 'Size': 100},
+            {'Id': 'sha256:stopped', 'RepoTags': ['app:1', 'app:1b'], 'Created': now - 3 * day, 'Size': 200},
+            {'Id': 'sha256:shared', 'RepoTags': ['app:0', 'other:0'], 'Created': now - 4 * day, 'Size': 300},
+            {'Id': 'sha256:foreign', 'RepoTags': ['app:old'], 'Created': now - 5 * day, 'Size': 400},
+        ]
+        self.api.containers.return_value = [
+            {'Id': 'c1', 'Names': ['/app-container-2'], 'ImageID': 'sha256:running', 'State': 'running'},
+            {'Id': 'c2', 'Names': ['/app-container-1'], 'ImageID': 'sha256:stopped', 'State': 'exited'},
+            {'Id': 'c3', 'Names': ['/app-container-1-2'], 'ImageID': 'sha256:stopped', 'State': 'created'},
+            {'Id': 'c4', 'Names': ['/app-container-debug'], 'ImageID': 'sha256:foreign', 'State': 'exited'},
+        ]
+        self.pruner = DockerPruner(self.mock_config, self.client_session)
+
+    def test_images_with_containers_are_kept(self):
+        report = self.pruner.prune(dry_run=True)
+
+        # only the image without containers goes, the shared one keeps its other tag
+        self.assertEqual(report.tags, ['app:0'])
+        self.assertEqual(report.containers, [])
+        self.assertEqual(report.reclaimable, 0)
+        self.assertEqual(report.kept, 7)
+        self.assertEqual(report.in_use, 3)
+
+    def test_dry_run_reports_without_removing(self):
+        self.test_config['prune_containers'] = True
+        report = DockerPruner(self.mock_config, self.client_session).prune(dry_run=True)
+
+        self.assertEqual(report.tags, ['app:1', 'app:1b', 'app:0'])
+        self.assertEqual(report.containers, ['app-container-1', 'app-container-1-2'])
+        # the shared image keeps its other tag, so only the stopped one frees space
+        self.assertEqual(report.reclaimable, 200)
+        self.assertEqual(report.kept, 5)
+        self.assertEqual(report.in_use, 2)
+        self.assertIn('Would remove 3 tags and 2 containers of app', report.summary())
+        self.api.remove_container.assert_not_called()
+        self.api.remove_image.assert_not_called()
+
+    def test_prune_removes_containers_then_tags(self):
+        self.test_config['prune_containers'] = True
+        calls = []
+        # volumes are never removed with the containers
+        self.api.remove_container.side_effect = lambda container_id: calls.append(container_id)
+        self.api.remove_image.side_effect = calls.append
+
+        report = DockerPruner(self.mock_config, self.client_session).prune()
+
+        self.assertTrue(report.ok)
+        self.assertEqual(sorted(calls[:2]), ['c2', 'c3'])
+        self.assertEqual(sorted(calls[2:]), ['app:0', 'app:1', 'app:1b'])
+
+    def test_prune_collects_errors(self):
+        self.test_config['prune_containers'] = True
+
+        def remove_image(tag):
+            if tag == 'app:0':
+                raise APIError('conflict')
+        self.api.remove_image.side_effect = remove_image
+
+        report = DockerPruner(self.mock_config, self.client_session).prune()
+
+        self.assertFalse(report.ok)
+        self.assertEqual(len(report.errors), 1)
+        self.assertTrue(report.errors[0].startswith('app:0'))
+        self.assertEqual(self.api.remove_image.call_count, 3)
+
+    def test_uses_the_event_monitor_view(self):
+        self.test_config['prune_containers'] = True
+        monitor = MagicMock()
+        monitor.containers.return_value = self.api.containers.return_value
+        with patch('docker_manager.docker_pruner.DockerEventMonitor.running_for', return_value=monitor):
+            report = DockerPruner(self.mock_config, self.client_session).prune(dry_run=True)
+
+        self.assertEqual(report.containers, ['app-container-1', 'app-container-1-2'])
+        self.api.containers.assert_not_called()
+
+    def test_keep_everything(self):
+        self.test_config['prune_keep_last'] = 10
+        pruner = DockerPruner(self.mock_config, self.client_session)
+
+        report = pruner.prune(dry_run=True)
+
+        self.assertEqual(report.tags, [])
+        self.assertEqual(report.kept, 8)
+
+    def test_retention_counts_tags(self):
+        # builds with unchanged inputs retag the same image
+        now = time.time()
+        self.api.images.return_value = [
+            {'Id': 'sha256:retagged', 'RepoTags': ['app:20240104', 'app:20240103', 'app:20240102', 'app:20240101'],
+             'Created': now - 2 * 86400, 'Size': 100},
+            {'Id': 'sha256:first', 'RepoTags': ['app:20231231'], 'Created': now - 3 * 86400, 'Size': 50},
+        ]
+        self.api.containers.return_value = [
+            {'Id': 'c1', 'Names': ['/app-container-20240101'], 'ImageID': 'sha256:retagged', 'State': 'running'},
+        ]
+
+        report = DockerPruner(self.mock_config, self.client_session).prune(dry_run=True)
+
+        # the image keeps its two newest tags, so the others are only untagged
+        self.assertEqual(report.tags, ['app:20240102', 'app:20240101', 'app:20231231'])
+        self.assertEqual(report.reclaimable, 50)
+        self.assertEqual(report.kept, 2)
+        self.assertEqual(report.in_use, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -45,6 +45,25 @@ class TestDockerServiceManager(unittest.TestCase):
         mock_run.return_value = MagicMock(returncode=1, stderr='Error')
         self.assertFalse(DockerServiceManager.start_docker())
 
+    @patch('time.sleep')
+    @patch.object(DockerServiceManager, 'is_docker_running')
+    def test_wait_until_ready_backs_off(self, mock_is_running, mock_sleep):
+        mock_is_running.side_effect = [False, False, False, True]
+        session = MagicMock()
+
+        self.assertTrue(DockerServiceManager.wait_until_ready(session, timeout=10, initial_delay=0.1, max_delay=0.3))
+
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [0.1, 0.2, 0.3])
+        # every ping goes through the same client
+        for call in mock_is_running.call_args_list:
+            self.assertIs(call.args[0], session)
+        session.close.assert_not_called()
+
+    @patch.object(DockerServiceManager, 'is_docker_running')
+    def test_wait_until_ready_deadline(self, mock_is_running):
+        mock_is_running.return_value = False
+
+        self.assertFalse(DockerServiceManager.wait_until_ready(MagicMock(), timeout=0.05, initial_delay=0.01))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import unittest
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+from docker_manager.docker_stage_graph import DockerStageGraph
+
+
+class TestDockerStageGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.build_path = self.temp_dir.name
+        self.dockerfile = (
+            'ARG BASE=ubuntu \\\n'
+            '    VERSION=22.04 \\\n'
+            '    IMAGE=${BASE}:${VERSION}\n'
+            'FROM ${IMAGE} AS base\n'
+            'ARG PACKAGES="git curl"\n'
+            'RUN apt-get install ${PACKAGES}\n'
+            'FROM base AS build\n'
+            'ARG VERSION\n'
+            'ENV SRC_DIR=src\n'
+            'COPY ${SRC_DIR}/ /build/src/\n'
+            'COPY ["Makefile", "/build/"]\n'
+            'RUN --mount=type=cache,target=/root/.cache make\n'
+            'FROM base AS docs\n'
+            'COPY docs/*.md /docs/\n'
+            'FROM scratch AS final\n'
+            'COPY --from=build /build/out /app\n'
+            'RUN --mount=type=bind,from=docs,source=/docs,target=/docs true\n'
+        )
+        self.files = {'Makefile': 'all:\n', 'src/main.c': 'int main;\n', 'docs/index.md': '# docs\n',
+                      'README': 'readme\n'}
+        for relative_path, content in self.files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.build_path, relative_path)), exist_ok=True)
+            with open(os.path.join(self.build_path, relative_path), 'w') as file:
+                file.write(content)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parse_stages(self):
+        stage_graph = DockerStageGraph(self.dockerfile)
+
+        self.assertEqual(stage_graph.stage_names, ['base', 'build', 'docs', 'final'])
+        self.assertEqual(stage_graph.meta_args['IMAGE'], 'ubuntu:22.04')
+        self.assertEqual(stage_graph.stage('base').base, 'ubuntu:22.04')
+        self.assertEqual(stage_graph.stage('build').parent, 'base')
+        self.assertEqual(stage_graph.stage('final').dependencies, {'build', 'docs'})
+        # redeclared global ARGs keep their value, ENV values resolve COPY sources
+        self.assertEqual(stage_graph.stage('build').args, {'VERSION': '22.04'})
+        self.assertEqual(stage_graph.stage('build').sources, ['src/', 'Makefile'])
+        self.assertEqual(stage_graph.stage('base').args, {'PACKAGES': 'git curl'})
+        self.assertEqual(stage_graph.external_images(), {'ubuntu:22.04'})
+
+    def test_buildargs_override_defaults(self):
+        stage_graph = DockerStageGraph(self.dockerfile, {'VERSION': '24.04'})
+
+        self.assertEqual(stage_graph.stage('base').base, 'ubuntu:24.04')
+        self.assertEqual(stage_graph.stage('build').args, {'VERSION': '24.04'})
+
+    def test_resolve(self):
+        values = {'NAME': 'app', 'EMPTY': ''}
+
+        self.assertEqual(DockerStageGraph.resolve('$NAME-${NAME}', values), 'app-app')
+        self.assertEqual(DockerStageGraph.resolve('${EMPTY:-default}/${NAME:+set}', values), 'default/set')
+        self.assertEqual(DockerStageGraph.resolve('${MISSING}x', values), 'x')
+
+    def test_needed_stages(self):
+        stage_graph = DockerStageGraph(self.dockerfile)
+
+        self.assertEqual([stage.name for stage in stage_graph.needed_stages()], ['base', 'build', 'docs', 'final'])
+        self.assertEqual([stage.name for stage in stage_graph.needed_stages('build')], ['base', 'build'])
+        self.assertEqual([stage.name for stage in stage_graph.needed_stages('1')], ['base', 'build'])
+        with self.assertRaises(ValueError):
+            stage_graph.needed_stages('missing')
+
+    def test_affected_stages(self):
+        stage_graph = DockerStageGraph(self.dockerfile)
+
+        def affected(**changes):
+            return [stage.name for stage in stage_graph.affected_stages(**changes)]
+
+        # a global ARG reaches every stage derived from it
+        self.assertEqual(affected(buildargs=['BASE']), ['base', 'build', 'docs', 'final'])
+        self.assertEqual(affected(buildargs=['VERSION']), ['base', 'build', 'docs', 'final'])
+        self.assertEqual(affected(files=['src/main.c']), ['build', 'final'])
+        self.assertEqual(affected(files=['docs/index.md']), ['docs', 'final'])
+        self.assertEqual(affected(files=['README']), [])
+
+    def test_stage_names_are_case_insensitive(self):
+        stage_graph = DockerStageGraph('FROM alpine AS Builder\n'
+                                       'COPY src/ /src/\n'
+                                       'FROM alpine\n'
+                                       'COPY --from=builder /src /app\n'
+                                       'RUN --mount=from=BUILDER,target=/build true\n')
+
+        self.assertEqual(stage_graph.stage_names, ['builder', '1'])
+        self.assertEqual(stage_graph.stage('1').dependencies, {'builder'})
+        self.assertEqual([stage.name for stage in stage_graph.needed_stages()], ['builder', '1'])
+        self.assertEqual(stage_graph.stage('Builder').name, 'builder')
+        self.assertEqual([stage.name for stage in stage_graph.affected_stages(files=['src/main.c'])],
+                         ['builder', '1'])
+
+    def test_run_mounts(self):
+        stage_graph = DockerStageGraph('FROM ubuntu AS build\n'
+                                       'RUN --mount=type=bind,target=/src make -C /src\n'
+                                       'RUN --mount=type=bind,source=docs,target=/docs true\n'
+                                       'RUN --mount=type=cache,target=/root/.cache true\n'
+                                       'FROM ubuntu\n'
+                                       'RUN --mount=from=build,target=/build true\n')
+
+        # a bind mount without from reads the whole context unless it names a source
+        self.assertEqual(stage_graph.stage('build').sources, ['.', 'docs'])
+        self.assertEqual(stage_graph.stage('1').dependencies, {'build'})
+        self.assertEqual(stage_graph.unmodeled, [])
+
+    def test_unmodeled_constructs(self):
+        heredoc = DockerStageGraph('FROM ubuntu\nRUN <<EOF\nmake\nEOF\n')
+        unknown_mount = DockerStageGraph('FROM ubuntu\nRUN --mount=type=nfs,target=/data true\n')
+
+        self.assertEqual(len(heredoc.unmodeled), 1)
+        self.assertEqual(len(unknown_mount.unmodeled), 1)
+        self.assertEqual(DockerStageGraph(self.dockerfile).unmodeled, [])
+
+    def test_source_matches(self):
+        self.assertTrue(DockerStageGraph.source_matches('.', 'any/file'))
+        self.assertTrue(DockerStageGraph.source_matches('./src/', 'src/main.c'))
+        self.assertTrue(DockerStageGraph.source_matches('docs/*.md', 'docs/index.md'))
+        self.assertTrue(DockerStageGraph.source_matches('*.json', 'package.json'))
+        self.assertFalse(DockerStageGraph.source_matches('src', 'srcs/main.c'))
+        self.assertFalse(DockerStageGraph.source_matches('docs/*.md', 'docs/logo.png'))
+
+    def test_stage_hashes(self):
+        stage_graph = DockerStageGraph(self.dockerfile)
+        files = list(self.files)
+
+        first = stage_graph.stage_hashes(self.build_path, files, target='build')
+        self.assertEqual(list(first), ['base', 'build'])
+        # files no needed stage copies do not change the hashes
+        with open(os.path.join(self.build_path, 'docs', 'index.md'), 'w') as file:
+            file.write('# changed\n')
+        self.assertEqual(first, stage_graph.stage_hashes(self.build_path, files, target='build'))
+        # a copied file changes its stage and the stages built on it, not the ones before
+        with open(os.path.join(self.build_path, 'src', 'main.c'), 'w') as file:
+            file.write('int main(void);\n')
+        second = stage_graph.stage_hashes(self.build_path, files, target='build')
+        self.assertEqual(first['base'], second['base'])
+        self.assertNotEqual(first['build'], second['build'])
+        # so does a buildarg
+        self.assertNotEqual(second['build'], DockerStageGraph(self.dockerfile, {'VERSION': '24.04'})
+                            .stage_hashes(self.build_path, files, target='build')['build'])
+
+    def test_nodejs_dockerfile(self):
+        dockerfile_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config_files',
+                                       'Dockerfile.nodejs')
+        stage_graph = DockerStageGraph.from_file(dockerfile_path, {'PYTHON_MAJOR_VERSION': '3.11'})
+
+        self.assertEqual(stage_graph.stage_names,
+                         ['base_image', 'node_builder', 'bot_builder', 'pre_production', 'final_production'])
+        self.assertEqual(stage_graph.external_images(), {'python:3.11-slim'})
+        self.assertEqual(stage_graph.stage('final_production').dependencies, {'base_image', 'pre_production'})
+        self.assertEqual([stage.name for stage in stage_graph.needed_stages('bot_builder')],
+                         ['base_image', 'bot_builder'])
+        self.assertEqual([stage.name for stage in stage_graph.affected_stages(buildargs=['NODE_VERSION'])],
+                         ['node_builder', 'pre_production', 'final_production'])
+
+
+if __name__ == '__main__':
+    unittest.main()
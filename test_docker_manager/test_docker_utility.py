@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
 import unittest
-from unittest.mock import patch, mock_open, MagicMock
+from unittest.mock import patch
 from datetime import datetime
 import sys
 import os
+import tempfile
+import threading
+import time
 
 sys.path.append(os.path.abspath('../'))
 from docker_manager.docker_utility import DockerUtility
@@ -15,52 +18,92 @@ class TestDockerUtility(unittest.TestCase):
     def test_run_command_success(self):
         command = "exit 0"
         error_message = "Command failed"
-        with patch('subprocess.Popen') as mock_popen:
-            process_mock = MagicMock()
-            process_mock.communicate.return_value = ("", "")  # Mock the output of communicate
-            process_mock.returncode = 0  # Mock a successful return code
-            mock_popen.return_value = process_mock
-
-            DockerUtility.run_command(command, error_message)
-            # Further assertions can be added here if necessary
+        docker_command = DockerUtility.run_command(command, error_message)
+        self.assertEqual(docker_command.returncode, 0)
 
     def test_run_command_failure(self):
-        command = "exit 1"
+        command = "echo first error >&2; echo last error >&2; exit 1"
         error_message = "Command failed"
-        with patch('subprocess.Popen') as mock_popen:
-            process_mock = MagicMock()
-            process_mock.communicate.return_value = ("", "")  # Mock the output of communicate
-            process_mock.returncode = 1  # Mock a non-zero return code
-            mock_popen.return_value = process_mock
+        with self.assertRaises(Exception) as context:
+            DockerUtility.run_command(command, error_message)
+        self.assertIn(error_message, str(context.exception))
+        self.assertIn("last error", str(context.exception))
+
+    def test_run_command_streams_lines(self):
+        lines = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            log_file_path = os.path.join(temp_dir, 'command.log')
+            DockerUtility.run_command("echo out; echo err >&2; echo done", "Command failed",
+                                      log_file_path=log_file_path, on_line=lambda *line: lines.append(line))
+            with open(log_file_path, 'r') as log_file:
+                logged = log_file.read().splitlines()
+
+        self.assertEqual(sorted(lines), [('stderr', 'err'), ('stdout', 'done'), ('stdout', 'out')])
+        self.assertEqual(sorted(logged), ['done', 'err', 'out'])
+
+    def test_run_command_keeps_bounded_tail(self):
+        docker_command = DockerUtility.run_command("seq 1 1000", "Command failed", tail_lines=5)
+        self.assertEqual(list(docker_command.stdout_tail), ['996\n', '997\n', '998\n', '999\n', '1000\n'])
 
-            with self.assertRaises(Exception) as context:
-                DockerUtility.run_command(command, error_message)
-            self.assertIn(error_message, str(context.exception))
+    def test_run_command_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(Exception) as context:
+            DockerUtility.run_command("echo started; sleep 30", "Command failed", timeout=0.5)
+        self.assertIn("Timed out", str(context.exception))
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_run_command_cancel(self):
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        docker_command = DockerUtility.run_command("sleep 30", "Command failed", check=False, cancel_event=cancel_event)
+        self.assertTrue(docker_command.cancelled)
+        self.assertNotEqual(docker_command.returncode, 0)
+
+    def test_run_commands_in_parallel(self):
+        start = time.monotonic()
+        finished = DockerUtility.run_commands(["sleep 0.5; echo a", "sleep 0.5; echo b", "sleep 0.5; echo c"],
+                                              "Commands failed")
+        self.assertLess(time.monotonic() - start, 1.4)
+        self.assertEqual([list(docker_command.stdout_tail) for docker_command in finished],
+                         [['a\n'], ['b\n'], ['c\n']])
+
+    def test_run_commands_failure(self):
+        with self.assertRaises(Exception) as context:
+            DockerUtility.run_commands(["exit 0", "echo broken >&2; exit 3"], "Commands failed")
+        self.assertIn("broken", str(context.exception))
 
     @patch('docker_manager.docker_utility.datetime')
     def test_create_tag(self, mock_datetime):
         mock_datetime.now.return_value = datetime(2024, 1, 31, 0, 17, 0)
         date_format = "%Y%m%d%H%M%S"
         expected_git_commit_hash = "abc123"
-        with patch('subprocess.Popen') as mock_popen:
-            mock_popen.return_value.communicate.return_value = (expected_git_commit_hash, '')
+        with patch('docker_manager.docker_utility.DockerGitMetadata.for_path') as mock_for_path:
+            mock_for_path.return_value.tag_components.return_value = [expected_git_commit_hash]
             expected_timestamp = mock_datetime.now().strftime(date_format)
             tag = DockerUtility.create_tag(date_format)
             expected_tag = f"{expected_timestamp}-{expected_git_commit_hash}"
             self.assertEqual(tag, expected_tag)
+            mock_for_path.return_value.tag_components.assert_called_once_with(branch=False, dirty=False)
 
     @patch('docker_manager.docker_utility.datetime')
     def test_create_tag_no_git_hash(self, mock_datetime):
         mock_datetime.now.return_value = datetime(2024, 1, 31, 0, 17, 0)
         date_format = "%Y%m%d%H%M%S"
-        expected_git_commit_hash = ""
-        with patch('subprocess.Popen') as mock_popen:
-            mock_popen.return_value.communicate.return_value = (expected_git_commit_hash, '')
+        with patch('docker_manager.docker_utility.DockerGitMetadata.for_path') as mock_for_path:
+            mock_for_path.return_value.tag_components.return_value = []
             expected_timestamp = mock_datetime.now().strftime(date_format)
             tag = DockerUtility.create_tag(date_format)
             expected_tag = f"{expected_timestamp}"
             self.assertEqual(tag, expected_tag)
 
+    @patch('docker_manager.docker_utility.datetime')
+    def test_create_tag_branch_and_dirty(self, mock_datetime):
+        mock_datetime.now.return_value = datetime(2024, 1, 31, 0, 17, 0)
+        with patch('docker_manager.docker_utility.DockerGitMetadata.for_path') as mock_for_path:
+            mock_for_path.return_value.tag_components.return_value = ['abc123', 'main', 'dirty']
+            tag = DockerUtility.create_tag("%Y%m%d", branch=True, dirty=True)
+            self.assertEqual(tag, '20240131-abc123-main-dirty')
+            mock_for_path.return_value.tag_components.assert_called_once_with(branch=True, dirty=True)
 
 if __name__ == '__main__':
     unittest.main()
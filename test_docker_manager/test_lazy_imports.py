@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import unittest
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.abspath('../'))
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def imported_modules(self, code):
+        # a fresh interpreter, so modules loaded by other tests do not count
+        result = subprocess.run([sys.executable, '-c', f'{code}\nimport sys\nprint("\\n".join(sys.modules))'],
+                                cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return set(result.stdout.splitlines())
+
+    def test_cli_module_does_not_import_docker(self):
+        modules = self.imported_modules(
+            'import importlib.util\n'
+            'spec = importlib.util.spec_from_file_location("image_builder", "image-builder.py")\n'
+            'spec.loader.exec_module(importlib.util.module_from_spec(spec))')
+
+        self.assertNotIn('docker', modules)
+        self.assertNotIn('test_docker_manager.test_runner', modules)
+
+    def test_light_modules_do_not_import_docker(self):
+        modules = self.imported_modules(
+            'import docker_manager.docker_config\n'
+            'import docker_manager.docker_logging\n'
+            'import docker_manager.docker_metrics\n'
+            'import docker_manager.docker_utility\n'
+            'import docker_manager.docker_client_session\n'
+            'import docker_manager.docker_dependency_checker')
+
+        self.assertNotIn('docker', modules)
+
+    def test_cli_help(self):
+        result = subprocess.run([sys.executable, 'image-builder.py', '--help'], cwd=REPO_ROOT,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.assertEqual(result.returncode, 0)
+        self.assertIn('--build-image', result.stdout)
+
+    def test_cli_validates_replicas_and_start(self):
+        for argv in (['-cc', '-r', '0'], ['-cc', '-r', '-2'], ['-r', '2'], ['-st']):
+            result = subprocess.run([sys.executable, 'image-builder.py', '-c', 'config_files/config.json', *argv],
+                                    cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self.assertEqual(result.returncode, 2, argv)
+            self.assertIn('error:', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
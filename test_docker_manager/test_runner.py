@@ -2,12 +2,29 @@
 
 import unittest
 # Import your test classes
+from test_docker_manager.test_docker_async import TestDockerAsync
+from test_docker_manager.test_docker_build_context import TestDockerBuildContext
+from test_docker_manager.test_docker_build_plan import TestDockerBuildPlan
+from test_docker_manager.test_docker_build_server import TestDockerBuildServer
+from test_docker_manager.test_docker_client_session import TestDockerClientSession
 from test_docker_manager.test_docker_config import TestDockerConfig
 from test_docker_manager.test_docker_container_manager import TestDockerContainerManager
 from test_docker_manager.test_docker_dependency_checker import TestDockerDependencyChecker
+from test_docker_manager.test_docker_event_monitor import TestDockerEventMonitor
+from test_docker_manager.test_docker_file_watcher import TestDockerFileWatcher
+from test_docker_manager.test_docker_file_watcher import TestDockerFileWatcherPolling
+from test_docker_manager.test_docker_git_metadata import TestDockerGitMetadata
+from test_docker_manager.test_docker_health_monitor import TestDockerHealthMonitor
 from test_docker_manager.test_docker_image_builder import TestDockerImageBuilder
+from test_docker_manager.test_docker_image_inventory import TestDockerImageInventory
+from test_docker_manager.test_docker_image_watcher import TestDockerImageWatcher
+from test_docker_manager.test_docker_logging import TestDockerLogging
+from test_docker_manager.test_docker_metrics import TestDockerMetrics
+from test_docker_manager.test_docker_pruner import TestDockerPruner
 from test_docker_manager.test_docker_service_manager import TestDockerServiceManager
+from test_docker_manager.test_docker_stage_graph import TestDockerStageGraph
 from test_docker_manager.test_docker_utility import TestDockerUtility
+from test_docker_manager.test_lazy_imports import TestLazyImports
 
 
 class DockerTestSuite:
@@ -17,12 +34,29 @@ class DockerTestSuite:
         self.add_tests()
 
     def add_tests(self):
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerAsync))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerBuildContext))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerBuildPlan))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerBuildServer))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerClientSession))
         self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerConfig))
         self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerContainerManager))
         self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerDependencyChecker))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerEventMonitor))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerFileWatcher))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerFileWatcherPolling))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerGitMetadata))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerHealthMonitor))
         self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerImageBuilder))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerImageInventory))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerImageWatcher))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerLogging))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerMetrics))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerPruner))
         self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerServiceManager))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerStageGraph))
         self.suite.addTests(self.loader.loadTestsFromTestCase(TestDockerUtility))
+        self.suite.addTests(self.loader.loadTestsFromTestCase(TestLazyImports))
 
     def run(self):
         runner = unittest.TextTestRunner()